@@ -0,0 +1,353 @@
+# Relative path: src/benchmarks/distributed-sweep.py
+
+from argparse import ArgumentParser
+from contextlib import nullcontext, redirect_stdout
+from importlib import util
+from pathlib import Path
+from time import perf_counter
+from types import ModuleType
+from typing import Any, Final, Hashable
+import asyncio
+import io
+import json
+import sys
+import tomllib
+
+import pyqpanda as pq
+
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.checkpoint import SweepCheckpoint
+from common.circuitSpec import CircuitSpec
+from common.distributed import SweepCoordinator, runLocalSweep, runWorker
+from common.grover import groverCircuit, markedStateOracle, optimalIterations
+from common.parallelism import configureParallelism
+from common.resultStore import configureResultStore, resultStore
+from common.tracing import configureTracing
+
+
+def configInformation() -> dict[str, Any]:
+    """
+    Load configuration information from the config.toml file
+
+    Returns:
+        dict[str, Any]: Configuration information in a dictionary format
+    """
+
+    with open("config/config.toml", "rb") as file:
+        return tomllib.load(file)
+
+
+# Load configuration
+config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
+
+# File save path
+fileSavePath: Final[str] = config["exportFiles"]["destination"]
+# Coordinator address and chunking, see common/distributed.py
+distributedSection: Final[dict[str, Any]] = config.get("distributed", {})
+# Sweeps this script can build
+sweepNames: Final[list[str]] = ["adder", "controlled", "grover"]
+# Sweep -> experiment name and parameter names of the point keys, as the
+# single-run scripts record them in the result store
+pointParameters: Final[dict[str, tuple[str, list[str]]]] = {
+    "adder": ("adder", ["digits", "a", "b"]),
+    "controlled": ("controlled-adder-or-subtractor", ["digits", "a", "b", "control"]),
+    "grover": ("grover", ["width", "marked"]),
+}
+
+
+def loadScript(relativePath: str) -> ModuleType:
+    """
+    Import an experiment script, whose hyphenated file name is not importable
+
+    Args:
+        relativePath (str): Path of the script relative to src
+
+    Returns:
+        ModuleType: The loaded module (its main() is not run)
+    """
+
+    path = Path(__file__).resolve().parents[1] / relativePath
+    spec = util.spec_from_file_location(path.stem.replace("-", "_"), path)
+    if spec is None or spec.loader is None:
+        raise ImportError("Cannot load {}".format(path))
+    module = util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def arithmeticSweep(name: str, widths: list[int]) -> dict[Hashable, CircuitSpec]:
+    """
+    Every operand pair of every width, and both operations of the controlled
+    adder-subtractor
+
+    Args:
+        name (str): "adder" or "controlled"
+        widths (list[int]): Operand widths in digits
+
+    Returns:
+        dict[Hashable, CircuitSpec]: (name, width, a, b[, control]) -> circuit
+    """
+
+    if name == "adder":
+        programClass = loadScript("experiment-2/adder.py").AdderProgram
+        controls: list[int | None] = [None]
+    else:
+        programClass = loadScript(
+            "experiment-2/controlled-adder-or-subtrator.py"
+        ).ControlledSubtractorProgram
+        controls = [0, 1]
+
+    specs: dict[Hashable, CircuitSpec] = {}
+    for digits in widths:
+        # The programs print every input they prepare
+        with programClass(digits) as program, redirect_stdout(io.StringIO()):
+            for a in range(2**digits):
+                for b in range(2**digits):
+                    for control in controls:
+                        prog = pq.QProg()
+                        if control is None:
+                            prog << program.combinationCircuit(a, b)
+                        else:
+                            prog << program.combinationCircuit(a, b, control)
+                        for i in range(digits):
+                            prog << pq.Measure(
+                                program.qubits[program.sumBeginIndex + digits - 1 - i],
+                                program.cBits[i],
+                            )
+
+                        key = (name, digits, a, b) + (
+                            () if control is None else (control,)
+                        )
+                        specs[key] = CircuitSpec.fromPyQPanda(prog, program.qvm, digits)
+
+    return specs
+
+
+def groverSweep(widths: list[int]) -> dict[Hashable, CircuitSpec]:
+    """
+    Grover search for every single marked state of every width
+
+    Args:
+        widths (list[int]): Numbers of input qubits
+
+    Returns:
+        dict[Hashable, CircuitSpec]: ("grover", width, marked) -> circuit
+    """
+
+    mcxStrategy = config.get("grover", {}).get("mcxStrategy", "no-ancilla")
+
+    specs: dict[Hashable, CircuitSpec] = {}
+    for width in widths:
+        for marked in range(2**width):
+            circuit = groverCircuit(
+                width,
+                markedStateOracle(width, [marked], mcxStrategy),
+                optimalIterations(width, 1),
+                mcxStrategy,
+            )
+            specs[("grover", width, marked)] = CircuitSpec.fromQiskit(circuit)
+
+    return specs
+
+
+def initArgParser() -> ArgumentParser:
+    """
+    Initialize the argument parser
+
+    Returns:
+        ArgumentParser: Parser for the sweep options
+    """
+
+    parser = ArgumentParser(prog="distributed-sweep")
+    parser.add_argument(
+        "SWEEP",
+        nargs="?",
+        choices=sweepNames,
+        default="adder",
+        help="sweep to run (ignored by --worker)",
+    )
+    parser.add_argument(
+        "-w",
+        "--widths",
+        dest="WIDTHS",
+        nargs="+",
+        type=int,
+        default=[1, 2, 3],
+        help="operand digits of the arithmetic sweeps, input qubits of grover",
+    )
+    parser.add_argument(
+        "-s",
+        "--shots",
+        dest="SHOTS",
+        type=int,
+        default=config["simulation"]["shots"],
+        help="shots per point",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        dest="BACKEND",
+        default=config["simulation"].get("batchBackend", "aer"),
+        help="engine of the workers, see common/executors.py",
+    )
+    parser.add_argument(
+        "-l",
+        "--local",
+        dest="LOCAL",
+        type=int,
+        default=0,
+        help="start this many workers on localhost (0 waits for remote workers)",
+    )
+    parser.add_argument(
+        "--host",
+        dest="HOST",
+        default=distributedSection.get("host", "127.0.0.1"),
+        help="address the coordinator listens on, or the workers connect to",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        dest="PORT",
+        type=int,
+        default=distributedSection.get("port", 5730),
+        help="coordinator port",
+    )
+    parser.add_argument(
+        "-c",
+        "--checkpoint",
+        dest="CHECKPOINT",
+        default=None,
+        help="checkpoint file; an existing one resumes the sweep it holds",
+    )
+    parser.add_argument(
+        "--worker",
+        dest="WORKER",
+        action="store_true",
+        help="run as a worker of the coordinator at --host and --port",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="OUTPUT",
+        default=fileSavePath + "sweep.json",
+        help="JSON file of the counts of every point",
+    )
+    return parser
+
+
+def main():
+    """
+    Run a sweep as the coordinator, or serve one as a worker
+    """
+
+    args = vars(initArgParser().parse_args())
+
+    if args["WORKER"]:
+        chunks = runWorker(args["HOST"], args["PORT"])
+        print("Worker ran {} chunks".format(chunks))
+        return
+
+    if args["SWEEP"] == "grover":
+        specs = groverSweep(args["WIDTHS"])
+    else:
+        specs = arithmeticSweep(args["SWEEP"], args["WIDTHS"])
+
+    seed = config["simulation"].get("seed")
+    options = config.get(args["BACKEND"], {})
+    checkpoint = None
+    if args["CHECKPOINT"]:
+        # The counts of a resumed sweep depend on the same settings
+        checkpoint = SweepCheckpoint(
+            args["CHECKPOINT"],
+            {
+                "backend": args["BACKEND"],
+                "options": options,
+                "shots": args["SHOTS"],
+                "seed": seed,
+            },
+            distributedSection.get("checkpointBatch", 64),
+            distributedSection.get("checkpointSeconds", 30.0),
+        )
+
+    with checkpoint or nullcontext():
+        coordinator = SweepCoordinator(
+            specs,
+            args["SHOTS"],
+            seed,
+            args["BACKEND"],
+            options,
+            distributedSection.get("chunkPoints", 16),
+            distributedSection.get("maxCopies", 2),
+            checkpoint,
+            distributedSection.get("maxAttempts", 3),
+        )
+
+        start = perf_counter()
+        if args["LOCAL"] > 0:
+            results = runLocalSweep(coordinator, args["LOCAL"], args["HOST"])
+        else:
+            results = asyncio.run(coordinator.serve(args["HOST"], args["PORT"]))
+        seconds = perf_counter() - start
+
+    report = coordinator.report()
+    print(
+        "{} points in {} chunks ({} resumed), {:.2f}s; {} stolen copies, "
+        "{} results dropped, {} failed runs".format(
+            report["points"],
+            report["chunks"],
+            report["resumedPoints"],
+            seconds,
+            report["stolenCopies"],
+            report["droppedResults"],
+            report["failedRuns"],
+        )
+    )
+    for worker, chunks in sorted(report["chunksByWorker"].items()):
+        print("{:<24}{:>6} chunks".format(worker, chunks))
+
+    # Points resumed from the checkpoint were recorded by the run that
+    # finished them, the points run now share the time of the sweep
+    ran = {
+        key: counts for key, counts in results.items() if key not in coordinator.resumed
+    }
+    for key, counts in ran.items():
+        experiment, names = pointParameters[key[0]]
+        resultStore.record(
+            experiment,
+            dict(zip(names, key[1:])),
+            args["BACKEND"],
+            args["SHOTS"],
+            seed,
+            seconds / len(ran),
+            counts,
+        )
+
+    with open(args["OUTPUT"], "w") as file:
+        json.dump(
+            {
+                "sweep": args["SWEEP"],
+                "backend": args["BACKEND"],
+                "shots": args["SHOTS"],
+                "seconds": seconds,
+                "coordinator": report,
+                "points": [
+                    {"key": list(key), "counts": counts}
+                    for key, counts in results.items()
+                ],
+            },
+            file,
+        )
+    print("Counts written to {}".format(args["OUTPUT"]))
+
+
+if __name__ == "__main__":
+    main()
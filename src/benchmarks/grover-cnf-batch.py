@@ -0,0 +1,279 @@
+# Relative path: src/benchmarks/grover-cnf-batch.py
+
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Final, Iterator
+import gzip
+import json
+import os
+import sys
+import tomllib
+
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.cnfBatch import runInstances
+from common.grover import readDimacs
+from common.mcx import mcxStrategies
+from common.parallelism import configureParallelism
+from common.resultStore import configureResultStore, resultStore
+from common.tracing import configureTracing
+
+
+def configInformation() -> dict[str, Any]:
+    """
+    Load configuration information from the config.toml file
+
+    Returns:
+        dict[str, Any]: Configuration information in a dictionary format
+    """
+
+    with open("config/config.toml", "rb") as file:
+        return tomllib.load(file)
+
+
+# Load configuration
+config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
+
+# File save path
+fileSavePath: Final[str] = config["exportFiles"]["destination"]
+# Pool size and caps of the batch, see common/cnfBatch.py
+batchSection: Final[dict[str, Any]] = config.get("groverBatch", {})
+# File name endings read from a directory
+dimacsSuffixes: Final[tuple[str, ...]] = (".cnf", ".dimacs", ".cnf.gz")
+
+
+def streamInstances(paths: list[str]) -> Iterator[tuple[str, int, list[list[int]]]]:
+    """
+    Formulas of DIMACS files and directories, read one at a time
+
+    Args:
+        paths (list[str]): Files, or directories searched recursively
+
+    Returns:
+        Iterator[tuple[str, int, list[list[int]]]]: Name, number of variables
+            and clauses of each formula; a file with several formulas names
+            them file#1, file#2, ...
+    """
+
+    for path in map(Path, paths):
+        files = (
+            sorted(
+                file
+                for file in path.rglob("*")
+                if file.is_file() and file.name.endswith(dimacsSuffixes)
+            )
+            if path.is_dir()
+            else [path]
+        )
+        for file in files:
+            opener = gzip.open if file.name.endswith(".gz") else open
+            try:
+                with opener(file, "rt") as lines:
+                    for index, (numVariables, clauses) in enumerate(readDimacs(lines)):
+                        name = (
+                            str(file) if index == 0 else "{}#{}".format(file, index + 1)
+                        )
+                        yield name, numVariables, clauses
+            except (OSError, ValueError) as error:
+                # One unreadable file does not stop the batch
+                print("Skipped {}: {}".format(file, error), file=sys.stderr)
+
+
+def describeResult(result: dict[str, Any]) -> str:
+    """
+    One-line summary of a formula's result
+
+    Args:
+        result (dict[str, Any]): Result of runInstances
+
+    Returns:
+        str: Success probability, oracle calls, or the error
+    """
+
+    if result["status"] != "ok":
+        return result.get("error", "")
+    if result["schedule"] == "bbht":
+        return "{} after {} oracle calls in {} trials".format(
+            "found" if result["found"] else "not found",
+            result["oracleCalls"],
+            result["trials"],
+        )
+    return "p = {:.3f} (expected {:.3f})".format(
+        result["successProbability"], result["expectedProbability"]
+    )
+
+
+def initArgParser() -> ArgumentParser:
+    """
+    Initialize the argument parser
+
+    Returns:
+        ArgumentParser: Parser for the batch options
+    """
+
+    parser = ArgumentParser(prog="grover-cnf-batch")
+    parser.add_argument(
+        "PATHS", nargs="+", help="DIMACS CNF files, or directories of them"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="WORKERS",
+        type=int,
+        default=batchSection.get("workers", os.cpu_count() or 1),
+        help="worker processes",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        dest="TIMEOUT",
+        type=float,
+        default=batchSection.get("timeoutSeconds", 60.0),
+        help="seconds a formula may run",
+    )
+    parser.add_argument(
+        "-m",
+        "--memory",
+        dest="MEMORY",
+        type=float,
+        default=batchSection.get("memoryLimitMiB", 2048),
+        help="MiB a worker may use",
+    )
+    parser.add_argument(
+        "-s",
+        "--shots",
+        dest="SHOTS",
+        type=int,
+        default=batchSection.get("shots", 1024),
+        help="shots per formula",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        dest="BACKEND",
+        default=config.get("grover", {}).get("backend", "aer"),
+        help="engine of the workers, see common/executors.py",
+    )
+    parser.add_argument(
+        "--mcx",
+        dest="MCX",
+        choices=list(mcxStrategies),
+        default=config.get("grover", {}).get("mcxStrategy", "no-ancilla"),
+        help="decomposition of the multi-controlled X gates",
+    )
+    parser.add_argument(
+        "--schedule",
+        dest="SCHEDULE",
+        choices=["optimal", "bbht"],
+        default=batchSection.get("schedule", "optimal"),
+        help="iteration count from the classically counted solutions, or the "
+        "randomized schedule that does not need the count",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="OUTPUT",
+        default=fileSavePath + "grover-cnf-batch.jsonl",
+        help="JSON lines file, one line per formula as it finishes",
+    )
+    return parser
+
+
+def main():
+    """
+    Run Grover on every formula and write the results as they finish
+    """
+
+    args = vars(initArgParser().parse_args())
+    settings = {
+        "backend": args["BACKEND"],
+        "options": config.get(args["BACKEND"], {}),
+        "shots": args["SHOTS"],
+        "seed": config["simulation"].get("seed"),
+        "mcxStrategy": args["MCX"],
+        "memoryLimitMiB": args["MEMORY"],
+        "schedule": args["SCHEDULE"],
+    }
+
+    statuses: dict[str, int] = {}
+    probabilities = []
+    oracleCalls = []
+    start = perf_counter()
+    with open(args["OUTPUT"], "w") as file:
+        for result in runInstances(
+            streamInstances(args["PATHS"]),
+            settings,
+            args["WORKERS"],
+            args["TIMEOUT"],
+        ):
+            counts = result.pop("counts", None)
+            file.write(json.dumps(result) + "\n")
+            # Written as they finish, so an interrupted batch keeps its results
+            file.flush()
+
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            if result["status"] == "ok":
+                if "successProbability" in result:
+                    probabilities.append(result["successProbability"])
+                if result["found"]:
+                    oracleCalls.append(result["oracleCalls"])
+                resultStore.record(
+                    "grover-cnf",
+                    {
+                        "instance": result["instance"],
+                        "mcxStrategy": args["MCX"],
+                        "schedule": args["SCHEDULE"],
+                    },
+                    args["BACKEND"],
+                    result["shots"],
+                    settings["seed"],
+                    result["seconds"],
+                    counts,
+                )
+            print(
+                "{:<40}{:>8}{:>10.3f}s  {}".format(
+                    result["instance"][-40:],
+                    result["status"],
+                    result["seconds"],
+                    describeResult(result),
+                )
+            )
+    seconds = perf_counter() - start
+
+    total = sum(statuses.values())
+    print(
+        "{} formulas in {:.2f}s ({:.2f} per second): {}".format(
+            total,
+            seconds,
+            total / seconds if seconds > 0 else 0.0,
+            ", ".join(
+                "{} {}".format(count, status)
+                for status, count in sorted(statuses.items())
+            ),
+        )
+    )
+    if probabilities:
+        print(
+            "Mean success probability {:.3f}".format(
+                sum(probabilities) / len(probabilities)
+            )
+        )
+    if oracleCalls:
+        print(
+            "Mean oracle calls of the solved formulas {:.1f}".format(
+                sum(oracleCalls) / len(oracleCalls)
+            )
+        )
+    print("Results written to {}".format(args["OUTPUT"]))
+
+
+if __name__ == "__main__":
+    main()
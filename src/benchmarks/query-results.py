@@ -0,0 +1,144 @@
+# Relative path: src/benchmarks/query-results.py
+
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Final
+import json
+import sys
+import tomllib
+
+import pandas as pd
+
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.resultStore import configureResultStore, resultStore
+
+
+def configInformation() -> dict[str, Any]:
+    """
+    Load configuration information from the config.toml file
+
+    Returns:
+        dict[str, Any]: Configuration information in a dictionary format
+    """
+
+    with open("config/config.toml", "rb") as file:
+        return tomllib.load(file)
+
+
+# Load configuration
+config: Final[dict[str, Any]] = configInformation()
+# Directory of the recorded runs, see common/resultStore.py
+configureResultStore(config)
+
+
+def parseParam(text: str) -> tuple[str, Any]:
+    """
+    Parse a NAME=VALUE filter, the value as JSON when it is valid JSON
+
+    Args:
+        text (str): e.g. digits=4 or mcxStrategy=v-chain
+
+    Returns:
+        tuple[str, Any]: Name and value
+    """
+
+    name, _, value = text.partition("=")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+
+def initArgParser() -> ArgumentParser:
+    """
+    Initialize the argument parser
+
+    Returns:
+        ArgumentParser: Parser for the query options
+    """
+
+    parser = ArgumentParser(prog="query-results")
+    parser.add_argument(
+        "-e", "--experiment", dest="EXPERIMENT", help="only runs of this experiment"
+    )
+    parser.add_argument(
+        "-p",
+        "--param",
+        dest="PARAMS",
+        nargs="+",
+        type=parseParam,
+        default=[],
+        help="only runs with these parameters, as NAME=VALUE",
+    )
+    parser.add_argument(
+        "-c", "--commit", dest="COMMIT", help="only runs of this commit (or prefix)"
+    )
+    parser.add_argument(
+        "-b", "--backend", dest="BACKEND", help="only runs on this backend"
+    )
+    parser.add_argument(
+        "--counts",
+        dest="COUNTS",
+        action="store_true",
+        help="also print the counts of the matching runs",
+    )
+    parser.add_argument(
+        "--compact",
+        dest="COMPACT",
+        action="store_true",
+        help="merge the segments of the store into one first",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="OUTPUT",
+        default=None,
+        help="CSV file of the matching runs",
+    )
+    return parser
+
+
+def main():
+    """
+    Print the recorded runs that match the filters, and their timing per experiment
+    """
+
+    args = vars(initArgParser().parse_args())
+
+    if args["COMPACT"]:
+        resultStore.compact()
+
+    filters = {
+        "experiment": args["EXPERIMENT"],
+        "params": dict(args["PARAMS"]) or None,
+        "commit": args["COMMIT"],
+        "backend": args["BACKEND"],
+    }
+    runs = resultStore.runs(**filters)
+    if runs.empty:
+        print("No runs in {} match".format(resultStore.directory))
+        return
+
+    runs["timestamp"] = pd.to_datetime(runs["timestamp"], unit="s")
+    with pd.option_context(
+        "display.max_rows", 50, "display.max_columns", None, "display.width", 200
+    ):
+        print(runs)
+        print(
+            runs.groupby(["experiment", "commit", "backend"], observed=True)[
+                "seconds"
+            ].agg(["count", "median", "min", "max"])
+        )
+
+        if args["COUNTS"]:
+            print(resultStore.counts(**filters))
+
+    if args["OUTPUT"]:
+        runs.to_csv(args["OUTPUT"], index=False)
+        print("Runs written to {}".format(args["OUTPUT"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+# Relative path: src/benchmarks/run-benchmarks.py
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from importlib import util
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Final
+import io
+import os
+import sys
+import tomllib
+
+import matplotlib.pyplot as plt
+import pyqpanda as pq
+import qiskit as qk
+from qiskit.visualization import plot_histogram
+from qiskit_aer import AerSimulator
+
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.backends import runProgram
+from common.benchmarking import (
+    PhaseTimer,
+    compareReports,
+    loadReport,
+    runCase,
+    writeReport,
+)
+from common.grover import groverCircuit, markedStateOracle, optimalIterations
+from common.parallelism import configureParallelism, parallelism
+from common.resultCache import cacheBypassEnvironmentVariable
+
+
+def configInformation() -> dict[str, Any]:
+    """
+    Load configuration information from the config.toml file
+
+    Returns:
+        dict[str, Any]: Configuration information in a dictionary format
+    """
+
+    with open("config/config.toml", "rb") as file:
+        return tomllib.load(file)
+
+
+# Load configuration
+config: Final[dict[str, Any]] = configInformation()
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# The experiment scripts enable the result cache from [cache], and with a seed
+# every repeat after the first would time a disk lookup instead of the
+# simulation; this also covers the cases scaling-benchmark.py runs from here
+os.environ[cacheBypassEnvironmentVariable] = "1"
+
+# File save path
+fileSavePath: Final[str] = config["exportFiles"]["destination"]
+# Every benchmark case
+caseNames: Final[list[str]] = ["bell", "teleportation", "adder", "subtractor", "grover"]
+
+
+def loadScript(relativePath: str) -> ModuleType:
+    """
+    Import an experiment script, whose hyphenated file name is not importable
+
+    Args:
+        relativePath (str): Path of the script relative to src
+
+    Returns:
+        ModuleType: The loaded module (its main() is not run)
+    """
+
+    path = Path(__file__).resolve().parents[1] / relativePath
+    spec = util.spec_from_file_location(path.stem.replace("-", "_"), path)
+    if spec is None or spec.loader is None:
+        raise ImportError("Cannot load {}".format(path))
+    module = util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def bellCase(shots: int, render: bool) -> Callable[[PhaseTimer], list[float]]:
+    bellState = loadScript("experiment-1/bell-state.py")
+
+    def case(timer: PhaseTimer) -> list[float]:
+        qvm = pq.CPUQVM()
+        qvm.init_qvm()
+        parallelism.limitQVM(qvm)
+        quBits = qvm.qAlloc_many(2)
+        cBits = qvm.cAlloc_many(2)
+
+        agreements = []
+        for round in range(4):
+            with timer.phase("build"):
+                prog = pq.QProg()
+                (
+                    prog
+                    << bellState.setAppropriateInput(quBits, round)
+                    << pq.H(quBits[0])
+                    << pq.CNOT(quBits[0], quBits[1])
+                    << pq.Measure(quBits[0], cBits[0])
+                    << pq.Measure(quBits[1], cBits[1])
+                )
+            with timer.phase("simulate"):
+                result = qvm.run_with_configuration(prog, cBits, shots)
+            if render:
+                with timer.phase("render"):
+                    pq.draw_qprog(
+                        prog, "pic", filename=fileSavePath + "benchmark-bell-state"
+                    )
+            with timer.phase("postprocess"):
+                # Fraction of shots where both qubits agree
+                agreements.append(
+                    sum(value for key, value in result.items() if key[0] == key[1])
+                    / shots
+                )
+
+        qvm.finalize()
+        return agreements
+
+    return case
+
+
+def teleportationCase(
+    shots: int, render: bool
+) -> Callable[[PhaseTimer], dict[str, int]]:
+    teleportation = loadScript("experiment-1/quantum-teleportation.py")
+
+    def case(timer: PhaseTimer) -> dict[str, int]:
+        qvm = pq.CPUQVM()
+        qvm.init_qvm()
+        parallelism.limitQVM(qvm)
+        quBits = qvm.qAlloc_many(3)
+        cBits = qvm.cAlloc_many(3)
+
+        with timer.phase("build"):
+            prog = pq.QProg()
+            (
+                prog
+                << teleportation.prepareStateGate(quBits[0], 2**-0.5, 2**-0.5)
+                << pq.H(quBits[1])
+                << pq.CNOT(quBits[1], quBits[2])
+                << pq.CNOT(quBits[0], quBits[1])
+                << pq.H(quBits[0])
+                << pq.Measure(quBits[0], cBits[0])
+                << pq.Measure(quBits[1], cBits[1])
+                << pq.CNOT(quBits[1], quBits[2])
+                << pq.CZ(quBits[0], quBits[2])
+                << pq.Measure(quBits[2], cBits[2])
+            )
+        with timer.phase("simulate"):
+            result = qvm.run_with_configuration(prog, cBits, shots)
+        if render:
+            with timer.phase("render"):
+                pq.draw_qprog(
+                    prog, "pic", filename=fileSavePath + "benchmark-teleportation"
+                )
+        with timer.phase("postprocess"):
+            # Marginal of the teleported qubit
+            marginal = {
+                bit: sum(value for key, value in result.items() if key[0] == bit)
+                for bit in "01"
+            }
+
+        qvm.finalize()
+        return marginal
+
+    return case
+
+
+def arithmeticCase(
+    name: str, digits: int, shots: int, render: bool
+) -> Callable[[PhaseTimer], dict[int, int]]:
+    script = loadScript("experiment-2/{}.py".format(name))
+    programClass = script.AdderProgram if name == "adder" else script.SubtractorProgram
+    a, b = 2 ** (digits - 1), 2 ** (digits - 1) - 1
+
+    def case(timer: PhaseTimer) -> dict[int, int]:
+        with timer.phase("build"):
+            program = programClass(digits)
+            prog = pq.QProg()
+            prog << program.combinationCircuit(a, b)
+            for i in range(digits):
+                prog << pq.Measure(
+                    program.qubits[program.sumBeginIndex + digits - 1 - i],
+                    program.cBits[i],
+                )
+        # runProgram lowers the program to a CircuitSpec itself, so that is
+        # timed as part of simulate
+        with timer.phase("simulate"):
+            result = runProgram(
+                script.backend,
+                program.qvm,
+                prog,
+                program.cBits,
+                shots,
+                script.simulationSeed,
+                script.backendOptions,
+                script.resourceBudget,
+            )
+        if render:
+            with timer.phase("render"):
+                pq.draw_qprog(prog, "pic", filename=fileSavePath + "benchmark-" + name)
+        with timer.phase("postprocess"):
+            outcomes = {int(key, 2): value for key, value in result.items()}
+
+        program.qvm.finalize()
+        return outcomes
+
+    return case
+
+
+def groverCase(
+    numInputQubits: int, shots: int, render: bool
+) -> Callable[[PhaseTimer], float]:
+    mcxStrategy = config.get("grover", {}).get("mcxStrategy", "no-ancilla")
+    # One marked state, alternating bits
+    marked = int("10" * numInputQubits, 2) & (2**numInputQubits - 1)
+
+    def case(timer: PhaseTimer) -> float:
+        with timer.phase("build"):
+            circuit = groverCircuit(
+                numInputQubits,
+                markedStateOracle(numInputQubits, [marked], mcxStrategy),
+                optimalIterations(numInputQubits, 1),
+                mcxStrategy,
+            )
+        with timer.phase("transpile"):
+            simulator = AerSimulator(**parallelism.aerOptions())
+            transpiled = qk.transpile(circuit, simulator)
+        with timer.phase("simulate"):
+            counts = simulator.run(transpiled, shots=shots).result().get_counts()
+        if render:
+            with timer.phase("render"):
+                circuit.draw(
+                    output="mpl", filename=fileSavePath + "benchmark-grover.png"
+                )
+                plot_histogram(
+                    counts, filename=fileSavePath + "benchmark-grover-count.png"
+                )
+                plt.close("all")
+        with timer.phase("postprocess"):
+            # Success probability of the marked state
+            key = format(marked, "0{}b".format(numInputQubits))
+            probability = counts.get(key, 0) / shots
+
+        return probability
+
+    return case
+
+
+def initArgParser() -> ArgumentParser:
+    """
+    Initialize the argument parser
+
+    Returns:
+        ArgumentParser: Parser for the benchmark options
+    """
+
+    parser = ArgumentParser(prog="run-benchmarks")
+    parser.add_argument(
+        "-c",
+        "--cases",
+        dest="CASES",
+        nargs="+",
+        default=caseNames,
+        choices=caseNames,
+        help="cases to run",
+    )
+    parser.add_argument(
+        "-d",
+        "--adder-digits",
+        dest="ADDER_DIGITS",
+        nargs="+",
+        type=int,
+        default=[2, 4, 6],
+        help="digit counts of the adder and subtractor",
+    )
+    parser.add_argument(
+        "-g",
+        "--grover-qubits",
+        dest="GROVER_QUBITS",
+        nargs="+",
+        type=int,
+        default=[3, 5, 7],
+        help="input qubit counts of Grover's algorithm",
+    )
+    parser.add_argument(
+        "-s",
+        "--shots",
+        dest="SHOTS",
+        nargs="+",
+        type=int,
+        default=[1000, config["simulation"]["shots"]],
+        help="shot counts",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        dest="REPEATS",
+        type=int,
+        default=3,
+        help="runs of each case, the report keeps the min and median",
+    )
+    parser.add_argument(
+        "--no-render",
+        dest="RENDER",
+        action="store_false",
+        help="skip the render phase (circuit drawings and histograms)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="OUTPUT",
+        default=fileSavePath + "benchmark.json",
+        help="JSON report to write",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        dest="BASELINE",
+        default=None,
+        help="JSON report to compare against",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        dest="THRESHOLD",
+        type=float,
+        default=0.2,
+        help="relative slowdown flagged as a regression",
+    )
+    return parser
+
+
+def main():
+    """
+    Run the benchmark cases, write the report and compare it to the baseline
+    """
+
+    args = vars(initArgParser().parse_args())
+    render: bool = args["RENDER"]
+
+    cases: list[tuple[str, dict[str, Any], Callable[[PhaseTimer], Any]]] = []
+    for shots in args["SHOTS"]:
+        if "bell" in args["CASES"]:
+            cases.append(("bell", {"shots": shots}, bellCase(shots, render)))
+        if "teleportation" in args["CASES"]:
+            cases.append(
+                ("teleportation", {"shots": shots}, teleportationCase(shots, render))
+            )
+        for name in ["adder", "subtractor"]:
+            if name not in args["CASES"]:
+                continue
+            for digits in args["ADDER_DIGITS"]:
+                cases.append(
+                    (
+                        name,
+                        {"digits": digits, "shots": shots},
+                        arithmeticCase(name, digits, shots, render),
+                    )
+                )
+        if "grover" in args["CASES"]:
+            for numInputQubits in args["GROVER_QUBITS"]:
+                cases.append(
+                    (
+                        "grover",
+                        {"qubits": numInputQubits, "shots": shots},
+                        groverCase(numInputQubits, shots, render),
+                    )
+                )
+
+    results = []
+    for name, params, case in cases:
+        # The experiment helpers print as they go, keep the report readable
+        with redirect_stdout(io.StringIO()):
+            result = runCase(name, params, case, args["REPEATS"])
+        results.append(result)
+        print(
+            "{:<40}{}".format(
+                result["key"],
+                "  ".join(
+                    "{} {:.4f}s".format(phase, timing["median"])
+                    for phase, timing in result["phases"].items()
+                ),
+            )
+        )
+
+    report = writeReport(args["OUTPUT"], results)
+    print("Report written to {}".format(args["OUTPUT"]))
+
+    if args["BASELINE"] is None:
+        return
+
+    comparisons = compareReports(
+        report, loadReport(args["BASELINE"]), args["THRESHOLD"]
+    )
+    regressions = [item for item in comparisons if item["regressed"]]
+    for item in comparisons:
+        print(
+            "{:<40}{:<12}{:>10.4f}s{:>10.4f}s{:>8.2f}x{}".format(
+                item["key"],
+                item["phase"],
+                item["baseline"],
+                item["current"],
+                item["ratio"],
+                "  REGRESSION" if item["regressed"] else "",
+            )
+        )
+    print(
+        "{} of {} phases regressed beyond {:.0%}".format(
+            len(regressions), len(comparisons), args["THRESHOLD"]
+        )
+    )
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
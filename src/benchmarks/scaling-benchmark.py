@@ -0,0 +1,292 @@
+# Relative path: src/benchmarks/scaling-benchmark.py
+
+from argparse import SUPPRESS, ArgumentParser
+from contextlib import redirect_stdout
+from importlib import util
+from pathlib import Path
+from typing import Any, Final
+import io
+import json
+import os
+import subprocess
+import sys
+import tomllib
+
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.benchmarking import hostMetadata, runCase
+from common.parallelism import configureParallelism, threadEnvironmentVariables
+
+
+def configInformation() -> dict[str, Any]:
+    """
+    Load configuration information from the config.toml file
+
+    Returns:
+        dict[str, Any]: Configuration information in a dictionary format
+    """
+
+    with open("config/config.toml", "rb") as file:
+        return tomllib.load(file)
+
+
+# Load configuration
+config: Final[dict[str, Any]] = configInformation()
+
+# File save path
+fileSavePath: Final[str] = config["exportFiles"]["destination"]
+# Cases swept, and the [parallelism] key of the engine each one runs on
+caseEngines: Final[dict[str, str]] = {
+    "bell": "qvmThreads",
+    "teleportation": "qvmThreads",
+    "adder": "qvmThreads",
+    "grover": "aerThreads",
+}
+# A thread count within this factor of the fastest counts as just as fast
+slackFactor: Final[float] = 1.1
+
+
+def defaultThreadCounts() -> list[int]:
+    """
+    Powers of two up to the core count, and the core count itself
+
+    Returns:
+        list[int]: Thread counts to sweep
+    """
+
+    cores = os.cpu_count() or 1
+    counts = {cores}
+    count = 1
+    while count < cores:
+        counts.add(count)
+        count *= 2
+    return sorted(counts)
+
+
+def runWorker(case: str, threads: int, shots: int, repeats: int) -> dict[str, Any]:
+    """
+    Time one case at one thread count, inside a fresh process
+
+    Args:
+        case (str): One of caseEngines
+        threads (int): Thread limit of every engine
+        shots (int): Shots per run
+        repeats (int): Runs of the case
+
+    Returns:
+        dict[str, Any]: Result of runCase
+    """
+
+    path = Path(__file__).resolve().parent / "run-benchmarks.py"
+    spec = util.spec_from_file_location("run_benchmarks", path)
+    if spec is None or spec.loader is None:
+        raise ImportError("Cannot load {}".format(path))
+    benchmarks = util.module_from_spec(spec)
+    spec.loader.exec_module(benchmarks)
+
+    # Overrides the limits the benchmark module read from config.toml
+    configureParallelism({"parallelism": {"threads": threads}})
+
+    match case:
+        case "bell":
+            function = benchmarks.bellCase(shots, False)
+        case "teleportation":
+            function = benchmarks.teleportationCase(shots, False)
+        case "adder":
+            function = benchmarks.arithmeticCase("adder", 4, shots, False)
+        case _:
+            function = benchmarks.groverCase(7, shots, False)
+
+    with redirect_stdout(io.StringIO()):
+        return runCase(case, {"threads": threads, "shots": shots}, function, repeats)
+
+
+def measure(case: str, threads: int, shots: int, repeats: int) -> dict[str, Any]:
+    """
+    Run runWorker in a subprocess, as OpenMP and BLAS read their thread
+    count once, at startup
+
+    Args:
+        case (str): One of caseEngines
+        threads (int): Thread limit of every engine
+        shots (int): Shots per run
+        repeats (int): Runs of the case
+
+    Returns:
+        dict[str, Any]: Result of runCase
+    """
+
+    environment = dict(os.environ)
+    for name in threadEnvironmentVariables:
+        environment[name] = str(threads)
+
+    completed = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--worker",
+            case,
+            str(threads),
+            "-s",
+            str(shots),
+            "-r",
+            str(repeats),
+        ],
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def recommend(timings: dict[str, dict[int, float]], concurrent: int) -> dict[str, int]:
+    """
+    Thread limits for the host, as a [parallelism] section
+
+    Each case gets the fewest threads within slackFactor of its fastest time,
+    capped at its share of the cores when several experiments run side by side.
+
+    Args:
+        timings (dict[str, dict[int, float]]): Case -> thread count -> seconds
+        concurrent (int): Experiments expected to run at the same time
+
+    Returns:
+        dict[str, int]: [parallelism] keys and values
+    """
+
+    share = max(1, (os.cpu_count() or 1) // concurrent)
+    settings: dict[str, int] = {"threads": share}
+
+    for case, byThreads in timings.items():
+        fastest = min(byThreads.values())
+        enough = min(
+            threads
+            for threads, seconds in byThreads.items()
+            if seconds <= fastest * slackFactor
+        )
+        key = caseEngines[case]
+        settings[key] = max(settings.get(key, 1), min(enough, share))
+
+    # BLAS only backs the numpy engines, keep it to one thread per experiment
+    # when the cores are shared
+    settings["blasThreads"] = 1 if concurrent > 1 else share
+    return settings
+
+
+def initArgParser() -> ArgumentParser:
+    """
+    Initialize the argument parser
+
+    Returns:
+        ArgumentParser: Parser for the benchmark options
+    """
+
+    parser = ArgumentParser(prog="scaling-benchmark")
+    parser.add_argument(
+        "-c",
+        "--cases",
+        dest="CASES",
+        nargs="+",
+        default=list(caseEngines),
+        choices=list(caseEngines),
+        help="cases to sweep",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        dest="THREADS",
+        nargs="+",
+        type=int,
+        default=defaultThreadCounts(),
+        help="thread counts to sweep",
+    )
+    parser.add_argument(
+        "-s",
+        "--shots",
+        dest="SHOTS",
+        type=int,
+        default=config["simulation"]["shots"],
+        help="shots per run",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        dest="REPEATS",
+        type=int,
+        default=3,
+        help="runs of each case, the median is compared",
+    )
+    parser.add_argument(
+        "-p",
+        "--concurrent",
+        dest="CONCURRENT",
+        type=int,
+        default=1,
+        help="experiments expected to run side by side",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="OUTPUT",
+        default=fileSavePath + "scaling.json",
+        help="JSON report to write",
+    )
+    parser.add_argument(
+        "--worker",
+        dest="WORKER",
+        nargs=2,
+        metavar=("CASE", "THREADS"),
+        default=None,
+        # Internal: run one measurement, see measure()
+        help=SUPPRESS,
+    )
+    return parser
+
+
+def main():
+    """
+    Sweep the thread counts of every case and recommend [parallelism] settings
+    """
+
+    args = vars(initArgParser().parse_args())
+
+    if args["WORKER"] is not None:
+        case, threads = args["WORKER"]
+        print(json.dumps(runWorker(case, int(threads), args["SHOTS"], args["REPEATS"])))
+        return
+
+    results = []
+    timings: dict[str, dict[int, float]] = {}
+    for case in args["CASES"]:
+        for threads in args["THREADS"]:
+            result = measure(case, threads, args["SHOTS"], args["REPEATS"])
+            results.append(result)
+
+            phases = result["phases"]
+            seconds = phases.get("simulate", phases["total"])["median"]
+            timings.setdefault(case, {})[threads] = seconds
+            # Speedup over the smallest thread count
+            single = timings[case][min(timings[case])]
+            print(
+                "{:<16}{:>4} threads{:>10.4f}s{:>8.2f}x".format(
+                    case, threads, seconds, single / seconds
+                )
+            )
+
+    with open(args["OUTPUT"], "w") as file:
+        json.dump({"host": hostMetadata(), "cases": results}, file, indent=2)
+    print("Report written to {}".format(args["OUTPUT"]))
+
+    print(
+        "\nRecommended for {} experiment(s) side by side:\n[parallelism]".format(
+            args["CONCURRENT"]
+        )
+    )
+    for key, value in recommend(timings, args["CONCURRENT"]).items():
+        print("{} = {}".format(key, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Shared helpers for the experiment scripts
+
+The experiment scripts live in hyphenated files under src/experiment-*, so they
+cannot import each other. Anything reused by more than one experiment lives in
+this package instead.
+"""
@@ -0,0 +1,115 @@
+"""
+Choose which simulator runs a pyqpanda program
+
+Every backend takes the same arguments as CPUQVM.run_with_configuration and
+returns counts in the same format, so the experiments can switch between them
+through [simulation] backend in config.toml. Apart from running on the QVM
+that built the program, this goes through the executors of common/executors.py.
+Every run is checked against the [resources] memory budget first, see
+common/resources.py, and seeded runs go through the result cache of
+common/resultCache.py. Large shot counts are split across processes as
+configured in [simulation], see common/shotParallel.py.
+"""
+
+from typing import Any, Final
+
+import pyqpanda as pq
+
+from common.circuitSpec import CircuitSpec
+from common.executors import createExecutor, executorClasses
+from common.parallelism import parallelism
+from common.resources import (
+    backendMemory,
+    checkResources,
+    estimateResources,
+    memoryBudget,
+)
+from common.resultCache import resultCache
+from common.shotParallel import parallelExecutor
+from common.tracing import span
+from common.sparseSimulator import maxSparseQubits
+
+
+availableBackends: Final[list[str]] = list(executorClasses)
+
+
+def createQVM(
+    backend: str, numQubits: int, budget: dict[str, Any] | None = None
+) -> pq.CPUQVM:
+    """
+    Create the QVM a program allocates its qubits on
+
+    Unless CPUQVM simulates the program itself, the QVM only allocates qubits
+    and lowers the program, so its qubit cap is raised to what the other
+    backends can handle. That holds for every other backend, and for cpuqvm
+    when the statevector does not fit the memory budget, as runProgram then
+    reroutes the program. A program CPUQVM does run keeps CPUQVM's own cap.
+
+    Args:
+        backend (str): One of availableBackends
+        numQubits (int): Qubits the program allocates
+        budget (dict[str, Any] | None): The [resources] config section
+
+    Returns:
+        pq.CPUQVM: Initialized QVM
+    """
+
+    # The memory of a statevector run depends on its width alone
+    runsOnQVM = backend == "cpuqvm" and backendMemory(
+        estimateResources(CircuitSpec(numQubits)), backend
+    ) <= memoryBudget(budget)
+
+    qvm = pq.CPUQVM()
+    if not runsOnQVM:
+        qvm.set_configure(maxSparseQubits, maxSparseQubits)
+    qvm.init_qvm()
+
+    return parallelism.limitQVM(qvm)
+
+
+def runProgram(
+    backend: str,
+    qvm: pq.QuantumMachine,
+    prog: pq.QProg,
+    cBits: list[pq.ClassicalCondition],
+    shots: int,
+    seed: int | None = None,
+    options: dict[str, Any] | None = None,
+    budget: dict[str, Any] | None = None,
+    simulation: dict[str, Any] | None = None,
+) -> dict[str, int]:
+    """
+    Run a program on the chosen backend
+
+    Args:
+        backend (str): One of availableBackends
+        qvm (pq.QuantumMachine): Machine the qubits of the program belong to
+        prog (pq.QProg): Program to run
+        cBits (list[pq.ClassicalCondition]): The first len(cBits) allocated cbits
+        shots (int): Number of shots
+        seed (int | None): Seed of the sampler, see common/executors.py
+        options (dict[str, Any] | None): Config section named after the backend, if any
+        budget (dict[str, Any] | None): The [resources] config section
+        simulation (dict[str, Any] | None): The [simulation] config section, for
+            the shot-parallel settings
+
+    Raises:
+        MemoryError: No backend fits in the memory budget
+
+    Returns:
+        dict[str, int]: Counts keyed by the measured cbits
+    """
+
+    spec = CircuitSpec.fromPyQPanda(prog, qvm, len(cBits))
+    backend, options = checkResources(
+        estimateResources(spec, shots), backend, options, budget
+    )
+
+    executor = parallelExecutor(createExecutor(backend, options), simulation)
+    with span("runProgram", backend=backend, qubits=spec.numQubits, shots=shots):
+        if backend == "cpuqvm" and seed is None and not executor.splits(shots, seed):
+            resultCache.lastHit = False
+            with span("run_with_configuration", shots=shots):
+                return qvm.run_with_configuration(prog, cBits, shots)
+
+        return resultCache.run(executor, spec, shots, seed)
@@ -0,0 +1,224 @@
+"""
+Time the phases of an experiment and compare runs against a baseline
+
+A benchmark case is a function that receives a PhaseTimer and wraps each of
+its phases (build, transpile, simulate, render, post-process) in
+timer.phase(name). runCase repeats it and keeps the minimum and median of every
+phase, and the report is plain JSON with the host metadata, so two reports
+from different library versions can be compared with compareReports.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib import metadata
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable, Iterator
+import json
+import os
+import platform
+import subprocess
+
+import psutil
+
+
+# Libraries whose upgrades the benchmarks are meant to catch
+trackedPackages: list[str] = ["numpy", "pyqpanda", "qiskit", "qiskit-aer"]
+
+
+class PhaseTimer:
+    def __init__(self):
+        """
+        Collect the wall time of named phases
+        """
+
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a block, adding to the phase if it runs more than once
+
+        Args:
+            name (str): Phase name
+        """
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + perf_counter() - start
+
+
+def hostMetadata() -> dict[str, Any]:
+    """
+    Describe the machine and software a report was measured on
+
+    Returns:
+        dict[str, Any]: Platform, CPU, memory, package versions and git commit
+    """
+
+    versions: dict[str, str | None] = {}
+    for package in trackedPackages:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "cpuCount": os.cpu_count(),
+        "memoryBytes": psutil.virtual_memory().total,
+        "packages": versions,
+        "gitCommit": commit,
+    }
+
+
+def caseKey(name: str, params: dict[str, Any]) -> str:
+    """
+    Identify a case across reports
+
+    Args:
+        name (str): Case name
+        params (dict[str, Any]): Case parameters
+
+    Returns:
+        str: e.g. "adder[digits=4]"
+    """
+
+    return "{}[{}]".format(
+        name, ",".join("{}={}".format(key, params[key]) for key in sorted(params))
+    )
+
+
+def runCase(
+    name: str,
+    params: dict[str, Any],
+    function: Callable[[PhaseTimer], Any],
+    repeats: int = 3,
+) -> dict[str, Any]:
+    """
+    Run a benchmark case several times
+
+    A phase that a run skipped counts as 0 seconds in that run.
+
+    Args:
+        name (str): Case name
+        params (dict[str, Any]): Case parameters, recorded in the report
+        function (Callable[[PhaseTimer], Any]): The case, timing its phases
+        repeats (int): Number of runs
+
+    Returns:
+        dict[str, Any]: Key, name, params, and the min, median and runs of each phase
+    """
+
+    runs: list[dict[str, float]] = []
+    for _ in range(repeats):
+        timer = PhaseTimer()
+        with timer.phase("total"):
+            function(timer)
+        runs.append(timer.phases)
+
+    phases: dict[str, dict[str, Any]] = {}
+    # Every phase of any run, in the order they first ran
+    for phase in dict.fromkeys(phase for run in runs for phase in run):
+        seconds = [run.get(phase, 0.0) for run in runs]
+        phases[phase] = {
+            "min": min(seconds),
+            "median": median(seconds),
+            "runs": seconds,
+        }
+
+    return {
+        "key": caseKey(name, params),
+        "name": name,
+        "params": params,
+        "phases": phases,
+    }
+
+
+def writeReport(path: str, cases: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Write a benchmark report as JSON
+
+    Args:
+        path (str): Output file
+        cases (list[dict[str, Any]]): Results of runCase
+
+    Returns:
+        dict[str, Any]: The report
+    """
+
+    report = {"host": hostMetadata(), "cases": cases}
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+    return report
+
+
+def loadReport(path: str) -> dict[str, Any]:
+    with open(path) as file:
+        return json.load(file)
+
+
+def compareReports(
+    current: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float = 0.2,
+    minSeconds: float = 0.005,
+) -> list[dict[str, Any]]:
+    """
+    Find the phases that got slower than the baseline
+
+    Medians are compared; differences below minSeconds are timer noise and
+    never count as regressions.
+
+    Args:
+        current (dict[str, Any]): New report
+        baseline (dict[str, Any]): Reference report
+        threshold (float): Allowed relative slowdown, 0.2 = 20%
+        minSeconds (float): Smallest absolute slowdown that counts
+
+    Returns:
+        list[dict[str, Any]]: Every phase present in both reports, with its
+            key, phase, both medians, ratio and whether it regressed
+    """
+
+    baselineCases = {case["key"]: case for case in baseline["cases"]}
+
+    comparisons: list[dict[str, Any]] = []
+    for case in current["cases"]:
+        reference = baselineCases.get(case["key"])
+        if reference is None:
+            continue
+
+        for phase, timing in case["phases"].items():
+            if phase not in reference["phases"]:
+                continue
+
+            now = timing["median"]
+            before = reference["phases"][phase]["median"]
+            comparisons.append(
+                {
+                    "key": case["key"],
+                    "phase": phase,
+                    "baseline": before,
+                    "current": now,
+                    "ratio": now / before if before > 0 else float("inf"),
+                    "regressed": now > before * (1 + threshold)
+                    and now - before > minSeconds,
+                }
+            )
+
+    return comparisons
@@ -0,0 +1,210 @@
+"""
+Characterize a small circuit once for every basis input
+
+Sweeping a circuit over its inputs (the four rounds of bell-state.py, the
+(a, b) pairs of the experiment-2 arithmetic) normally costs one shot-sampled
+run per input. Instead, the circuit is simulated once on all the inputs at
+the same time:
+
+- circuits of permutation gates only (X, CNOT, Toffoli, MCX, SWAP, fused
+  PERMUTATION) map every basis input to one basis output, so a permutation
+  table over the input indices is enough, and it scales to wide registers
+- any other circuit is applied to the identity columns of the inputs, which
+  gives those columns of its unitary (the full unitary for every input), up to
+  maxUnitaryQubits qubits
+
+The output distribution of every input then follows from its column, and
+shots are drawn from it with the shared sampler of common/sampling.py.
+"""
+
+from typing import Final
+
+import numpy as np
+
+from common.circuitSpec import CircuitSpec
+from common.gates import Gate, gateMatrix, permutationGates
+from common.sampling import countKey, measurementOutcomes, sampleOutcomes
+from common.sparseSimulator import SparseStatevector
+from common.tracing import traced
+
+
+# Widest circuit whose unitary columns are computed, 2^12 x 2^12 is 256 MiB
+maxUnitaryQubits: Final[int] = 12
+
+
+def isPermutationCircuit(gates: list[Gate]) -> bool:
+    return all(
+        name in permutationGates or name == "PERMUTATION" for name, _, _ in gates
+    )
+
+
+def applyToColumns(columns: np.ndarray, gate: Gate) -> np.ndarray:
+    """
+    Apply a gate to every column of a 2^n x m matrix
+
+    Args:
+        columns (np.ndarray): One statevector per column, qubit q is bit q of the row
+        gate (Gate): Gate to apply
+
+    Returns:
+        np.ndarray: The new columns
+    """
+
+    qubits = gate[1]
+    arity = len(qubits)
+    numQubits = columns.shape[0].bit_length() - 1
+
+    # Axis numQubits - 1 - q is qubit q, the last axis is the column
+    tensor = columns.reshape([2] * numQubits + [-1])
+    axes = [numQubits - 1 - qubit for qubit in qubits]
+    matrix = gateMatrix(gate).reshape([2] * (2 * arity))
+
+    tensor = np.tensordot(matrix, tensor, axes=(list(range(arity, 2 * arity)), axes))
+    return np.moveaxis(tensor, list(range(arity)), axes).reshape(columns.shape)
+
+
+@traced()
+def unitaryColumns(spec: CircuitSpec, inputs: np.ndarray | None = None) -> np.ndarray:
+    """
+    Columns of the unitary of a circuit, measurements are ignored
+
+    Args:
+        spec (CircuitSpec): Circuit to characterize
+        inputs (np.ndarray | None): Basis inputs, defaults to all (the full unitary)
+
+    Raises:
+        ValueError: The circuit is wider than maxUnitaryQubits
+
+    Returns:
+        np.ndarray: 2^n x len(inputs) matrix, column j is the output state of inputs[j]
+    """
+
+    if spec.numQubits > maxUnitaryQubits:
+        raise ValueError(
+            "Unitaries are limited to {} qubits, got {}".format(
+                maxUnitaryQubits, spec.numQubits
+            )
+        )
+
+    size = 2**spec.numQubits
+    if inputs is None:
+        inputs = np.arange(size)
+
+    columns = np.zeros((size, len(inputs)), dtype=complex)
+    columns[inputs, np.arange(len(inputs))] = 1
+
+    gates, _ = spec.gatesAndMeasurements()
+    for gate in gates:
+        columns = applyToColumns(columns, gate)
+
+    return columns
+
+
+@traced()
+def permutationTable(spec: CircuitSpec, inputs: np.ndarray | None = None) -> np.ndarray:
+    """
+    Output basis state of every input of a circuit of permutation gates
+
+    Args:
+        spec (CircuitSpec): Circuit to characterize, see isPermutationCircuit
+        inputs (np.ndarray | None): Basis inputs, defaults to all 2^n
+
+    Raises:
+        ValueError: The circuit has a gate that is not a permutation
+
+    Returns:
+        np.ndarray: Output index of each input
+    """
+
+    gates, _ = spec.gatesAndMeasurements()
+    if not isPermutationCircuit(gates):
+        raise ValueError("{} is not a permutation circuit".format(spec.name or "Spec"))
+
+    # The inputs as the support of one sparse state: the permutation gates
+    # relabel the indices in place and never merge them, so the order holds
+    state = SparseStatevector(spec.numQubits)
+    state.indices = np.asarray(
+        np.arange(2**spec.numQubits) if inputs is None else inputs, dtype=np.int64
+    ).copy()
+    state.amplitudes = np.ones(state.indices.size, dtype=complex)
+    for name, qubits, params in gates:
+        if name == "PERMUTATION":
+            state.applyPermutationTable((name, qubits, params))
+        else:
+            state.applyPermutation(name, qubits)
+
+    return state.indices
+
+
+@traced()
+def outcomeDistributions(
+    spec: CircuitSpec, inputs: list[int]
+) -> dict[int, dict[str, float]]:
+    """
+    Measurement distribution of a circuit for each basis input
+
+    Args:
+        spec (CircuitSpec): Circuit to characterize
+        inputs (list[int]): Basis inputs, qubit q is bit q
+
+    Returns:
+        dict[int, dict[str, float]]: Input -> probability of each count key
+    """
+
+    gates, measurements = spec.gatesAndMeasurements()
+    inputArray = np.asarray(inputs, dtype=np.int64)
+
+    if isPermutationCircuit(gates):
+        outcomes = measurementOutcomes(
+            permutationTable(spec, inputArray), measurements, spec.numCbits
+        )
+        return {
+            int(index): {countKey(int(outcome), spec.numCbits): 1.0}
+            for index, outcome in zip(inputArray, outcomes)
+        }
+
+    probabilities = np.abs(unitaryColumns(spec, inputArray)) ** 2
+    outcomes = measurementOutcomes(
+        np.arange(2**spec.numQubits), measurements, spec.numCbits
+    )
+    keys, inverse = np.unique(outcomes, return_inverse=True)
+
+    distributions: dict[int, dict[str, float]] = {}
+    for column, index in enumerate(inputArray):
+        totals = np.bincount(inverse, weights=probabilities[:, column])
+        distributions[int(index)] = {
+            countKey(int(key), spec.numCbits): float(total)
+            for key, total in zip(keys, totals)
+            if total > 0
+        }
+
+    return distributions
+
+
+def characterizedCounts(
+    spec: CircuitSpec, inputs: list[int], shots: int, seed: int | None = None
+) -> dict[int, dict[str, int]]:
+    """
+    Counts of every input drawn from one characterization
+
+    Args:
+        spec (CircuitSpec): Circuit to characterize
+        inputs (list[int]): Basis inputs, qubit q is bit q
+        shots (int): Shots per input
+        seed (int | None): Seed of the sampler, shared by every input
+
+    Returns:
+        dict[int, dict[str, int]]: Input -> counts keyed by the cbits
+    """
+
+    counts: dict[int, dict[str, int]] = {}
+    for index, distribution in outcomeDistributions(spec, inputs).items():
+        counts[index] = sampleOutcomes(
+            np.array([int(key, 2) for key in distribution]),
+            np.array(list(distribution.values())),
+            spec.numCbits,
+            shots,
+            seed,
+        )
+
+    return counts
@@ -0,0 +1,165 @@
+"""
+Append-only checkpoint of a sweep, to resume it after a crash
+
+Every finished point is appended to a JSON lines file as its key and counts.
+The lines are buffered and written in batches of batchPoints points, or after
+flushSeconds, each batch followed by an fsync, so a crash loses at most the
+last batch. The first line holds the settings of the sweep (backend, options,
+shots, seed), and resuming with other settings is refused, as the counts
+would not be comparable.
+
+Reopening the file resumes the sweep: its points are skipped and their counts
+reused. Only the process that runs the sweep writes the file (the coordinator
+of common/distributed.py, never its workers), so parallel workers cannot
+record a point twice. A line cut short by the crash is dropped.
+"""
+
+from pathlib import Path
+from time import monotonic
+from typing import Any, Hashable
+import json
+import os
+
+
+def encodeKey(key: Hashable) -> str:
+    """
+    Text form of a point key, tuples and lists alike
+
+    Args:
+        key (Hashable): Key of a sweep point, e.g. ("adder", 4, a, b)
+
+    Returns:
+        str: Compact JSON of the key
+    """
+
+    return json.dumps(key, separators=(",", ":"))
+
+
+class SweepCheckpoint:
+    def __init__(
+        self,
+        path: str | Path,
+        settings: dict[str, Any],
+        batchPoints: int = 64,
+        flushSeconds: float = 30.0,
+    ):
+        """
+        Open a checkpoint, loading the points it already holds
+
+        Args:
+            path (str | Path): Checkpoint file, created if missing
+            settings (dict[str, Any]): What the counts depend on besides the circuit
+            batchPoints (int): Points buffered before a write
+            flushSeconds (float): Longest time a finished point stays buffered
+
+        Raises:
+            ValueError: The file was written by a sweep with other settings
+        """
+
+        self.path = Path(path)
+        # JSON round trip, so it compares equal to the stored copy
+        self.settings = json.loads(json.dumps(settings))
+        self.batchPoints = batchPoints
+        self.flushSeconds = flushSeconds
+
+        # Encoded key -> counts
+        self.results: dict[str, dict[str, int]] = {}
+        self.buffer: list[dict[str, Any]] = []
+        self.lastFlush = monotonic()
+
+        hasHeader = self.path.exists() and self.load()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "ab")
+        if not hasHeader:
+            self.write([{"settings": self.settings}])
+
+    def load(self) -> bool:
+        """
+        Read the finished points of an existing file
+
+        Returns:
+            bool: The file has its settings line
+        """
+
+        with open(self.path, "rb") as file:
+            data = file.read()
+
+        # Anything after the last newline is a line cut short by a crash
+        complete = data.rfind(b"\n") + 1
+        lines = data[:complete].splitlines()
+        if complete < len(data):
+            # Appended lines must start on a line of their own
+            with open(self.path, "r+b") as file:
+                file.truncate(complete)
+
+        if not lines:
+            return False
+
+        stored = json.loads(lines[0])["settings"]
+        if stored != self.settings:
+            raise ValueError(
+                "{} holds a sweep with settings {}, not {}".format(
+                    self.path, stored, self.settings
+                )
+            )
+
+        for line in lines[1:]:
+            entry = json.loads(line)
+            self.results[encodeKey(entry["key"])] = entry["counts"]
+
+        return True
+
+    def write(self, entries: list[dict[str, Any]]) -> None:
+        self.file.write(
+            b"".join(
+                json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+                for entry in entries
+            )
+        )
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return encodeKey(key) in self.results
+
+    def get(self, key: Hashable) -> dict[str, int]:
+        return self.results[encodeKey(key)]
+
+    def record(self, key: Hashable, counts: dict[str, int]) -> None:
+        """
+        Add a finished point, written with the next batch
+
+        Args:
+            key (Hashable): Key of the point
+            counts (dict[str, int]): Its counts
+        """
+
+        encoded = encodeKey(key)
+        if encoded in self.results:
+            return
+
+        self.results[encoded] = counts
+        self.buffer.append({"key": key, "counts": counts})
+        if (
+            len(self.buffer) >= self.batchPoints
+            or monotonic() - self.lastFlush >= self.flushSeconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.write(self.buffer)
+            self.buffer = []
+        self.lastFlush = monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self) -> "SweepCheckpoint":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Also on an error, which is when the finished points matter most
+        self.close()
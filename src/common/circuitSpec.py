@@ -0,0 +1,270 @@
+"""
+Engine-neutral circuit description
+
+A CircuitSpec is a list of gate tuples (see common/gates.py) on numbered
+qubits and cbits. It can be built directly, imported from a pyqpanda program
+or a qiskit circuit, and lowered to either engine again, so the same circuit can
+run on CPUQVM, Aer or the simulators of this package.
+"""
+
+from typing import Any
+
+import pyqpanda as pq
+import qiskit as qk
+
+from common.gates import Gate, deferMeasurements, gateMatrix, gatesFromQiskit
+from common.originir import parseOriginIR, programToOriginIR
+from common.tracing import traced
+
+
+class CircuitSpec:
+    def __init__(self, numQubits: int, numCbits: int = 0, name: str = ""):
+        """
+        Create an empty circuit
+
+        Args:
+            numQubits (int): Number of qubits
+            numCbits (int): Number of classical bits
+            name (str): Name used in reports
+        """
+
+        self.numQubits = numQubits
+        self.numCbits = numCbits
+        self.name = name
+        self.ops: list[Gate] = []
+
+    def append(
+        self, name: str, qubits: tuple[int, ...], params: tuple[float, ...] = ()
+    ) -> "CircuitSpec":
+        """
+        Append a gate or measurement
+
+        Args:
+            name (str): Gate name, see common/gates.py
+            qubits (tuple[int, ...]): Controls first, target last
+            params (tuple[float, ...]): Angles, or the cbit of a MEASURE
+
+        Returns:
+            CircuitSpec: self, so that calls can be chained
+        """
+
+        if any(qubit < 0 or qubit >= self.numQubits for qubit in qubits):
+            raise ValueError("Qubits {} out of range".format(qubits))
+        self.ops.append((name, tuple(qubits), tuple(params)))
+        return self
+
+    def h(self, qubit: int) -> "CircuitSpec":
+        return self.append("H", (qubit,))
+
+    def x(self, qubit: int) -> "CircuitSpec":
+        return self.append("X", (qubit,))
+
+    def z(self, qubit: int) -> "CircuitSpec":
+        return self.append("Z", (qubit,))
+
+    def ry(self, qubit: int, angle: float) -> "CircuitSpec":
+        return self.append("RY", (qubit,), (angle,))
+
+    def cx(self, control: int, target: int) -> "CircuitSpec":
+        return self.append("CNOT", (control, target))
+
+    def cz(self, control: int, target: int) -> "CircuitSpec":
+        return self.append("CZ", (control, target))
+
+    def ccx(self, control0: int, control1: int, target: int) -> "CircuitSpec":
+        return self.append("TOFFOLI", (control0, control1, target))
+
+    def mcx(self, controls: list[int], target: int) -> "CircuitSpec":
+        return self.append("MCX", (*controls, target))
+
+    def measure(self, qubit: int, cbit: int) -> "CircuitSpec":
+        if cbit < 0 or cbit >= self.numCbits:
+            raise ValueError("Cbit {} out of range".format(cbit))
+        return self.append("MEASURE", (qubit,), (cbit,))
+
+    def gatesAndMeasurements(self) -> tuple[list[Gate], list[tuple[int, int]]]:
+        """
+        Gates with every measurement deferred to the end
+
+        Returns:
+            tuple[list[Gate], list[tuple[int, int]]]: Gates, and (qubit, cbit) pairs
+        """
+
+        return deferMeasurements(self.ops)
+
+    @classmethod
+    @traced()
+    def fromPyQPanda(
+        cls, prog: pq.QProg, qvm: pq.QuantumMachine, numCbits: int | None = None
+    ) -> "CircuitSpec":
+        """
+        Import a pyqpanda program through its OriginIR text
+
+        Args:
+            prog (pq.QProg): Program to import
+            qvm (pq.QuantumMachine): Machine the qubits of the program belong to
+            numCbits (int | None): Cbits to keep (the first ones), defaults to all
+
+        Returns:
+            CircuitSpec: The imported circuit
+        """
+
+        numQubits, allCbits, ops = parseOriginIR(programToOriginIR(prog, qvm))
+        spec = cls(numQubits, allCbits if numCbits is None else numCbits)
+        spec.ops = [
+            op for op in ops if op[0] != "MEASURE" or int(op[2][0]) < spec.numCbits
+        ]
+        return spec
+
+    @classmethod
+    @traced()
+    def fromQiskit(cls, circuit: qk.QuantumCircuit) -> "CircuitSpec":
+        """
+        Import a qiskit circuit
+
+        Args:
+            circuit (qk.QuantumCircuit): Circuit to import
+
+        Returns:
+            CircuitSpec: The imported circuit
+        """
+
+        spec = cls(circuit.num_qubits, circuit.num_clbits, circuit.name)
+        spec.ops = gatesFromQiskit(circuit)
+        return spec
+
+    def toQiskit(self, measure: bool = True) -> qk.QuantumCircuit:
+        """
+        Lower to a qiskit circuit
+
+        Args:
+            measure (bool): Keep the measurements
+
+        Returns:
+            qk.QuantumCircuit: Circuit with one quantum and one classical register
+        """
+
+        circuit = qk.QuantumCircuit(self.numQubits, self.numCbits, name=self.name)
+
+        for name, qubits, params in self.ops:
+            match name:
+                case "MEASURE":
+                    if measure:
+                        circuit.measure(qubits[0], int(params[0]))
+                case "I":
+                    circuit.id(qubits[0])
+                case "H" | "X" | "Y" | "Z" | "S" | "T":
+                    getattr(circuit, name.lower())(qubits[0])
+                case "RX" | "RY" | "RZ":
+                    getattr(circuit, name.lower())(params[0], qubits[0])
+                case "U1":
+                    circuit.p(params[0], qubits[0])
+                case "U3":
+                    circuit.u(*params, qubits[0])
+                case "CNOT":
+                    circuit.cx(*qubits)
+                case "CZ":
+                    circuit.cz(*qubits)
+                case "CR":
+                    circuit.cp(params[0], *qubits)
+                case "SWAP":
+                    circuit.swap(*qubits)
+                case "TOFFOLI":
+                    circuit.ccx(*qubits)
+                case "MCX":
+                    circuit.mcx(list(qubits[:-1]), qubits[-1])
+                case _:
+                    # qiskit matrices have their first qubit as the least significant bit
+                    circuit.unitary(
+                        gateMatrix((name, qubits, params)), list(reversed(qubits))
+                    )
+
+        return circuit
+
+    def toPyQPanda(
+        self,
+        qubits: list[pq.Qubit],
+        cBits: list[pq.ClassicalCondition],
+        measure: bool = True,
+    ) -> pq.QProg:
+        """
+        Lower to a pyqpanda program
+
+        Args:
+            qubits (list[pq.Qubit]): At least numQubits allocated qubits
+            cBits (list[pq.ClassicalCondition]): At least numCbits allocated cbits
+            measure (bool): Keep the measurements
+
+        Returns:
+            pq.QProg: The program
+        """
+
+        prog = pq.QProg()
+
+        for name, gateQubits, params in self.ops:
+            targets = [qubits[qubit] for qubit in gateQubits]
+            match name:
+                case "MEASURE":
+                    if measure:
+                        prog << pq.Measure(targets[0], cBits[int(params[0])])
+                case "I" | "H" | "X" | "Y" | "Z" | "S" | "T":
+                    prog << getattr(pq, name)(targets[0])
+                case "RX" | "RY" | "RZ" | "U1":
+                    prog << getattr(pq, name)(targets[0], params[0])
+                case "U3":
+                    prog << pq.U3(targets[0], *params)
+                case "CNOT" | "CZ" | "SWAP":
+                    prog << getattr(pq, name)(*targets)
+                case "CR":
+                    prog << pq.CR(*targets, params[0])
+                case "TOFFOLI":
+                    prog << pq.Toffoli(*targets)
+                case "MCX":
+                    prog << pq.X(targets[-1]).control(targets[:-1])
+                case _:
+                    raise ValueError("{} cannot be lowered to pyqpanda".format(name))
+
+        return prog
+
+    def toDict(self) -> dict[str, Any]:
+        """
+        JSON-friendly form, e.g. to send a circuit to another host
+
+        Returns:
+            dict[str, Any]: Widths, name and ops as lists
+        """
+
+        return {
+            "numQubits": self.numQubits,
+            "numCbits": self.numCbits,
+            "name": self.name,
+            "ops": [
+                [name, list(qubits), list(params)] for name, qubits, params in self.ops
+            ],
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict[str, Any]) -> "CircuitSpec":
+        """
+        Rebuild a circuit from toDict()
+
+        Args:
+            data (dict[str, Any]): Result of toDict, possibly through JSON
+
+        Returns:
+            CircuitSpec: The circuit
+        """
+
+        spec = cls(data["numQubits"], data["numCbits"], data["name"])
+        spec.ops = [
+            (name, tuple(qubits), tuple(params)) for name, qubits, params in data["ops"]
+        ]
+        return spec
+
+    def __repr__(self) -> str:
+        counts: dict[str, int] = {}
+        for name, _, _ in self.ops:
+            counts[name] = counts.get(name, 0) + 1
+        return "CircuitSpec(name={!r}, qubits={}, cbits={}, ops={})".format(
+            self.name, self.numQubits, self.numCbits, counts
+        )
@@ -0,0 +1,390 @@
+"""
+Grover search over a stream of CNF formulas, on a pool of capped processes
+
+runInstances() takes formulas lazily (e.g. from readDimacs() over a directory)
+and keeps one in flight on each worker process, so a directory of any size is
+never held in memory. Each worker builds the oracle of common/grover.py and
+either counts the solutions classically and runs the Grover circuit with the
+optimal iteration count, or searches without the count on the schedule of
+common/groverSearch.py. Every measured assignment is checked against the
+formula.
+
+Every formula runs under a time and a memory cap. The time cap is enforced by
+the parent, which terminates a worker that overruns and starts a new one. The
+memory cap is enforced twice: a circuit whose estimate does not fit is
+refused before it allocates (see common/resources.py), and the parent
+terminates a worker whose resident memory grows past the cap. The resident
+memory counts from what the idle worker holds when it picks the formula up,
+as the imported engines alone take a few hundred MiB.
+
+Results come back as they finish, not in input order.
+"""
+
+from functools import partial
+from math import asin, sin, sqrt
+from multiprocessing.connection import Connection, wait
+from time import perf_counter
+from typing import Any, Final, Iterable, Iterator
+import multiprocessing
+import traceback
+
+import psutil
+
+from common.circuitSpec import CircuitSpec
+from common.executors import createExecutor
+from common.grover import (
+    cnfOracle,
+    groverCircuit,
+    groverLayout,
+    optimalIterations,
+    satisfies,
+    satisfyingMask,
+    simplifiedClauses,
+)
+from common.groverSearch import bbhtSearch
+from common.parallelism import configureParallelism, parallelism
+from common.resources import checkResources, estimateResources, formatBytes
+from common.tracing import span
+
+# Seconds between two checks of the caps
+pollSeconds: Final[float] = 0.05
+# Seconds a terminated worker gets to exit before it is killed
+terminateSeconds: Final[float] = 2.0
+
+
+def dimacsAssignment(assignment: int, numVariables: int) -> list[int]:
+    """
+    Assignment as DIMACS literals
+
+    Args:
+        assignment (int): Bit v - 1 is variable v
+        numVariables (int): Number of variables
+
+    Returns:
+        list[int]: v for a true variable v, -v for a false one
+    """
+
+    return [
+        variable if (assignment >> (variable - 1)) & 1 else -variable
+        for variable in range(1, numVariables + 1)
+    ]
+
+
+def solveInstance(
+    name: str,
+    numVariables: int,
+    clauses: list[list[int]],
+    settings: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Search for a satisfying assignment of one formula with Grover
+
+    Args:
+        name (str): Name of the formula in the results
+        numVariables (int): Number of variables
+        clauses (list[list[int]]): Clauses of signed variables
+        settings (dict[str, Any]): "backend", "options", "shots", "seed",
+            "mcxStrategy", "memoryLimitMiB" and "schedule": "optimal" (the
+            solutions are counted classically first) or "bbht" (they are not,
+            see common/groverSearch.py)
+
+    Raises:
+        MemoryError: The circuit does not fit in the memory cap
+
+    Returns:
+        dict[str, Any]: Result of the formula, see runInstances()
+    """
+
+    start = perf_counter()
+    numWorkQubits = len(simplifiedClauses(clauses))
+    layout = groverLayout(numVariables, settings["mcxStrategy"], numWorkQubits)
+    # The memory of a run depends on its width alone, so an empty circuit of
+    # that width refuses a formula before anything is allocated
+    checkResources(
+        estimateResources(
+            CircuitSpec(layout["oracle"][0] + 1, numVariables), settings["shots"]
+        ),
+        settings["backend"],
+        settings["options"],
+        {"memoryBudgetMiB": settings["memoryLimitMiB"], "report": False},
+        reroute=False,
+    )
+
+    oracle = cnfOracle(numVariables, clauses, settings["mcxStrategy"])
+    executor = createExecutor(settings["backend"], settings["options"])
+    result = {
+        "instance": name,
+        "status": "ok",
+        "variables": numVariables,
+        "clauses": len(clauses),
+        "qubits": layout["oracle"][0] + 1,
+    }
+
+    if settings.get("schedule", "optimal") == "bbht":
+        with span("cnf instance", instance=name, qubits=result["qubits"]):
+            search = bbhtSearch(
+                numVariables,
+                oracle,
+                partial(satisfies, clauses),
+                executor,
+                settings["mcxStrategy"],
+                numWorkQubits,
+                settings["seed"],
+            )
+        return {
+            **result,
+            "schedule": "bbht",
+            "found": search["solution"] is not None,
+            "solution": (
+                None
+                if search["solution"] is None
+                else dimacsAssignment(search["solution"], numVariables)
+            ),
+            "oracleCalls": search["oracleCalls"],
+            "trials": search["trials"],
+            "shots": search["trials"],
+            "counts": search["counts"],
+            "simulateSeconds": perf_counter() - start,
+        }
+
+    numSolutions = int(satisfyingMask(numVariables, clauses).sum())
+    iterations = optimalIterations(numVariables, numSolutions)
+    spec = CircuitSpec.fromQiskit(
+        groverCircuit(
+            numVariables,
+            oracle,
+            iterations,
+            settings["mcxStrategy"],
+            numWorkQubits=numWorkQubits,
+        )
+    )
+    spec.name = name
+    built = perf_counter()
+
+    with span("cnf instance", instance=name, qubits=spec.numQubits):
+        counts = executor.run(spec, settings["shots"], settings["seed"])
+    simulated = perf_counter()
+
+    # Measured assignments that satisfy the formula, most frequent first
+    solutions = sorted(
+        (
+            (count, int(key, 2))
+            for key, count in counts.items()
+            if satisfies(clauses, int(key, 2))
+        ),
+        reverse=True,
+    )
+    theta = asin(sqrt(numSolutions / 2**numVariables))
+
+    return {
+        **result,
+        "schedule": "optimal",
+        "found": bool(solutions),
+        "solution": (
+            dimacsAssignment(solutions[0][1], numVariables) if solutions else None
+        ),
+        "satisfyingAssignments": numSolutions,
+        "iterations": iterations,
+        # Each shot costs every iteration, as it reruns the circuit
+        "oracleCalls": iterations * settings["shots"],
+        "shots": settings["shots"],
+        "successProbability": sum(count for count, _ in solutions) / settings["shots"],
+        "expectedProbability": sin((2 * iterations + 1) * theta) ** 2,
+        "solutionsFound": len(solutions),
+        "counts": counts,
+        "buildSeconds": built - start,
+        "simulateSeconds": simulated - built,
+    }
+
+
+def instanceWorker(
+    connection: Connection,
+    settings: dict[str, Any],
+    parallelismSection: dict[str, Any],
+) -> None:
+    """
+    Solve the formulas sent over a connection until it sends None
+
+    Args:
+        connection (Connection): Pipe to the parent
+        settings (dict[str, Any]): See solveInstance()
+        parallelismSection (dict[str, Any]): [parallelism] config section
+    """
+
+    configureParallelism({"parallelism": parallelismSection})
+
+    while (task := connection.recv()) is not None:
+        name, numVariables, clauses = task
+        # The caps start now, not while the process imports the engines
+        connection.send({"started": name, "memory": psutil.Process().memory_info().rss})
+        try:
+            result = solveInstance(name, numVariables, clauses, settings)
+        except MemoryError as error:
+            result = {"instance": name, "status": "memory", "error": str(error)}
+        except Exception as error:
+            result = {
+                "instance": name,
+                "status": "error",
+                "error": "".join(traceback.format_exception_only(error)).strip(),
+            }
+        connection.send(result)
+
+
+class InstanceSlot:
+    def __init__(self, context: Any, settings: dict[str, Any]):
+        """
+        Start a worker process
+
+        Args:
+            context (Any): Multiprocessing context
+            settings (dict[str, Any]): See solveInstance()
+        """
+
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=instanceWorker,
+            args=(child, settings, parallelism.section),
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.monitor = psutil.Process(self.process.pid)
+        self.task: tuple[str, int, list[list[int]]] | None = None
+        # Set when the worker picks the task up, with its resident memory then
+        self.started: float | None = None
+        self.idleMemory = 0
+
+    def submit(self, task: tuple[str, int, list[list[int]]]) -> None:
+        self.task = task
+        self.started = None
+        self.connection.send(task)
+
+    def memory(self) -> int:
+        try:
+            return self.monitor.memory_info().rss
+        except psutil.Error:
+            return 0
+
+    def stop(self, force: bool = False) -> None:
+        if force:
+            self.process.terminate()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join(terminateSeconds)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+def runInstances(
+    instances: Iterable[tuple[str, int, list[list[int]]]],
+    settings: dict[str, Any],
+    workers: int,
+    timeoutSeconds: float,
+) -> Iterator[dict[str, Any]]:
+    """
+    Solve formulas on a pool of worker processes, each under the caps
+
+    Args:
+        instances (Iterable[tuple[str, int, list[list[int]]]]): Name, number of
+            variables and clauses of each formula, consumed lazily
+        settings (dict[str, Any]): See solveInstance(); memoryLimitMiB is also
+            the resident memory a worker may add to what it holds idle
+        workers (int): Worker processes
+        timeoutSeconds (float): Longest time a formula may run
+
+    Returns:
+        Iterator[dict[str, Any]]: One result per formula as it finishes, with
+            "instance", "status" ("ok", "timeout", "memory" or "error") and
+            "seconds"; an "ok" result also has the solution (the most frequent
+            one measured), the oracle calls and the counts, and with the
+            optimal schedule the measured and expected success probabilities
+    """
+
+    # spawn: the engines start OpenMP threads, which do not survive fork
+    context = multiprocessing.get_context("spawn")
+    memoryLimit = int(settings["memoryLimitMiB"] * 2**20)
+    pending = iter(instances)
+    slots: list[InstanceSlot] = []
+    exhausted = False
+
+    try:
+        while True:
+            # Keep every worker busy while formulas remain
+            while not exhausted and (
+                len(slots) < workers or any(slot.task is None for slot in slots)
+            ):
+                task = next(pending, None)
+                if task is None:
+                    exhausted = True
+                    break
+                slot = next((slot for slot in slots if slot.task is None), None)
+                if slot is None:
+                    slot = InstanceSlot(context, settings)
+                    slots.append(slot)
+                slot.submit(task)
+
+            busy = [slot for slot in slots if slot.task is not None]
+            if not busy:
+                return
+
+            ready = wait([slot.connection for slot in busy], pollSeconds)
+            for slot in busy:
+                # Busy slots always hold a task
+                task = slot.task
+                assert task is not None
+                seconds = 0.0 if slot.started is None else perf_counter() - slot.started
+                if slot.connection in ready:
+                    try:
+                        result = slot.connection.recv()
+                        healthy = True
+                        if "started" in result:
+                            slot.started = perf_counter()
+                            slot.idleMemory = result["memory"]
+                            continue
+                    except EOFError:
+                        # The worker died, e.g. killed by the kernel
+                        result = {
+                            "instance": task[0],
+                            "status": "error",
+                            "error": "worker exited with code {}".format(
+                                slot.process.exitcode
+                            ),
+                        }
+                        healthy = False
+                elif seconds > timeoutSeconds:
+                    result = {"instance": task[0], "status": "timeout"}
+                    healthy = False
+                elif slot.started is not None and (
+                    (memory := slot.memory()) - slot.idleMemory > memoryLimit
+                ):
+                    result = {
+                        "instance": task[0],
+                        "status": "memory",
+                        "error": "resident memory grew from {} to {}, more "
+                        "than the limit of {}".format(
+                            formatBytes(slot.idleMemory),
+                            formatBytes(memory),
+                            formatBytes(memoryLimit),
+                        ),
+                    }
+                    healthy = False
+                else:
+                    continue
+
+                if healthy:
+                    slot.task = None
+                else:
+                    # Stuck in the formula or gone, replace it
+                    slot.stop(force=True)
+                    slots[slots.index(slot)] = InstanceSlot(context, settings)
+
+                result["seconds"] = seconds
+                yield result
+    finally:
+        for slot in slots:
+            slot.stop(force=slot.task is not None)
@@ -0,0 +1,135 @@
+"""
+In-place gate kernels for dense statevector blocks
+
+A block is a flat complex array of 2^n amplitudes, qubit q being bit q of the
+index. The kernels only ever touch the amplitudes a gate acts on, through
+numpy views of the block reshaped as an n-dimensional tensor.
+"""
+
+from typing import Any
+
+import numpy as np
+
+from common.gates import Gate, diagonalGates, gateMatrix, permutationGates
+from common.sampling import measurementOutcomes, sampleOutcomes
+
+
+def applyPermutationDense(tensor: np.ndarray, name: str, qubits: tuple[int, ...]):
+    """
+    Swap the slices an X-type gate exchanges
+
+    Args:
+        tensor (np.ndarray): Block reshaped to [2] * n, axis 0 is the highest qubit
+        name (str): One of permutationGates
+        qubits (tuple[int, ...]): Controls first, target last
+    """
+
+    numQubits = tensor.ndim
+    index: list[Any] = [slice(None)] * numQubits
+
+    if name == "SWAP":
+        first, second = qubits
+        index[numQubits - 1 - first], index[numQubits - 1 - second] = 0, 1
+        left = tuple(index)
+        index[numQubits - 1 - first], index[numQubits - 1 - second] = 1, 0
+        right = tuple(index)
+    else:
+        *controls, target = qubits
+        for control in controls:
+            index[numQubits - 1 - control] = 1
+        index[numQubits - 1 - target] = 0
+        left = tuple(index)
+        index[numQubits - 1 - target] = 1
+        right = tuple(index)
+
+    swapped = tensor[left].copy()
+    tensor[left] = tensor[right]
+    tensor[right] = swapped
+
+
+def applyGateDense(block: np.ndarray, gate: Gate) -> None:
+    """
+    Apply a gate to a dense block in place
+
+    Args:
+        block (np.ndarray): Flat array of 2^n amplitudes
+        gate (Gate): Gate to apply, qubits must be below n
+    """
+
+    name, qubits, _ = gate
+    numQubits = block.size.bit_length() - 1
+    tensor = block.reshape([2] * numQubits)
+    axes = [numQubits - 1 - qubit for qubit in qubits]
+
+    if name in permutationGates:
+        applyPermutationDense(tensor, name, qubits)
+        return
+
+    if name == "PERMUTATION":
+        # Move the gate axes to the front, then reorder their 2^k slices at once
+        moved = np.moveaxis(tensor, axes, list(range(len(qubits))))
+        slices = moved.reshape(2 ** len(qubits), -1)
+        permuted = np.empty_like(slices)
+        permuted[np.array(gate[2], dtype=np.int64)] = slices
+        moved[...] = permuted.reshape(moved.shape)
+        return
+
+    matrix = gateMatrix(gate)
+    numGateQubits = len(qubits)
+
+    if name in diagonalGates:
+        # Broadcast the phases along the gate axes only
+        phases = np.diag(matrix).reshape([2] * numGateQubits)
+        shape = [1] * numQubits
+        for axis in axes:
+            shape[axis] = 2
+        order = np.argsort(axes)
+        tensor *= np.transpose(phases, order).reshape(shape)
+        return
+
+    result = np.tensordot(
+        matrix.reshape([2] * (2 * numGateQubits)),
+        tensor,
+        axes=(list(range(numGateQubits, 2 * numGateQubits)), axes),
+    )
+    tensor[...] = np.moveaxis(result, list(range(numGateQubits)), axes)
+
+
+def sampleDenseCounts(
+    amplitudes: np.ndarray,
+    measurements: list[tuple[int, int]],
+    numCbits: int,
+    shots: int,
+    seed: int | None = None,
+    chunkSize: int = 2**20,
+) -> dict[str, int]:
+    """
+    Sample measurement outcomes from dense amplitudes, chunk by chunk
+
+    Args:
+        amplitudes (np.ndarray): Flat amplitudes (an in-memory array or a memmap)
+        measurements (list[tuple[int, int]]): (qubit, cbit) pairs
+        numCbits (int): Width of the outcome keys, cbits beyond it are dropped
+        shots (int): Number of samples
+        seed (int | None): Seed of the sampler
+        chunkSize (int): Amplitudes read at a time
+
+    Returns:
+        dict[str, int]: Counts keyed like pyqpanda, cbit 0 is the rightmost character
+    """
+
+    probabilities = np.zeros(2**numCbits)
+    for start in range(0, amplitudes.size, chunkSize):
+        stop = min(start + chunkSize, amplitudes.size)
+        outcomes = measurementOutcomes(
+            np.arange(start, stop, dtype=np.int64), measurements, numCbits
+        )
+        probabilities += np.bincount(
+            outcomes,
+            weights=np.abs(amplitudes[start:stop]) ** 2,
+            minlength=probabilities.size,
+        )
+
+    return sampleOutcomes(
+        np.arange(probabilities.size), probabilities, numCbits, shots, seed
+    )
@@ -0,0 +1,61 @@
+"""
+In-memory dense statevector simulator
+
+The reference simulator of this package: 2^n complex amplitudes in a numpy
+array, one sweep per gate. Gate fusion (common/fusion.py) cuts the number of
+sweeps.
+"""
+
+import numpy as np
+
+from common.denseKernels import applyGateDense, sampleDenseCounts
+from common.gates import Gate
+
+
+class DenseStatevector:
+    def __init__(self, numQubits: int):
+        """
+        Start in |0...0>
+
+        Args:
+            numQubits (int): Number of qubits
+        """
+
+        self.numQubits = numQubits
+        self.amplitudes = np.zeros(2**numQubits, dtype=complex)
+        self.amplitudes[0] = 1
+        self.sweeps = 0
+
+    def run(self, gates: list[Gate]) -> None:
+        """
+        Apply gates in order, one statevector sweep each
+
+        Args:
+            gates (list[Gate]): Gates without measurements
+        """
+
+        for gate in gates:
+            applyGateDense(self.amplitudes, gate)
+        self.sweeps += len(gates)
+
+    def sampleCounts(
+        self,
+        measurements: list[tuple[int, int]],
+        numCbits: int,
+        shots: int,
+        seed: int | None = None,
+    ) -> dict[str, int]:
+        """
+        Sample measurement outcomes from the final state
+
+        Args:
+            measurements (list[tuple[int, int]]): (qubit, cbit) pairs
+            numCbits (int): Width of the outcome keys, cbits beyond it are dropped
+            shots (int): Number of samples
+            seed (int | None): Seed of the sampler
+
+        Returns:
+            dict[str, int]: Counts keyed like pyqpanda, cbit 0 is the rightmost character
+        """
+
+        return sampleDenseCounts(self.amplitudes, measurements, numCbits, shots, seed)
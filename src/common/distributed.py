@@ -0,0 +1,570 @@
+"""
+Run a sweep across hosts: one coordinator and any number of pulling workers
+
+A sweep is a set of circuits keyed by their parameters (every adder width and
+operand pair, Grover over every marked state, ...). The coordinator cuts it
+into chunks of chunkPoints points and serves them over TCP. Each worker pulls
+a chunk, runs it with runBatch() on its local engine (one Aer job per chunk),
+sends the counts back and pulls the next one, so fast workers simply run more
+chunks.
+
+Protocol, one JSON object per line:
+
+    worker       {"type": "ready", "worker": name}
+    coordinator  {"type": "chunk", "chunk": id, "backend": ..., "options": ...,
+                  "shots": ..., "seed": ..., "points": [[index, spec], ...]}
+                 or {"type": "done"}
+    worker       {"type": "result", "chunk": id, "counts": [[index, counts], ...],
+                  "seconds": ...}
+                 or {"type": "error", "chunk": id, "error": message}
+
+The coordinator answers every result or error with the next chunk, or done.
+A point travels as its index and CircuitSpec.toDict(); the parameter keys
+stay on the coordinator.
+
+Work stealing: once every chunk has been handed out, an idle worker gets a
+copy of the chunk that has been running longest on a straggler (at most
+maxCopies runs of a chunk), and the first result of a chunk wins. A worker
+that disconnects puts the chunks only it was running back in the queue. With
+a seed every copy gives the same counts, so the result never depends on
+which copy won.
+
+A run of a chunk fails when its worker reports an error or disconnects
+before the result. The chunk goes back in the queue until it has failed
+maxAttempts times, then the sweep fails with a RuntimeError rather than
+handing the chunk out forever.
+
+With a SweepCheckpoint (common/checkpoint.py) the coordinator records every
+finished point and skips those an earlier, interrupted run finished.
+
+runLocalSweep() starts the workers as processes on localhost, to test the
+protocol or to use the cores of one host.
+"""
+
+from collections import deque
+from time import perf_counter
+from typing import Any, Final, Hashable
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+
+from common.checkpoint import SweepCheckpoint
+from common.circuitSpec import CircuitSpec
+from common.executors import createExecutor
+from common.parallelism import configureParallelism, parallelism
+from common.tracing import span
+
+# Longest message line, a chunk of wide circuits can be large
+messageLimit: Final[int] = 2**28
+
+
+def encodeMessage(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class SweepCoordinator:
+    def __init__(
+        self,
+        specs: dict[Hashable, CircuitSpec],
+        shots: int,
+        seed: int | None = None,
+        backend: str = "aer",
+        options: dict[str, Any] | None = None,
+        chunkPoints: int = 16,
+        maxCopies: int = 2,
+        checkpoint: SweepCheckpoint | None = None,
+        maxAttempts: int = 3,
+    ):
+        """
+        Coordinator of one sweep
+
+        Args:
+            specs (dict[Hashable, CircuitSpec]): Circuits keyed by their parameters
+            shots (int): Shots of each circuit
+            seed (int | None): Seed of the sampler, shared by every point
+            backend (str): Executor the workers run, see common/executors.py
+            options (dict[str, Any] | None): Config section named after the backend
+            chunkPoints (int): Points per chunk
+            maxCopies (int): Workers that may run the same chunk, 1 disables stealing
+            checkpoint (SweepCheckpoint | None): Points finished by an earlier
+                run are skipped, and every point finished now is recorded
+            maxAttempts (int): Failed runs of a chunk after which the sweep fails
+        """
+
+        # Every key, in order, and the counts of the points resumed
+        self.allKeys = list(specs)
+        self.checkpoint = checkpoint
+        self.resumed: dict[Hashable, dict[str, int]] = {}
+        if checkpoint is not None:
+            self.resumed = {
+                key: checkpoint.get(key) for key in specs if key in checkpoint
+            }
+            specs = {key: spec for key, spec in specs.items() if key not in checkpoint}
+
+        self.keys = list(specs)
+        self.specs = list(specs.values())
+        self.shots = shots
+        self.seed = seed
+        self.backend = backend
+        self.options = options or {}
+        self.maxCopies = maxCopies
+        self.maxAttempts = maxAttempts
+
+        # Chunk id -> indices of its points
+        self.chunks: list[list[int]] = [
+            list(range(start, min(start + chunkPoints, len(self.specs))))
+            for start in range(0, len(self.specs), chunkPoints)
+        ]
+        self.pending: deque[int] = deque(range(len(self.chunks)))
+        # Chunk id -> worker -> start time, for the chunks not finished yet
+        self.running: dict[int, dict[str, float]] = {}
+        self.finished: set[int] = set()
+        # Chunk id -> failed runs, and why the sweep failed
+        self.failures: dict[int, int] = {}
+        self.failure: str | None = None
+        # Point index -> counts
+        self.counts: dict[int, dict[str, int]] = {}
+
+        # Chunks whose result won, by worker
+        self.chunksByWorker: dict[str, int] = {}
+        self.stolenCopies = 0
+        self.droppedResults = 0
+
+        self.changed = asyncio.Condition()
+        # Open connections, closed once the sweep is done
+        self.connections: list[tuple[asyncio.Task, asyncio.StreamWriter]] = []
+        self.server: asyncio.Server | None = None
+
+    def isDone(self) -> bool:
+        return len(self.finished) == len(self.chunks)
+
+    def isOver(self) -> bool:
+        return self.isDone() or self.failure is not None
+
+    def pick(self, worker: str) -> int | None:
+        """
+        Next chunk for a worker: a queued one, else a copy of a straggler's
+
+        Args:
+            worker (str): Name of the worker
+
+        Returns:
+            int | None: Chunk id, None if there is nothing to run right now
+        """
+
+        if self.pending:
+            chunk = self.pending.popleft()
+        else:
+            stealable = [
+                chunk
+                for chunk, runners in self.running.items()
+                if worker not in runners and len(runners) < self.maxCopies
+            ]
+            if not stealable:
+                return None
+            # The copy that has been running longest is the likeliest straggler
+            chunk = min(stealable, key=lambda chunk: min(self.running[chunk].values()))
+            self.stolenCopies += 1
+
+        self.running.setdefault(chunk, {})[worker] = perf_counter()
+        return chunk
+
+    async def nextChunk(self, worker: str) -> int | None:
+        """
+        Wait for a chunk to run
+
+        Args:
+            worker (str): Name of the worker
+
+        Returns:
+            int | None: Chunk id, None once the sweep is done
+        """
+
+        async with self.changed:
+            while True:
+                if self.isOver():
+                    return None
+                chunk = self.pick(worker)
+                if chunk is not None:
+                    return chunk
+                # Every chunk is running on enough workers, wait for one to
+                # finish or to be given back
+                await self.changed.wait()
+
+    async def finish(
+        self, worker: str, chunk: int, counts: list[tuple[int, dict[str, int]]]
+    ) -> None:
+        async with self.changed:
+            self.running.get(chunk, {}).pop(worker, None)
+            if chunk in self.finished:
+                # A copy of this chunk already won
+                self.droppedResults += 1
+                return
+
+            self.finished.add(chunk)
+            self.running.pop(chunk, None)
+            self.counts.update(counts)
+            if self.checkpoint is not None:
+                for index, result in counts:
+                    self.checkpoint.record(self.keys[index], result)
+            self.chunksByWorker[worker] = self.chunksByWorker.get(worker, 0) + 1
+            self.changed.notify_all()
+
+    def failRun(self, worker: str, chunk: int, error: str) -> None:
+        """
+        Count a failed run of a chunk, and requeue it or fail the sweep
+
+        Args:
+            worker (str): Name of the worker that ran it
+            chunk (int): Chunk id
+            error (str): Why the run failed
+        """
+
+        runners = self.running.get(chunk, {})
+        if worker not in runners or chunk in self.finished:
+            return
+        del runners[worker]
+
+        self.failures[chunk] = self.failures.get(chunk, 0) + 1
+        if self.failures[chunk] >= self.maxAttempts:
+            self.failure = "Chunk {} failed {} times, last on {}: {}".format(
+                chunk, self.failures[chunk], worker, error
+            )
+        elif not runners:
+            # Behind the other chunks, so a bad chunk does not hold them up
+            del self.running[chunk]
+            self.pending.append(chunk)
+        self.changed.notify_all()
+
+    async def fail(self, worker: str, chunk: int, error: str) -> None:
+        async with self.changed:
+            self.failRun(worker, chunk, error)
+
+    async def release(self, worker: str) -> None:
+        # A worker that left failed the chunks it was running
+        async with self.changed:
+            for chunk, runners in list(self.running.items()):
+                if worker in runners:
+                    self.failRun(worker, chunk, "worker disconnected")
+            self.changed.notify_all()
+
+    async def abort(self, reason: str) -> None:
+        """
+        Fail the sweep unless it is done, e.g. once no worker is left to run it
+
+        Args:
+            reason (str): Message of the RuntimeError wait() raises
+        """
+
+        async with self.changed:
+            if not self.isOver():
+                self.failure = reason
+            self.changed.notify_all()
+
+    def chunkMessage(self, chunk: int) -> dict[str, Any]:
+        return {
+            "type": "chunk",
+            "chunk": chunk,
+            "backend": self.backend,
+            "options": self.options,
+            "shots": self.shots,
+            "seed": self.seed,
+            "points": [
+                [index, self.specs[index].toDict()] for index in self.chunks[chunk]
+            ],
+        }
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Serve one worker connection until the sweep is done or the worker leaves
+
+        Args:
+            reader (asyncio.StreamReader): Messages of the worker
+            writer (asyncio.StreamWriter): Messages to the worker
+        """
+
+        task = asyncio.current_task()
+        # start_server runs every connection in a task of its own
+        assert task is not None
+        self.connections.append((task, writer))
+        worker = "{}:{}".format(*writer.get_extra_info("peername")[:2])
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                match message["type"]:
+                    case "ready":
+                        worker = message.get("worker", worker)
+                    case "result":
+                        await self.finish(
+                            worker,
+                            message["chunk"],
+                            [(index, counts) for index, counts in message["counts"]],
+                        )
+                    case "error":
+                        await self.fail(worker, message["chunk"], message["error"])
+
+                chunk = await self.nextChunk(worker)
+                if chunk is None:
+                    writer.write(encodeMessage({"type": "done"}))
+                    await writer.drain()
+                    break
+
+                writer.write(encodeMessage(self.chunkMessage(chunk)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            await self.release(worker)
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """
+        Listen for workers
+
+        Args:
+            host (str): Interface to listen on, "0.0.0.0" for every host
+            port (int): Port, 0 picks a free one
+
+        Returns:
+            int: The port listened on
+        """
+
+        self.server = await asyncio.start_server(
+            self.handle, host, port, limit=messageLimit
+        )
+        return self.server.sockets[0].getsockname()[1]
+
+    async def wait(self) -> dict[Hashable, dict[str, int]]:
+        """
+        Wait for every chunk, then stop serving
+
+        Raises:
+            RuntimeError: A chunk failed maxAttempts times, or the sweep was
+                aborted; the points finished so far stay in the checkpoint.
+                Also raised when start() was not called
+
+        Returns:
+            dict[Hashable, dict[str, int]]: Counts under the key of each point
+        """
+
+        server = self.server
+        if server is None:
+            raise RuntimeError("The coordinator is not listening, call start() first")
+
+        with span("sweep", points=len(self.specs), chunks=len(self.chunks)):
+            async with self.changed:
+                await self.changed.wait_for(self.isOver)
+
+        server.close()
+        # Workers still running a losing copy see the connection close
+        for _, writer in self.connections:
+            writer.close()
+        await asyncio.gather(
+            *[task for task, _ in self.connections], return_exceptions=True
+        )
+        await server.wait_closed()
+
+        if self.checkpoint is not None:
+            self.checkpoint.flush()
+        if self.failure is not None:
+            raise RuntimeError(self.failure)
+
+        counts = {key: self.counts[index] for index, key in enumerate(self.keys)}
+        return {
+            key: self.resumed[key] if key in self.resumed else counts[key]
+            for key in self.allKeys
+        }
+
+    async def serve(
+        self, host: str = "127.0.0.1", port: int = 0
+    ) -> dict[Hashable, dict[str, int]]:
+        """
+        Run the whole sweep on the workers that connect
+
+        Args:
+            host (str): Interface to listen on
+            port (int): Port, 0 picks a free one
+
+        Returns:
+            dict[Hashable, dict[str, int]]: Counts under the key of each point
+        """
+
+        port = await self.start(host, port)
+        print("Coordinator listening on {}:{}".format(host, port))
+        return await self.wait()
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "points": len(self.specs),
+            "resumedPoints": len(self.resumed),
+            "chunks": len(self.chunks),
+            "stolenCopies": self.stolenCopies,
+            "droppedResults": self.droppedResults,
+            "failedRuns": sum(self.failures.values()),
+            "chunksByWorker": self.chunksByWorker,
+        }
+
+
+def connect(host: str, port: int, retrySeconds: float) -> socket.socket:
+    """
+    Connect to a coordinator, retrying while it is not listening yet
+
+    Args:
+        host (str): Host of the coordinator
+        port (int): Its port
+        retrySeconds (float): How long to keep retrying
+
+    Returns:
+        socket.socket: The connection
+    """
+
+    deadline = time.monotonic() + retrySeconds
+    while True:
+        try:
+            return socket.create_connection((host, port))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def runWorker(
+    host: str,
+    port: int,
+    name: str | None = None,
+    parallelismSection: dict[str, Any] | None = None,
+    retrySeconds: float = 30.0,
+) -> int:
+    """
+    Pull and run chunks until the coordinator is done
+
+    Args:
+        host (str): Host of the coordinator
+        port (int): Its port
+        name (str | None): Name in the coordinator's report, defaults to host:pid
+        parallelismSection (dict[str, Any] | None): [parallelism] config section
+            to apply, for workers started as processes
+        retrySeconds (float): How long to wait for the coordinator to listen
+
+    Returns:
+        int: Chunks run
+    """
+
+    if parallelismSection is not None:
+        configureParallelism({"parallelism": parallelismSection})
+    name = name or "{}:{}".format(socket.gethostname(), os.getpid())
+
+    chunks = 0
+    with connect(host, port, retrySeconds) as connection:
+        stream = connection.makefile("rwb")
+        try:
+            stream.write(encodeMessage({"type": "ready", "worker": name}))
+            stream.flush()
+
+            while line := stream.readline():
+                message = json.loads(line)
+                if message["type"] == "done":
+                    break
+
+                start = perf_counter()
+                try:
+                    specs = {
+                        index: CircuitSpec.fromDict(spec)
+                        for index, spec in message["points"]
+                    }
+                    executor = createExecutor(message["backend"], message["options"])
+                    with span("sweep chunk", chunk=message["chunk"], points=len(specs)):
+                        counts = executor.runBatch(
+                            specs, message["shots"], message["seed"]
+                        )
+                except Exception as error:
+                    # Report it and stay connected, the coordinator decides
+                    # whether the chunk is retried
+                    reply = {
+                        "type": "error",
+                        "chunk": message["chunk"],
+                        "error": "".join(
+                            traceback.format_exception_only(error)
+                        ).strip(),
+                    }
+                else:
+                    reply = {
+                        "type": "result",
+                        "chunk": message["chunk"],
+                        "counts": [[index, result] for index, result in counts.items()],
+                        "seconds": perf_counter() - start,
+                    }
+                    chunks += 1
+
+                stream.write(encodeMessage(reply))
+                stream.flush()
+        except ConnectionError:
+            # The sweep finished while this worker ran a losing copy
+            pass
+        finally:
+            try:
+                stream.close()
+            except ConnectionError:
+                pass
+
+    return chunks
+
+
+def runLocalSweep(
+    coordinator: SweepCoordinator, workers: int, host: str = "127.0.0.1"
+) -> dict[Hashable, dict[str, int]]:
+    """
+    Run a sweep on worker processes of this host
+
+    Args:
+        coordinator (SweepCoordinator): The sweep
+        workers (int): Worker processes
+        host (str): Interface the coordinator listens on
+
+    Returns:
+        dict[Hashable, dict[str, int]]: Counts under the key of each point
+    """
+
+    async def sweep() -> dict[Hashable, dict[str, int]]:
+        port = await coordinator.start(host, 0)
+
+        # spawn: the engines start OpenMP threads, which do not survive fork
+        context = multiprocessing.get_context("spawn")
+        # No more workers than chunks, a resumed sweep may have none left
+        processes = [
+            context.Process(
+                target=runWorker,
+                args=(host, port, "local-{}".format(index), parallelism.section),
+            )
+            for index in range(min(workers, len(coordinator.chunks)))
+        ]
+        for process in processes:
+            process.start()
+
+        async def watchWorkers() -> None:
+            # Workers that all crashed would leave wait() blocked forever
+            await asyncio.gather(
+                *[asyncio.to_thread(process.join) for process in processes]
+            )
+            await coordinator.abort(
+                "Every worker process exited before the sweep was done"
+            )
+
+        watcher = asyncio.create_task(watchWorkers())
+        try:
+            return await coordinator.wait()
+        finally:
+            # The sweep is over, so a worker still starting up would only
+            # retry the closed port
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            await watcher
+
+    return asyncio.run(sweep())
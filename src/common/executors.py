@@ -0,0 +1,484 @@
+"""
+One executor interface over every simulation engine
+
+Each executor runs a CircuitSpec and returns counts keyed by the cbits, cbit 0
+being the rightmost character, which is what both CPUQVM and Aer return.
+
+Seed semantics are the same everywhere: without a seed, an engine samples
+natively (fresh randomness on every run); with a seed, the executor computes
+the outcome probabilities and draws the counts with common/sampling.py, so the
+same circuit and seed give identical counts on every engine.
+
+runBatch() runs a sweep of circuits; Aer submits them as one job.
+
+The "noise" executor runs circuits under the noise model of [noise], see
+common/noise.py. Its counts come from the noisy engine's own sampler, seeded
+or not, so they are not comparable with the shared sampler of the others.
+
+CPUQVM, Aer and the noisy engines sample shot by shot when run natively, so
+large shot counts can be split across processes, see common/shotParallel.py.
+"""
+
+from typing import Any, Final, Hashable
+
+import numpy as np
+import pyqpanda as pq
+import qiskit as qk
+from qiskit_aer import AerSimulator
+
+from common.circuitSpec import CircuitSpec
+from common.denseSimulator import DenseStatevector
+from common.fusion import fuseGates
+from common.gates import Gate
+from common.memmapSimulator import MemmapStatevector
+from common.noise import aerNoiseModel, noiseQVM, noisyBasisCircuit, simulationMethod
+from common.parallelism import parallelism
+from common.sampling import countKey, sampleOutcomes
+from common.sparseSimulator import SparseStatevector
+from common.tracing import span, traced
+
+
+class Executor:
+    # Name used in config.toml and reports
+    name: str = ""
+    # The engine samples shot by shot, so splitting the shots saves time
+    samplesShots: bool = False
+    # runShots() can seed that sampling itself
+    seedsShots: bool = False
+
+    def __init__(self, options: dict[str, Any] | None = None):
+        """
+        Args:
+            options (dict[str, Any] | None): Config section named after the executor
+        """
+
+        self.options = options or {}
+
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        """
+        Run a circuit and return its counts
+
+        Args:
+            spec (CircuitSpec): Circuit to run
+            shots (int): Number of shots
+            seed (int | None): Seed of the sampler, None for fresh randomness
+
+        Returns:
+            dict[str, int]: Counts keyed by the cbits
+        """
+
+        raise NotImplementedError
+
+    def runShots(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        """
+        Run one sampling stream of a shot-parallel run
+
+        Args:
+            spec (CircuitSpec): Circuit to run
+            shots (int): Shots of this stream
+            seed (int | None): Seed of this stream
+
+        Returns:
+            dict[str, int]: Counts keyed by the cbits
+        """
+
+        return self.run(spec, shots, seed)
+
+    def runBatch(
+        self, specs: dict[Hashable, CircuitSpec], shots: int, seed: int | None = None
+    ) -> dict[Hashable, dict[str, int]]:
+        """
+        Run several circuits, e.g. the points of a parameter sweep
+
+        Each circuit gets the counts run() would give it with the same seed.
+        Engines that can submit many circuits as one job override this.
+
+        Args:
+            specs (dict[Hashable, CircuitSpec]): Circuits keyed by their parameters
+            shots (int): Shots of each circuit
+            seed (int | None): Seed of the sampler
+
+        Returns:
+            dict[Hashable, dict[str, int]]: Counts under the key of each circuit
+        """
+
+        return {key: self.run(spec, shots, seed) for key, spec in specs.items()}
+
+
+def sampleMeasuredProbabilities(
+    probabilities: dict[int, float],
+    measuredQubits: list[int],
+    measurements: list[tuple[int, int]],
+    numCbits: int,
+    shots: int,
+    seed: int | None,
+) -> dict[str, int]:
+    """
+    Sample counts from probabilities over a list of measured qubits
+
+    Args:
+        probabilities (dict[int, float]): Value -> probability, bit j is measuredQubits[j]
+        measuredQubits (list[int]): Qubits the probabilities are over
+        measurements (list[tuple[int, int]]): (qubit, cbit) pairs
+        numCbits (int): Width of the count keys
+        shots (int): Number of shots
+        seed (int | None): Seed of the sampler
+
+    Returns:
+        dict[str, int]: Counts keyed by the cbits
+    """
+
+    values = np.fromiter(probabilities.keys(), dtype=np.int64)
+    outcomes = np.zeros(values.shape, dtype=np.int64)
+    for qubit, cbit in measurements:
+        if cbit < numCbits:
+            outcomes |= ((values >> measuredQubits.index(qubit)) & 1) << cbit
+
+    return sampleOutcomes(
+        outcomes,
+        np.fromiter(probabilities.values(), dtype=float),
+        numCbits,
+        shots,
+        seed,
+    )
+
+
+class PyQPandaExecutor(Executor):
+    name = "cpuqvm"
+    samplesShots = True
+
+    @traced()
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        qvm = pq.CPUQVM()
+        qvm.init_qvm()
+        parallelism.limitQVM(qvm)
+
+        try:
+            qubits = qvm.qAlloc_many(spec.numQubits)
+            cBits = qvm.cAlloc_many(max(spec.numCbits, 1))
+
+            if seed is None:
+                prog = spec.toPyQPanda(qubits, cBits)
+                with span("run_with_configuration", shots=shots):
+                    return qvm.run_with_configuration(
+                        prog, cBits[: spec.numCbits], shots
+                    )
+
+            gates, measurements = spec.gatesAndMeasurements()
+            if not measurements:
+                return {countKey(0, spec.numCbits): shots}
+
+            gateSpec = CircuitSpec(spec.numQubits)
+            gateSpec.ops = gates
+            measuredQubits = sorted({qubit for qubit, _ in measurements})
+
+            # Keys are bitstrings whose rightmost character is measuredQubits[0]
+            prog = gateSpec.toPyQPanda(qubits, cBits)
+            with span("prob_run_dict", qubits=len(measuredQubits)):
+                probabilities = qvm.prob_run_dict(
+                    prog, [qubits[qubit] for qubit in measuredQubits], -1
+                )
+            return sampleMeasuredProbabilities(
+                {int(key, 2): value for key, value in probabilities.items()},
+                measuredQubits,
+                measurements,
+                spec.numCbits,
+                shots,
+                seed,
+            )
+        finally:
+            qvm.finalize()
+
+
+class AerExecutor(Executor):
+    name = "aer"
+    samplesShots = True
+
+    def simulator(self) -> AerSimulator:
+        """
+        Simulator configured from the [aer] and [parallelism] config sections
+
+        Returns:
+            AerSimulator: The simulator
+        """
+
+        return AerSimulator(
+            method=self.options.get("method", "automatic"), **parallelism.aerOptions()
+        )
+
+    @traced()
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        return self.runBatch({0: spec}, shots, seed)[0]
+
+    @traced()
+    def runBatch(
+        self, specs: dict[Hashable, CircuitSpec], shots: int, seed: int | None = None
+    ) -> dict[Hashable, dict[str, int]]:
+        # All circuits are transpiled together and submitted as one Aer job,
+        # which runs its experiments in parallel
+        simulator = self.simulator()
+
+        if seed is None:
+            with span("transpile", circuits=len(specs)):
+                transpiled = qk.transpile(
+                    [spec.toQiskit() for spec in specs.values()], simulator
+                )
+            with span("simulator.run", shots=shots, circuits=len(specs)):
+                result = simulator.run(transpiled, shots=shots).result()
+            return {
+                key: dict(result.get_counts(index)) for index, key in enumerate(specs)
+            }
+
+        counts: dict[Hashable, dict[str, int]] = {}
+        # Key, measured qubits and measurements of each probability circuit
+        pending: list[tuple[Hashable, list[int], list[tuple[int, int]]]] = []
+        probabilityCircuits: list[qk.QuantumCircuit] = []
+        for key, spec in specs.items():
+            gates, measurements = spec.gatesAndMeasurements()
+            if not measurements:
+                counts[key] = {countKey(0, spec.numCbits): shots}
+                continue
+
+            gateSpec = CircuitSpec(spec.numQubits, spec.numCbits)
+            gateSpec.ops = gates
+            measuredQubits = sorted({qubit for qubit, _ in measurements})
+
+            # Aer keys the probabilities by value, bit j being measuredQubits[j]
+            circuit = gateSpec.toQiskit()
+            circuit.save_probabilities_dict(measuredQubits)
+            probabilityCircuits.append(circuit)
+            pending.append((key, measuredQubits, measurements))
+
+        if probabilityCircuits:
+            with span("transpile", circuits=len(probabilityCircuits)):
+                transpiled = qk.transpile(probabilityCircuits, simulator)
+            with span("simulator.run", shots=1, circuits=len(probabilityCircuits)):
+                result = simulator.run(transpiled, shots=1).result()
+
+        for index, (key, measuredQubits, measurements) in enumerate(pending):
+            counts[key] = sampleMeasuredProbabilities(
+                result.data(index)["probabilities"],
+                measuredQubits,
+                measurements,
+                specs[key].numCbits,
+                shots,
+                seed,
+            )
+
+        # In the order of specs
+        return {key: counts[key] for key in specs}
+
+    @traced()
+    def runShots(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        # Native sampling; shot-parallel runs only get here unseeded, a seeded
+        # run draws every shot from the probabilities in one multinomial
+        simulator = self.simulator()
+        with span("transpile"):
+            circuit = qk.transpile(spec.toQiskit(), simulator)
+        with span("simulator.run", shots=shots):
+            return dict(
+                simulator.run(circuit, shots=shots, seed_simulator=seed)
+                .result()
+                .get_counts()
+            )
+
+
+def fuseForExecutor(
+    gates: list[Gate], options: dict[str, Any], chunkQubits: int | None = None
+) -> list[Gate]:
+    """
+    Fuse gates as configured by fusionMaxQubits in the executor section
+
+    Args:
+        gates (list[Gate]): Gates without measurements
+        options (dict[str, Any]): Config section of the executor
+        chunkQubits (int | None): Chunk of the memmap executor, whose fused
+            gates stay within maxHighQubits qubits above it
+
+    Returns:
+        list[Gate]: Fused gates
+    """
+
+    fused, savedSweeps = fuseGates(
+        gates,
+        options.get("fusionMaxQubits", 4),
+        chunkQubits,
+        options.get("maxHighQubits", 2),
+    )
+    if savedSweeps > 0:
+        print(
+            "fusion: {} gates -> {} kernels, {} statevector sweeps saved".format(
+                len(gates), len(fused), savedSweeps
+            )
+        )
+
+    return fused
+
+
+class SparseExecutor(Executor):
+    name = "sparse"
+
+    @traced()
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        gates, measurements = spec.gatesAndMeasurements()
+
+        state = SparseStatevector(spec.numQubits)
+        state.run(gates)
+
+        return state.sampleCounts(measurements, spec.numCbits, shots, seed)
+
+
+class DenseExecutor(Executor):
+    name = "dense"
+
+    @traced()
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        gates, measurements = spec.gatesAndMeasurements()
+
+        state = DenseStatevector(spec.numQubits)
+        state.run(fuseForExecutor(gates, self.options))
+
+        return state.sampleCounts(measurements, spec.numCbits, shots, seed)
+
+
+class MemmapExecutor(Executor):
+    name = "memmap"
+
+    @traced()
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        gates, measurements = spec.gatesAndMeasurements()
+
+        with MemmapStatevector(
+            spec.numQubits,
+            directory=self.options.get("directory"),
+            chunkQubits=self.options.get("chunkQubits", 24),
+            maxHighQubits=self.options.get("maxHighQubits", 2),
+        ) as state:
+            fused = fuseForExecutor(gates, self.options, state.chunkQubits)
+            state.run(fused)
+            print("memmap: {} kernels in {} passes".format(len(fused), state.passes))
+
+            return state.sampleCounts(measurements, spec.numCbits, shots, seed)
+
+
+class NoiseExecutor(Executor):
+    name = "noise"
+    samplesShots = True
+
+    def __init__(self, options: dict[str, Any] | None = None):
+        """
+        Args:
+            options (dict[str, Any] | None): The [noise] config section
+        """
+
+        super().__init__(options)
+        # Aer seeds its trajectories, NoiseQVM has no seed to set
+        self.engine: str = self.options.get("engine", "aer")
+        self.seedsShots = self.engine == "aer"
+
+    @traced()
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        return self.runShots(spec, shots, seed)
+
+    def runShots(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        lowered = noisyBasisCircuit(spec)
+        match self.engine:
+            case "aer":
+                return self.runAer(lowered, shots, seed)
+            case "cpuqvm":
+                return self.runNoiseQVM(lowered, shots, seed)
+            case _:
+                raise ValueError(
+                    "Unknown noise engine '{}', choose aer or cpuqvm".format(
+                        self.engine
+                    )
+                )
+
+    def runAer(self, spec: CircuitSpec, shots: int, seed: int | None) -> dict[str, int]:
+        method = simulationMethod(spec.numQubits, self.options)
+        simulator = AerSimulator(
+            method=method,
+            noise_model=aerNoiseModel(self.options),
+            **parallelism.aerOptions(),
+        )
+
+        with span("transpile"):
+            circuit = qk.transpile(spec.toQiskit(), simulator, optimization_level=0)
+        with span("simulator.run", shots=shots, method=method):
+            return dict(
+                simulator.run(circuit, shots=shots, seed_simulator=seed)
+                .result()
+                .get_counts()
+            )
+
+    def runNoiseQVM(
+        self, spec: CircuitSpec, shots: int, seed: int | None
+    ) -> dict[str, int]:
+        if seed is not None:
+            raise ValueError(
+                'NoiseQVM cannot be seeded, unset the seed or use engine = "aer"'
+            )
+
+        qvm = parallelism.limitQVM(noiseQVM(self.options))
+        try:
+            qubits = qvm.qAlloc_many(spec.numQubits)
+            cBits = qvm.cAlloc_many(max(spec.numCbits, 1))
+
+            prog = spec.toPyQPanda(qubits, cBits)
+            with span("run_with_configuration", shots=shots):
+                return qvm.run_with_configuration(prog, cBits[: spec.numCbits], shots)
+        finally:
+            qvm.finalize()
+
+
+executorClasses: Final[dict[str, type[Executor]]] = {
+    executor.name: executor
+    for executor in [
+        PyQPandaExecutor,
+        AerExecutor,
+        SparseExecutor,
+        DenseExecutor,
+        MemmapExecutor,
+        NoiseExecutor,
+    ]
+}
+
+
+def createExecutor(name: str, options: dict[str, Any] | None = None) -> Executor:
+    """
+    Create an executor by name
+
+    Args:
+        name (str): One of executorClasses
+        options (dict[str, Any] | None): Config section named after the executor
+
+    Returns:
+        Executor: The executor
+    """
+
+    if name not in executorClasses:
+        raise ValueError(
+            "Unknown backend '{}', choose one of {}".format(name, list(executorClasses))
+        )
+
+    return executorClasses[name](options)
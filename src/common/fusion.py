@@ -0,0 +1,153 @@
+"""
+Gate fusion for the simulators in this package
+
+A dense simulator sweeps the whole statevector once per gate. Runs of
+consecutive gates that together touch only a few qubits can be replaced by one
+fused gate, applied in a single sweep. When every gate of a run is an X-type
+gate (X, CNOT, Toffoli, ...) the fused gate is a PERMUTATION table, which
+moves amplitudes without any arithmetic; otherwise it is a UNITARY matrix.
+The six CNOT/Toffoli gates of each adder bit touch four qubits, so they fuse
+into a single permutation.
+"""
+
+import numpy as np
+
+from common.denseKernels import applyGateDense
+from common.gates import Gate, permutationGate, permutationGates, unitaryGate
+from common.tracing import traced
+
+
+def localPermutation(gates: list[Gate], qubits: list[int]) -> np.ndarray:
+    """
+    Follow every local basis state through a run of X-type gates
+
+    Args:
+        gates (list[Gate]): Permutation gates, all acting on the given qubits
+        qubits (list[int]): Qubits of the run, qubits[j] is bit j of the local index
+
+    Returns:
+        np.ndarray: Output local index of every input local index
+    """
+
+    position = {qubit: j for j, qubit in enumerate(qubits)}
+    table = np.arange(2 ** len(qubits), dtype=np.int64)
+
+    for name, gateQubits, _ in gates:
+        bits = [position[qubit] for qubit in gateQubits]
+        if name == "SWAP":
+            differ = ((table >> bits[0]) ^ (table >> bits[1])) & 1
+            table = table ^ (differ << bits[0]) ^ (differ << bits[1])
+            continue
+
+        *controls, target = bits
+        flip = np.ones(table.shape, dtype=np.int64)
+        for control in controls:
+            flip &= (table >> control) & 1
+        table = table ^ (flip << target)
+
+    return table
+
+
+def localUnitary(gates: list[Gate], qubits: list[int]) -> np.ndarray:
+    """
+    Multiply a run of gates into one matrix
+
+    Args:
+        gates (list[Gate]): Gates, all acting on the given qubits
+        qubits (list[int]): Qubits of the run, qubits[j] is bit j of the local index
+
+    Returns:
+        np.ndarray: 2^k x 2^k matrix of the whole run
+    """
+
+    position = {qubit: j for j, qubit in enumerate(qubits)}
+    size = 2 ** len(qubits)
+    matrix = np.eye(size, dtype=complex)
+
+    # Column l of the matrix is the run applied to local basis state l
+    for column in range(size):
+        block = matrix[:, column].copy()
+        for name, gateQubits, params in gates:
+            applyGateDense(
+                block, (name, tuple(position[q] for q in gateQubits), params)
+            )
+        matrix[:, column] = block
+
+    return matrix
+
+
+def fuseRun(gates: list[Gate], qubits: set[int]) -> Gate:
+    """
+    Replace a run of gates with a single fused gate
+
+    Args:
+        gates (list[Gate]): Consecutive gates
+        qubits (set[int]): Union of their qubits
+
+    Returns:
+        Gate: PERMUTATION gate if every gate is X-type, UNITARY gate otherwise
+    """
+
+    ordered = sorted(qubits)
+    # Local index bit j is ordered[j], so the most significant qubit comes first
+    fusedQubits = tuple(reversed(ordered))
+
+    if all(name in permutationGates for name, _, _ in gates):
+        return permutationGate(fusedQubits, localPermutation(gates, ordered))
+
+    return unitaryGate(fusedQubits, localUnitary(gates, ordered))
+
+
+@traced()
+def fuseGates(
+    gates: list[Gate],
+    maxFusedQubits: int = 4,
+    chunkQubits: int | None = None,
+    maxHighQubits: int = 0,
+) -> tuple[list[Gate], int]:
+    """
+    Greedily fuse consecutive gates whose qubits fit in maxFusedQubits
+
+    Args:
+        gates (list[Gate]): Gates without measurements
+        maxFusedQubits (int): Largest fused gate, 0 disables fusion
+        chunkQubits (int | None): For common/memmapSimulator.py, qubits from
+            this one up select a chunk, and a fused gate touches at most
+            maxHighQubits of them so it fits in one pass
+        maxHighQubits (int): See chunkQubits
+
+    Returns:
+        tuple[list[Gate], int]: Fused gates, and how many statevector sweeps they save
+    """
+
+    if maxFusedQubits <= 0:
+        return gates, 0
+
+    fused: list[Gate] = []
+    run: list[Gate] = []
+    runQubits: set[int] = set()
+
+    def fits(qubits: set[int]) -> bool:
+        if len(qubits) > maxFusedQubits:
+            return False
+        if chunkQubits is None:
+            return True
+        return sum(qubit >= chunkQubits for qubit in qubits) <= maxHighQubits
+
+    def flush():
+        if len(run) == 1:
+            fused.append(run[0])
+        elif run:
+            fused.append(fuseRun(run, runQubits))
+
+    for gate in gates:
+        merged = runQubits | set(gate[1])
+        if run and not fits(merged):
+            flush()
+            run, runQubits = [], set(gate[1])
+        else:
+            runQubits = merged
+        run.append(gate)
+    flush()
+
+    return fused, len(gates) - len(fused)
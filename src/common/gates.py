@@ -0,0 +1,282 @@
+"""
+Gate model shared by the simulators in this package
+
+A gate is a plain tuple (name, qubits, params) using the OriginIR gate names
+that pyqpanda emits. Controls come first and the target last, and matrices are
+written with qubits[0] as the most significant bit of the local index, i.e. the
+textbook convention (CNOT = [[1,0,0,0],[0,1,0,0],[0,0,0,1],[0,0,1,0]]).
+Measurements use the same tuple, with the classical bit as the only param.
+
+Two extra gates hold the output of gate fusion (common/fusion.py):
+PERMUTATION, whose params are the output local index of each input local index,
+and UNITARY, whose params are the real parts then the imaginary parts of its
+matrix in row-major order.
+"""
+
+from math import pi
+from typing import Final
+
+import numpy as np
+import qiskit as qk
+
+
+Gate = tuple[str, tuple[int, ...], tuple[float, ...]]
+
+# Gates that only move basis states around, the target is always the last qubit
+permutationGates: Final[frozenset[str]] = frozenset(
+    {"X", "CNOT", "TOFFOLI", "MCX", "SWAP"}
+)
+# Gates that only change the phase of basis states
+diagonalGates: Final[frozenset[str]] = frozenset(
+    {"I", "Z", "S", "T", "RZ", "U1", "CZ", "CR"}
+)
+# Gates whose inverse is themselves
+selfInverseGates: Final[frozenset[str]] = frozenset(
+    {"I", "H", "X", "Y", "Z", "CNOT", "CZ", "SWAP", "TOFFOLI", "MCX"}
+)
+
+# qiskit instruction name -> gate name, for instructions that map one to one
+qiskitGateNames: Final[dict[str, str]] = {
+    "id": "I",
+    "h": "H",
+    "x": "X",
+    "y": "Y",
+    "z": "Z",
+    "s": "S",
+    "t": "T",
+    "rx": "RX",
+    "ry": "RY",
+    "rz": "RZ",
+    "p": "U1",
+    "u1": "U1",
+    "u": "U3",
+    "u3": "U3",
+    "cx": "CNOT",
+    "cz": "CZ",
+    "cp": "CR",
+    "swap": "SWAP",
+    "ccx": "TOFFOLI",
+    "mcx": "MCX",
+}
+# Everything else is transpiled down to these before conversion
+qiskitBasisGates: Final[list[str]] = list(qiskitGateNames) + ["sdg", "tdg"]
+
+
+def gateMatrix(gate: Gate) -> np.ndarray:
+    """
+    Unitary matrix of a gate
+
+    Args:
+        gate (Gate): Gate to convert
+
+    Returns:
+        np.ndarray: 2^k x 2^k matrix, qubits[0] is the most significant bit
+    """
+
+    name, qubits, params = gate
+    match name:
+        case "I":
+            return np.eye(2, dtype=complex)
+        case "H":
+            return np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2)
+        case "X":
+            return np.array([[0, 1], [1, 0]], dtype=complex)
+        case "Y":
+            return np.array([[0, -1j], [1j, 0]], dtype=complex)
+        case "Z":
+            return np.diag([1, -1]).astype(complex)
+        case "S":
+            return np.diag([1, 1j])
+        case "T":
+            return np.diag([1, np.exp(1j * pi / 4)])
+        case "RX":
+            c, s = np.cos(params[0] / 2), np.sin(params[0] / 2)
+            return np.array([[c, -1j * s], [-1j * s, c]], dtype=complex)
+        case "RY":
+            c, s = np.cos(params[0] / 2), np.sin(params[0] / 2)
+            return np.array([[c, -s], [s, c]], dtype=complex)
+        case "RZ":
+            return np.diag([np.exp(-1j * params[0] / 2), np.exp(1j * params[0] / 2)])
+        case "U1":
+            return np.diag([1, np.exp(1j * params[0])])
+        case "U3":
+            theta, phi, lam = params
+            c, s = np.cos(theta / 2), np.sin(theta / 2)
+            return np.array(
+                [
+                    [c, -np.exp(1j * lam) * s],
+                    [np.exp(1j * phi) * s, np.exp(1j * (phi + lam)) * c],
+                ],
+                dtype=complex,
+            )
+        case "CZ":
+            return np.diag([1, 1, 1, -1]).astype(complex)
+        case "CR":
+            return np.diag([1, 1, 1, np.exp(1j * params[0])])
+        case "SWAP":
+            return np.eye(4, dtype=complex)[[0, 2, 1, 3]]
+        case "CNOT" | "TOFFOLI" | "MCX":
+            # Identity with the last two rows swapped
+            size = 2 ** len(qubits)
+            order = list(range(size - 2)) + [size - 1, size - 2]
+            return np.eye(size, dtype=complex)[order]
+        case "PERMUTATION":
+            size = 2 ** len(qubits)
+            matrix = np.zeros((size, size), dtype=complex)
+            matrix[np.array(params, dtype=np.int64), np.arange(size)] = 1
+            return matrix
+        case "UNITARY":
+            size = 2 ** len(qubits)
+            values = np.array(params)
+            return (values[: size * size] + 1j * values[size * size :]).reshape(
+                size, size
+            )
+        case _:
+            raise ValueError("Unsupported gate: {}".format(name))
+
+
+def permutationGate(qubits: tuple[int, ...], table: np.ndarray) -> Gate:
+    """
+    Gate that maps local basis state l to table[l]
+
+    Args:
+        qubits (tuple[int, ...]): Gate qubits, qubits[0] is the most significant bit
+        table (np.ndarray): Output local index of every input local index
+
+    Returns:
+        Gate: The PERMUTATION gate
+    """
+
+    return ("PERMUTATION", qubits, tuple(float(entry) for entry in table))
+
+
+def unitaryGate(qubits: tuple[int, ...], matrix: np.ndarray) -> Gate:
+    """
+    Gate applying an arbitrary matrix
+
+    Args:
+        qubits (tuple[int, ...]): Gate qubits, qubits[0] is the most significant bit
+        matrix (np.ndarray): 2^k x 2^k unitary
+
+    Returns:
+        Gate: The UNITARY gate
+    """
+
+    flat = np.asarray(matrix, dtype=complex).ravel()
+    return ("UNITARY", qubits, tuple(flat.real.tolist() + flat.imag.tolist()))
+
+
+def inverseGate(gate: Gate) -> Gate:
+    """
+    Inverse of a gate, expressed with the same gate names
+
+    Args:
+        gate (Gate): Gate to invert
+
+    Returns:
+        Gate: The inverse gate
+    """
+
+    name, qubits, params = gate
+    if name in selfInverseGates:
+        return gate
+
+    match name:
+        case "S":
+            return ("U1", qubits, (-pi / 2,))
+        case "T":
+            return ("U1", qubits, (-pi / 4,))
+        case "RX" | "RY" | "RZ" | "U1" | "CR":
+            return (name, qubits, (-params[0],))
+        case "U3":
+            theta, phi, lam = params
+            return ("U3", qubits, (-theta, -lam, -phi))
+        case "PERMUTATION":
+            table = np.array(params, dtype=np.int64)
+            return permutationGate(qubits, np.argsort(table))
+        case "UNITARY":
+            return unitaryGate(qubits, gateMatrix(gate).conj().T)
+        case _:
+            raise ValueError("Cannot invert gate: {}".format(name))
+
+
+def deferMeasurements(ops: list[Gate]) -> tuple[list[Gate], list[tuple[int, int]]]:
+    """
+    Move all measurements to the end of the program
+
+    This is exact as long as measured qubits are afterwards only used as controls
+    or by diagonal gates, which is how teleportation-style corrections use them.
+
+    Args:
+        ops (list[Gate]): Gates and measurements in program order
+
+    Returns:
+        tuple[list[Gate], list[tuple[int, int]]]: The gates, and (qubit, cbit) pairs
+    """
+
+    gates: list[Gate] = []
+    measurements: list[tuple[int, int]] = []
+    measured: set[int] = set()
+
+    for op in ops:
+        name, qubits, params = op
+        if name == "MEASURE":
+            measurements.append((qubits[0], int(params[0])))
+            measured.add(qubits[0])
+            continue
+
+        if name in diagonalGates:
+            touched: tuple[int, ...] = ()
+        elif name in permutationGates and name != "SWAP":
+            touched = qubits[-1:]
+        else:
+            touched = qubits
+        if measured.intersection(touched):
+            raise ValueError(
+                "Gate {} on {} changes an already measured qubit".format(name, qubits)
+            )
+
+        gates.append(op)
+
+    return gates, measurements
+
+
+def gatesFromQiskit(circuit: qk.QuantumCircuit) -> list[Gate]:
+    """
+    Convert a qiskit circuit to gates, transpiling unknown instructions first
+
+    Args:
+        circuit (qk.QuantumCircuit): Circuit to convert
+
+    Returns:
+        list[Gate]: Gates and measurements in program order
+    """
+
+    if any(
+        instruction.operation.name not in qiskitBasisGates + ["measure", "barrier"]
+        for instruction in circuit.data
+    ):
+        circuit = qk.transpile(
+            circuit, basis_gates=qiskitBasisGates, optimization_level=0
+        )
+
+    ops: list[Gate] = []
+    for instruction in circuit.data:
+        operation = instruction.operation
+        qubits = tuple(circuit.find_bit(qubit).index for qubit in instruction.qubits)
+        params = tuple(float(param) for param in operation.params)
+
+        match operation.name:
+            case "barrier":
+                continue
+            case "measure":
+                clbit = circuit.find_bit(instruction.clbits[0]).index
+                ops.append(("MEASURE", qubits, (clbit,)))
+            case "sdg":
+                ops.append(("U1", qubits, (-pi / 2,)))
+            case "tdg":
+                ops.append(("U1", qubits, (-pi / 4,)))
+            case name:
+                ops.append((qiskitGateNames[name], qubits, params))
+
+    return ops
@@ -0,0 +1,379 @@
+"""
+Grover search circuits of any width
+
+The experiment-3 scripts hard-code a 3-qubit oracle. These builders produce the
+same structure for any number of input qubits and any set of marked states:
+the oracle qubit starts in |->, so flipping it on a marked input adds the phase
+through kickback, and every multi-controlled X is decomposed with a strategy
+from common/mcx.py.
+
+Qubit layout: [input qubits][work qubits][MCX ancillas][oracle qubit]. Input
+qubit i is bit i of a state, so count keys read as the marked integers in
+binary. Work qubits hold intermediate values of an oracle, e.g. one per clause
+of a CNF formula; markedStateOracle() needs none.
+
+CNF formulas come in the DIMACS format: variable v is input qubit v - 1, and
+cnfOracle() computes every clause into a work qubit, marks the inputs that
+satisfy them all, and uncomputes the clauses.
+"""
+
+from math import floor, pi, sqrt
+from typing import Iterable, Iterator
+
+import numpy as np
+import qiskit as qk
+
+from common.mcx import appendMcx, mcxAncillaCount
+
+
+def optimalIterations(numInputQubits: int, numMarked: int) -> int:
+    """
+    Number of Grover iterations that maximizes the success probability
+
+    Args:
+        numInputQubits (int): Number of input qubits
+        numMarked (int): Number of marked states
+
+    Returns:
+        int: floor(pi / 4 * sqrt(N / M)), at least 1
+    """
+
+    return max(1, floor(pi / 4 * sqrt(2**numInputQubits / max(numMarked, 1))))
+
+
+def groverLayout(
+    numInputQubits: int, mcxStrategy: str, numWorkQubits: int = 0
+) -> dict[str, list[int]]:
+    """
+    Qubits of a Grover circuit
+
+    Args:
+        numInputQubits (int): Number of input qubits
+        mcxStrategy (str): One of mcxStrategies
+        numWorkQubits (int): Work qubits of the oracle, which may also control
+            an MCX gate together
+
+    Returns:
+        dict[str, list[int]]: Lists of "inputs", "work", "ancillas" and "oracle" qubits
+    """
+
+    numAncillas = mcxAncillaCount(mcxStrategy, max(numInputQubits, numWorkQubits))
+    firstAncilla = numInputQubits + numWorkQubits
+    return {
+        "inputs": list(range(numInputQubits)),
+        "work": list(range(numInputQubits, firstAncilla)),
+        "ancillas": list(range(firstAncilla, firstAncilla + numAncillas)),
+        "oracle": [firstAncilla + numAncillas],
+    }
+
+
+def markedStateOracle(
+    numInputQubits: int, markedStates: list[int], mcxStrategy: str
+) -> qk.QuantumCircuit:
+    """
+    Oracle that flips the oracle qubit on every marked input
+
+    Args:
+        numInputQubits (int): Number of input qubits
+        markedStates (list[int]): Marked inputs
+        mcxStrategy (str): One of mcxStrategies
+
+    Returns:
+        qk.QuantumCircuit: Oracle circuit on the whole layout
+    """
+
+    layout = groverLayout(numInputQubits, mcxStrategy)
+    numTotalQubits = layout["oracle"][0] + 1
+    oracle = qk.QuantumCircuit(numTotalQubits, name="Oracle")
+
+    for state in markedStates:
+        # Map the marked state to |1...1> so the MCX fires on it alone
+        zeroBits = [i for i in range(numInputQubits) if not (state >> i) & 1]
+        if zeroBits:
+            oracle.x(zeroBits)
+        appendMcx(
+            oracle,
+            layout["inputs"],
+            layout["oracle"][0],
+            mcxStrategy,
+            layout["ancillas"],
+        )
+        if zeroBits:
+            oracle.x(zeroBits)
+
+    oracle.barrier(range(numTotalQubits))
+
+    return oracle
+
+
+def diffusionCircuit(
+    numInputQubits: int, mcxStrategy: str, numWorkQubits: int = 0
+) -> qk.QuantumCircuit:
+    """
+    Inversion about the mean of the input qubits
+
+    Args:
+        numInputQubits (int): Number of input qubits
+        mcxStrategy (str): One of mcxStrategies
+        numWorkQubits (int): Work qubits of the oracle, see groverLayout
+
+    Returns:
+        qk.QuantumCircuit: Diffusion circuit on the whole layout
+    """
+
+    layout = groverLayout(numInputQubits, mcxStrategy, numWorkQubits)
+    numTotalQubits = layout["oracle"][0] + 1
+    diffusion = qk.QuantumCircuit(numTotalQubits, name="Diffusion")
+
+    diffusion.h(layout["inputs"])
+    diffusion.x(layout["inputs"])
+    appendMcx(
+        diffusion,
+        layout["inputs"],
+        layout["oracle"][0],
+        mcxStrategy,
+        layout["ancillas"],
+    )
+    diffusion.x(layout["inputs"])
+    diffusion.h(layout["inputs"])
+
+    diffusion.barrier(range(numTotalQubits))
+
+    return diffusion
+
+
+def groverCircuit(
+    numInputQubits: int,
+    oracle: qk.QuantumCircuit,
+    iterations: int,
+    mcxStrategy: str,
+    measure: bool = True,
+    numWorkQubits: int = 0,
+) -> qk.QuantumCircuit:
+    """
+    Full Grover search circuit
+
+    Args:
+        numInputQubits (int): Number of input qubits
+        oracle (qk.QuantumCircuit): Oracle on the layout of groverLayout
+        iterations (int): Number of oracle and diffusion rounds
+        mcxStrategy (str): One of mcxStrategies
+        measure (bool): Measure the input qubits into cbits 0..numInputQubits - 1
+        numWorkQubits (int): Work qubits of the oracle, see groverLayout
+
+    Returns:
+        qk.QuantumCircuit: The circuit
+    """
+
+    layout = groverLayout(numInputQubits, mcxStrategy, numWorkQubits)
+    numTotalQubits = layout["oracle"][0] + 1
+    circuit = qk.QuantumCircuit(numTotalQubits, numInputQubits, name="Grover")
+
+    # Inputs in uniform superposition, oracle qubit in |->
+    circuit.x(layout["oracle"])
+    circuit.h(layout["inputs"] + layout["oracle"])
+    circuit.barrier(range(numTotalQubits))
+
+    diffusion = diffusionCircuit(numInputQubits, mcxStrategy, numWorkQubits)
+    for _ in range(iterations):
+        circuit.compose(oracle, inplace=True)
+        circuit.compose(diffusion, inplace=True)
+
+    if measure:
+        circuit.measure(layout["inputs"], range(numInputQubits))
+
+    return circuit
+
+
+def readDimacs(lines: Iterable[str]) -> Iterator[tuple[int, list[list[int]]]]:
+    """
+    Parse CNF formulas in the DIMACS format, one at a time
+
+    A new "p cnf" line starts the next formula, so a stream may hold several.
+    Comment lines ("c ...") and the "%" end marker of the SATLIB files are
+    skipped; a clause ends with 0 and may span lines.
+
+    Args:
+        lines (Iterable[str]): Lines of a file, read lazily
+
+    Raises:
+        ValueError: A malformed formula
+
+    Returns:
+        Iterator[tuple[int, list[list[int]]]]: Number of variables and clauses
+            (literals as signed variables) of each formula
+    """
+
+    numVariables: int | None = None
+    clauses: list[list[int]] = []
+    clause: list[int] = []
+
+    def finished(numVariables: int) -> tuple[int, list[list[int]]]:
+        if clause:
+            # The last clause may omit its 0
+            clauses.append(clause)
+        return numVariables, clauses
+
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0] in ("c", "%"):
+            continue
+
+        if fields[0] == "p":
+            if len(fields) != 4 or fields[1] != "cnf":
+                raise ValueError("Not a CNF problem line: {!r}".format(line))
+            if numVariables is not None:
+                yield finished(numVariables)
+            numVariables, clauses, clause = int(fields[2]), [], []
+            continue
+
+        if numVariables is None:
+            raise ValueError("Clause before the problem line: {!r}".format(line))
+        for literal in map(int, fields):
+            if literal == 0:
+                clauses.append(clause)
+                clause = []
+            elif abs(literal) > numVariables:
+                raise ValueError(
+                    "Literal {} of a formula over {} variables".format(
+                        literal, numVariables
+                    )
+                )
+            else:
+                clause.append(literal)
+
+    if numVariables is not None:
+        yield finished(numVariables)
+
+
+def satisfyingMask(numVariables: int, clauses: list[list[int]]) -> np.ndarray:
+    """
+    Evaluate a formula on every assignment at once
+
+    Args:
+        numVariables (int): Number of variables
+        clauses (list[list[int]]): Clauses of signed variables
+
+    Returns:
+        np.ndarray: Boolean per assignment, where bit v - 1 of the index is variable v
+    """
+
+    assignments = np.arange(2**numVariables, dtype=np.int64)
+    satisfied = np.ones(2**numVariables, dtype=bool)
+    for clause in clauses:
+        value = np.zeros(2**numVariables, dtype=bool)
+        for literal in clause:
+            bit = (assignments >> (abs(literal) - 1)) & 1
+            value |= bit == (1 if literal > 0 else 0)
+        satisfied &= value
+
+    return satisfied
+
+
+def satisfies(clauses: list[list[int]], assignment: int) -> bool:
+    """
+    Check one assignment classically
+
+    Args:
+        clauses (list[list[int]]): Clauses of signed variables
+        assignment (int): Bit v - 1 is variable v, as in the count keys
+
+    Returns:
+        bool: Every clause has a true literal
+    """
+
+    return all(
+        any(
+            ((assignment >> (abs(literal) - 1)) & 1) == (literal > 0)
+            for literal in clause
+        )
+        for clause in clauses
+    )
+
+
+def simplifiedClauses(clauses: list[list[int]]) -> list[list[int]]:
+    """
+    Clauses without repeated literals, and without those that always hold
+
+    Args:
+        clauses (list[list[int]]): Clauses of signed variables
+
+    Returns:
+        list[list[int]]: Equivalent clauses, each on distinct variables
+    """
+
+    simplified = []
+    for clause in clauses:
+        literals = sorted(set(clause), key=abs)
+        if any(-literal in literals for literal in literals):
+            # x | ~x holds for every assignment
+            continue
+        simplified.append(literals)
+
+    return simplified
+
+
+def cnfOracle(
+    numVariables: int, clauses: list[list[int]], mcxStrategy: str
+) -> qk.QuantumCircuit:
+    """
+    Oracle that flips the oracle qubit on every assignment satisfying a formula
+
+    Clause j is computed into work qubit j as NOT(AND of its negated literals),
+    the oracle qubit is flipped when every work qubit is 1, and the clauses are
+    uncomputed so the work qubits return to |0>. The layout has one work qubit
+    per clause of simplifiedClauses(clauses).
+
+    Args:
+        numVariables (int): Number of variables, one input qubit each
+        clauses (list[list[int]]): Clauses of signed variables
+        mcxStrategy (str): One of mcxStrategies
+
+    Returns:
+        qk.QuantumCircuit: Oracle circuit on the whole layout
+    """
+
+    clauses = simplifiedClauses(clauses)
+    layout = groverLayout(numVariables, mcxStrategy, len(clauses))
+    numTotalQubits = layout["oracle"][0] + 1
+    oracle = qk.QuantumCircuit(numTotalQubits, name="Oracle")
+
+    def computeClauses() -> None:
+        for clause, work in zip(clauses, layout["work"]):
+            # Flip positive literals, so the MCX fires when every literal is false
+            positive = [literal - 1 for literal in clause if literal > 0]
+            if positive:
+                oracle.x(positive)
+            if clause:
+                appendMcx(
+                    oracle,
+                    [abs(literal) - 1 for literal in clause],
+                    work,
+                    mcxStrategy,
+                    layout["ancillas"],
+                )
+            if positive:
+                oracle.x(positive)
+            # An empty clause never holds, its work qubit stays |0>
+            if clause:
+                oracle.x(work)
+
+    computeClauses()
+    oracle.barrier(range(numTotalQubits))
+    if layout["work"]:
+        appendMcx(
+            oracle,
+            layout["work"],
+            layout["oracle"][0],
+            mcxStrategy,
+            layout["ancillas"],
+        )
+    else:
+        # No clauses: every assignment satisfies the formula
+        oracle.x(layout["oracle"])
+    oracle.barrier(range(numTotalQubits))
+    # Each clause XORs its value into its own work qubit, so a second pass uncomputes
+    computeClauses()
+    oracle.barrier(range(numTotalQubits))
+
+    return oracle
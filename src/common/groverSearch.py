@@ -0,0 +1,124 @@
+"""
+Grover search when the number of solutions is unknown
+
+optimalIterations() needs the number of marked states M, and running more
+iterations than that over-rotates the state away from the solutions. For a
+real oracle M is unknown. bbhtSearch() follows Boyer, Brassard, Hoyer and Tapp
+("Tight bounds on quantum searching", 1998): it starts with m = 1 and at each
+trial picks the iteration count j uniformly from [0, m), runs Grover with j
+iterations, measures once and checks the outcome classically. On a miss m
+grows by a factor of 6/5, up to sqrt(N). Picking j at random averages the
+success probability to at least 1/4 once m reaches sqrt(N / M), so the
+expected number of oracle calls stays O(sqrt(N / M)) for every M. No trial
+runs an iteration count chosen from a wrong guess of M.
+
+A run with no solution would never stop, so the search gives up after
+maxOracleCalls, by default noSolutionFactor * sqrt(N), which is well above
+the expected cost of any satisfiable search.
+"""
+
+from math import ceil, sqrt
+from typing import Any, Callable, Final
+
+import numpy as np
+import qiskit as qk
+
+from common.circuitSpec import CircuitSpec
+from common.executors import Executor
+from common.grover import groverCircuit
+from common.tracing import span
+
+# Factor by which the iteration bound grows after a miss (BBHT use 6/5)
+bbhtGrowth: Final[float] = 6 / 5
+# Oracle calls, in units of sqrt(N), after which there is taken to be no solution
+noSolutionFactor: Final[float] = 9.0
+
+
+def bbhtSearch(
+    numInputQubits: int,
+    oracle: qk.QuantumCircuit,
+    isSolution: Callable[[int], bool],
+    executor: Executor,
+    mcxStrategy: str,
+    numWorkQubits: int = 0,
+    seed: int | None = None,
+    maxOracleCalls: int | None = None,
+    growth: float = bbhtGrowth,
+) -> dict[str, Any]:
+    """
+    Find one marked input without knowing how many there are
+
+    Args:
+        numInputQubits (int): Number of input qubits
+        oracle (qk.QuantumCircuit): Oracle on the layout of groverLayout
+        isSolution (Callable[[int], bool]): Classical check of a measured input,
+            e.g. satisfies() of the formula the oracle encodes
+        executor (Executor): Engine that runs the trials, one shot each
+        mcxStrategy (str): One of mcxStrategies
+        numWorkQubits (int): Work qubits of the oracle, see groverLayout
+        seed (int | None): Seed of the schedule and of every trial
+        maxOracleCalls (int | None): Oracle calls after which the search gives
+            up, defaults to noSolutionFactor * sqrt(N)
+        growth (float): Factor by which the iteration bound grows after a miss
+
+    Returns:
+        dict[str, Any]: "solution" (None if none was found), "oracleCalls" (Grover
+            iterations over all trials), "trials" (runs, each checked classically),
+            "iterations" of every trial and the "counts" of the measured inputs
+    """
+
+    size = 2**numInputQubits
+    limit = (
+        maxOracleCalls
+        if maxOracleCalls is not None
+        else ceil(noSolutionFactor * sqrt(size))
+    )
+    generator = np.random.default_rng(seed)
+
+    # Circuits by iteration count, a schedule repeats the small ones
+    specs: dict[int, CircuitSpec] = {}
+    bound = 1.0
+    oracleCalls = 0
+    schedule: list[int] = []
+    counts: dict[str, int] = {}
+    solution = None
+
+    while True:
+        iterations = int(generator.integers(0, ceil(bound)))
+        if oracleCalls + iterations > limit:
+            break
+
+        if iterations not in specs:
+            specs[iterations] = CircuitSpec.fromQiskit(
+                groverCircuit(
+                    numInputQubits,
+                    oracle,
+                    iterations,
+                    mcxStrategy,
+                    numWorkQubits=numWorkQubits,
+                )
+            )
+        with span("bbht trial", iterations=iterations):
+            trial = executor.run(
+                specs[iterations],
+                1,
+                None if seed is None else int(generator.integers(2**31)),
+            )
+
+        oracleCalls += iterations
+        schedule.append(iterations)
+        key = next(iter(trial))
+        counts[key] = counts.get(key, 0) + 1
+        if isSolution(int(key, 2)):
+            solution = int(key, 2)
+            break
+
+        bound = min(growth * bound, sqrt(size))
+
+    return {
+        "solution": solution,
+        "oracleCalls": oracleCalls,
+        "trials": len(schedule),
+        "iterations": schedule,
+        "counts": counts,
+    }
@@ -0,0 +1,117 @@
+"""
+Asyncio jobs, so simulation overlaps with post-processing and file I/O
+
+The engines release the GIL while they simulate, and writing the PNGs is
+mostly matplotlib and disk time, so the two can run side by side in threads.
+A JobRunner has two pools: submit() runs simulations, at most maxJobs at a
+time, and offload() runs post-processing and file writes. Both return an
+asyncio task right away, to be awaited when the result is needed:
+
+    async with JobRunner(config) as jobs:
+        counts = jobs.submit(executor.run, spec, shots, seed)
+        jobs.offload(drawCircuit, circuit)
+        jobs.offload(plotHistogram, await counts)
+
+Cancelling a task that is still waiting for a simulation slot means it never
+runs. A simulation already running cannot be interrupted, so cancelling it
+only drops its result; leaving the runner waits for it to finish.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class JobRunner:
+    def __init__(self, config: dict[str, Any] | None = None):
+        """
+        Runner configured from the [jobs] config section
+
+        Args:
+            config (dict[str, Any] | None): The whole configuration
+        """
+
+        section = (config or {}).get("jobs", {})
+        # Simulations in flight, each may itself use every core
+        self.maxJobs: int = section.get("maxJobs", 1)
+        # Matplotlib is not thread safe, so plots and writes go one at a time
+        self.ioWorkers: int = section.get("ioWorkers", 1)
+
+        self.simulations = ThreadPoolExecutor(
+            self.maxJobs, thread_name_prefix="simulate"
+        )
+        self.io = ThreadPoolExecutor(self.ioWorkers, thread_name_prefix="io")
+        self.slots = asyncio.Semaphore(self.maxJobs)
+        # Every task started, so errors nobody awaited still surface at exit
+        self.tasks: list[asyncio.Task] = []
+
+    def track(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.append(task)
+        return task
+
+    async def simulate(self, function: Callable[..., T], *args, **kwargs) -> T:
+        # Wait for a slot here, so a task cancelled while queued never starts
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.simulations, partial(function, *args, **kwargs)
+            )
+
+    def submit(self, function: Callable[..., T], *args, **kwargs) -> "asyncio.Task[T]":
+        """
+        Start a simulation, e.g. submit(executor.run, spec, shots, seed)
+
+        Args:
+            function (Callable[..., T]): Runs the simulation
+            *args: Arguments of function
+            **kwargs: Keyword arguments of function
+
+        Returns:
+            asyncio.Task[T]: Result of function, can be cancelled
+        """
+
+        return self.track(self.simulate(function, *args, **kwargs))
+
+    def offload(self, function: Callable[..., T], *args, **kwargs) -> "asyncio.Task[T]":
+        """
+        Start post-processing or a file write
+
+        Args:
+            function (Callable[..., T]): Work to run on the I/O pool
+            *args: Arguments of function
+            **kwargs: Keyword arguments of function
+
+        Returns:
+            asyncio.Task[T]: Result of function
+        """
+
+        return self.track(
+            asyncio.get_running_loop().run_in_executor(
+                self.io, partial(function, *args, **kwargs)
+            )
+        )
+
+    def cancel(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+    async def __aenter__(self) -> "JobRunner":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # On an error nothing awaits the remaining jobs, so drop them
+        if exc_type is not None:
+            self.cancel()
+
+        # Wait for every job, then raise the first error
+        results = await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.simulations.shutdown()
+        self.io.shutdown()
+
+        if exc_type is None:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
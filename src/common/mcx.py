@@ -0,0 +1,136 @@
+"""
+Selectable multi-controlled-X decompositions
+
+Grover's oracles and diffusion operators need an X gate with many controls.
+How qiskit decomposes it decides the gate count: without ancillas it grows
+quickly with the number of controls, while the v-chain variants stay linear at
+the price of extra (clean or dirty) workspace qubits.
+"""
+
+from typing import Final
+
+import qiskit as qk
+
+
+# Strategy name -> mode understood by qk.QuantumCircuit.mcx
+mcxStrategies: Final[dict[str, str]] = {
+    "no-ancilla": "noancilla",
+    "v-chain": "v-chain",
+    "dirty-ancilla": "v-chain-dirty",
+    "recursive": "recursion",
+}
+
+# Basis used when comparing the strategies
+reportBasisGates: Final[list[str]] = ["u", "cx"]
+
+
+def mcxAncillaCount(strategy: str, numControls: int) -> int:
+    """
+    Number of workspace qubits a strategy needs
+
+    Args:
+        strategy (str): One of mcxStrategies
+        numControls (int): Number of control qubits
+
+    Returns:
+        int: Number of ancilla qubits
+    """
+
+    match strategy:
+        case "no-ancilla":
+            return 0
+        case "v-chain" | "dirty-ancilla":
+            return max(0, numControls - 2)
+        case "recursive":
+            return 1 if numControls > 4 else 0
+        case _:
+            raise ValueError(
+                "Unknown MCX strategy '{}', choose one of {}".format(
+                    strategy, list(mcxStrategies)
+                )
+            )
+
+
+def appendMcx(
+    circuit: qk.QuantumCircuit,
+    controls: list[int],
+    target: int,
+    strategy: str,
+    ancillas: list[int],
+) -> None:
+    """
+    Append a multi-controlled X gate decomposed with the given strategy
+
+    Args:
+        circuit (qk.QuantumCircuit): Circuit to append to (in place)
+        controls (list[int]): Control qubits
+        target (int): Target qubit
+        strategy (str): One of mcxStrategies
+        ancillas (list[int]): Workspace qubits, only the first mcxAncillaCount are used
+    """
+
+    numAncillas = mcxAncillaCount(strategy, len(controls))
+    if len(ancillas) < numAncillas:
+        raise ValueError(
+            "Strategy '{}' needs {} ancillas for {} controls, got {}".format(
+                strategy, numAncillas, len(controls), len(ancillas)
+            )
+        )
+
+    circuit.mcx(
+        controls,
+        target,
+        ancilla_qubits=ancillas[:numAncillas] if numAncillas > 0 else None,
+        mode=mcxStrategies[strategy],
+    )
+
+
+def mcxCostReport(numControls: int, strategy: str) -> dict[str, int]:
+    """
+    Transpile a lone MCX gate and report its cost
+
+    Args:
+        numControls (int): Number of control qubits
+        strategy (str): One of mcxStrategies
+
+    Returns:
+        dict[str, int]: Gate count, CX count, depth and qubit count
+    """
+
+    numAncillas = mcxAncillaCount(strategy, numControls)
+    circuit = qk.QuantumCircuit(numControls + 1 + numAncillas)
+    appendMcx(
+        circuit,
+        list(range(numControls)),
+        numControls,
+        strategy,
+        list(range(numControls + 1, numControls + 1 + numAncillas)),
+    )
+
+    transpiled = qk.transpile(
+        circuit, basis_gates=reportBasisGates, optimization_level=1
+    )
+    return {
+        "gates": transpiled.size(),
+        "cx": transpiled.count_ops().get("cx", 0),
+        "depth": transpiled.depth(),
+        "qubits": transpiled.num_qubits,
+    }
+
+
+def cheapestMcxStrategy(numControls: int, metric: str = "gates") -> str:
+    """
+    Pick the strategy with the lowest cost for a given width
+
+    Args:
+        numControls (int): Number of control qubits
+        metric (str): Key of mcxCostReport to minimize
+
+    Returns:
+        str: Name of the cheapest strategy
+    """
+
+    return min(
+        mcxStrategies,
+        key=lambda strategy: mcxCostReport(numControls, strategy)[metric],
+    )
@@ -0,0 +1,197 @@
+"""
+Out-of-core statevector simulator backed by numpy.memmap
+
+The amplitudes live in a file and are streamed through RAM one chunk of
+2^chunkQubits amplitudes at a time. Gates are grouped into passes: a pass is a
+run of consecutive gates that together touch at most maxHighQubits qubits above
+the chunk, so one sweep over the file applies the whole run. Gates on low-order
+qubits never need more than one chunk in memory. A single gate with more high
+qubits (a Toffoli or MCX across them) gets a pass of its own, which holds
+2^k chunks for its k high qubits; fusion for this simulator never builds such
+a gate, see fuseGates().
+"""
+
+from pathlib import Path
+import os
+import tempfile
+
+import numpy as np
+
+from common.denseKernels import applyGateDense, sampleDenseCounts
+from common.gates import Gate
+
+
+class MemmapStatevector:
+    def __init__(
+        self,
+        numQubits: int,
+        directory: str | None = None,
+        chunkQubits: int = 24,
+        maxHighQubits: int = 2,
+    ):
+        """
+        Create the amplitude file and start in |0...0>
+
+        Args:
+            numQubits (int): Number of qubits
+            directory (str | None): Where to put the amplitude file, defaults to the temp directory
+            chunkQubits (int): log2 of the amplitudes held in RAM per chunk
+            maxHighQubits (int): Qubits above the chunk a single pass may touch,
+                a pass keeps 2^maxHighQubits chunks in RAM
+        """
+
+        self.numQubits = numQubits
+        self.chunkQubits = min(chunkQubits, numQubits)
+        self.chunkSize = 2**self.chunkQubits
+        self.numChunks = 2 ** (numQubits - self.chunkQubits)
+        self.maxHighQubits = maxHighQubits
+
+        descriptor, filename = tempfile.mkstemp(
+            prefix="statevector-", suffix=".bin", dir=directory
+        )
+        os.close(descriptor)
+        self.path = Path(filename)
+
+        # Mode w+ creates a zero-filled file, only |0...0> needs to be written
+        self.amplitudes = np.memmap(
+            self.path, dtype=np.complex128, mode="w+", shape=(2**numQubits,)
+        )
+        self.amplitudes[0] = 1
+        self.passes = 0
+
+    def highQubits(self, gate: Gate) -> set[int]:
+        """
+        Qubits of a gate that select the chunk rather than the offset in it
+        """
+
+        return {qubit for qubit in gate[1] if qubit >= self.chunkQubits}
+
+    def groupPasses(self, gates: list[Gate]) -> list[tuple[list[int], list[Gate]]]:
+        """
+        Split gates into passes of consecutive gates sharing few high qubits
+
+        Args:
+            gates (list[Gate]): Gates in program order
+
+        Returns:
+            list[tuple[list[int], list[Gate]]]: Sorted high qubits and gates of each pass
+        """
+
+        passes: list[tuple[list[int], list[Gate]]] = []
+        high: set[int] = set()
+        current: list[Gate] = []
+
+        for gate in gates:
+            merged = high | self.highQubits(gate)
+            if current and len(merged) > self.maxHighQubits:
+                passes.append((sorted(high), current))
+                high, current = self.highQubits(gate), []
+            else:
+                high = merged
+            current.append(gate)
+
+        if current:
+            passes.append((sorted(high), current))
+
+        return passes
+
+    def applyPass(self, high: list[int], gates: list[Gate]) -> None:
+        """
+        Sweep the file once, applying all gates of a pass to each group of chunks
+
+        Args:
+            high (list[int]): Qubits above the chunk touched by the pass, ascending
+            gates (list[Gate]): Gates of the pass
+        """
+
+        # In the in-memory block, high[j] becomes qubit chunkQubits + j
+        relabel = {qubit: self.chunkQubits + j for j, qubit in enumerate(high)}
+        blockGates = [
+            (name, tuple(relabel.get(qubit, qubit) for qubit in qubits), params)
+            for name, qubits, params in gates
+        ]
+
+        highMask = 0
+        for qubit in high:
+            highMask |= 1 << (qubit - self.chunkQubits)
+        # Chunk offsets selected by every combination of the high qubits
+        offsets = []
+        for combination in range(2 ** len(high)):
+            offset = 0
+            for j, qubit in enumerate(high):
+                if (combination >> j) & 1:
+                    offset |= 1 << (qubit - self.chunkQubits)
+            offsets.append(offset)
+
+        block = np.empty(self.chunkSize * len(offsets), dtype=np.complex128)
+        for base in range(self.numChunks):
+            if base & highMask:
+                continue
+
+            for j, offset in enumerate(offsets):
+                start = (base | offset) * self.chunkSize
+                block[j * self.chunkSize : (j + 1) * self.chunkSize] = self.amplitudes[
+                    start : start + self.chunkSize
+                ]
+
+            for gate in blockGates:
+                applyGateDense(block, gate)
+
+            for j, offset in enumerate(offsets):
+                start = (base | offset) * self.chunkSize
+                self.amplitudes[start : start + self.chunkSize] = block[
+                    j * self.chunkSize : (j + 1) * self.chunkSize
+                ]
+
+        self.amplitudes.flush()
+        self.passes += 1
+
+    def run(self, gates: list[Gate]) -> None:
+        """
+        Apply gates in order, pass by pass
+
+        Args:
+            gates (list[Gate]): Gates without measurements
+        """
+
+        for high, passGates in self.groupPasses(gates):
+            self.applyPass(high, passGates)
+
+    def sampleCounts(
+        self,
+        measurements: list[tuple[int, int]],
+        numCbits: int,
+        shots: int,
+        seed: int | None = None,
+    ) -> dict[str, int]:
+        """
+        Sample measurement outcomes, streaming the probabilities chunk by chunk
+
+        Args:
+            measurements (list[tuple[int, int]]): (qubit, cbit) pairs
+            numCbits (int): Width of the outcome keys, cbits beyond it are dropped
+            shots (int): Number of samples
+            seed (int | None): Seed of the sampler
+
+        Returns:
+            dict[str, int]: Counts keyed like pyqpanda, cbit 0 is the rightmost character
+        """
+
+        return sampleDenseCounts(
+            self.amplitudes, measurements, numCbits, shots, seed, self.chunkSize
+        )
+
+    def close(self) -> None:
+        """
+        Release the mapping and delete the amplitude file
+        """
+
+        del self.amplitudes
+        self.path.unlink(missing_ok=True)
+
+    # Destructor using 'with'
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,189 @@
+"""
+Peak memory of every traced span
+
+The profiler attaches memory figures to the spans of common/tracing.py, so they
+end up in the same trace file as the timings:
+
+- rssStartBytes, rssEndBytes and rssPeakBytes: resident set size from psutil,
+  the peak sampled by a background thread while the span is open
+- pyAllocatedBytes and pyPeakBytes: Python allocations seen by tracemalloc, net
+  over the span and at their peak, which attributes the memory of circuit
+  building to the traced builder functions
+
+At exit it adds a "memory summary" span with the process peak RSS and the
+source lines that still hold the most Python memory. tracemalloc slows Python
+down noticeably, so this is opt-in: [profiling] memory = true in config.toml
+or the QIE_MEMORY_PROFILE environment variable.
+"""
+
+from pathlib import Path
+from typing import Any, Final
+import threading
+import tracemalloc
+
+import psutil
+
+
+# Environment variable that enables memory profiling when set
+memoryProfileEnvironmentVariable: Final[str] = "QIE_MEMORY_PROFILE"
+# Frames kept per tracemalloc allocation, to find the caller inside this repo
+tracebackFrames: Final[int] = 16
+# Allocation sites are only reported inside this directory (src)
+sourceRoot: Final[str] = str(Path(__file__).resolve().parents[1])
+
+
+class SpanMemory:
+    __slots__ = ("rssStart", "rssPeak", "pyStart", "pyPeak")
+
+    def __init__(self, rss: int, python: int):
+        self.rssStart = rss
+        self.rssPeak = rss
+        self.pyStart = python
+        self.pyPeak = python
+
+
+class MemoryProfiler:
+    def __init__(self, sampleInterval: float = 0.01, topAllocations: int = 10):
+        """
+        Profiler, see start()
+
+        Args:
+            sampleInterval (float): Seconds between RSS samples
+            topAllocations (int): Allocation sites listed in the summary
+        """
+
+        self.sampleInterval = sampleInterval
+        self.topAllocations = topAllocations
+        self.process = psutil.Process()
+        # Open spans by span id
+        self.open: dict[int, SpanMemory] = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.peakRss = 0
+        self.peakPython = 0
+        self.sampler = threading.Thread(
+            target=self.sample, name="rss-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(tracebackFrames)
+        self.sampler.start()
+
+    def rss(self) -> int:
+        rss = self.process.memory_info().rss
+        self.peakRss = max(self.peakRss, rss)
+        return rss
+
+    def foldPeaks(self, rss: int | None = None) -> None:
+        """
+        Raise the peaks of every open span to the current values
+
+        tracemalloc keeps one process-wide peak, so it is folded into the open
+        spans and reset at every span boundary.
+
+        Args:
+            rss (int | None): RSS sample to fold in, if any
+        """
+
+        _, pythonPeak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.peakPython = max(self.peakPython, pythonPeak)
+        for memory in self.open.values():
+            memory.pyPeak = max(memory.pyPeak, pythonPeak)
+            if rss is not None:
+                memory.rssPeak = max(memory.rssPeak, rss)
+
+    def sample(self) -> None:
+        while not self.stopped.wait(self.sampleInterval):
+            rss = self.rss()
+            with self.lock:
+                for memory in self.open.values():
+                    memory.rssPeak = max(memory.rssPeak, rss)
+
+    def enter(self, span: Any) -> None:
+        """
+        Span enter hook
+
+        Args:
+            span (Any): The common.tracing.Span being entered
+        """
+
+        rss = self.rss()
+        with self.lock:
+            self.foldPeaks(rss)
+            current, _ = tracemalloc.get_traced_memory()
+            self.open[span.id] = SpanMemory(rss, current)
+
+    def exit(self, span: Any) -> None:
+        """
+        Span exit hook, adds the memory attributes
+
+        Args:
+            span (Any): The common.tracing.Span being exited
+        """
+
+        rss = self.rss()
+        with self.lock:
+            self.foldPeaks(rss)
+            memory = self.open.pop(span.id, None)
+        if memory is None:
+            return
+
+        current, _ = tracemalloc.get_traced_memory()
+        span.attributes.update(
+            {
+                "rssStartBytes": memory.rssStart,
+                "rssEndBytes": rss,
+                "rssPeakBytes": memory.rssPeak,
+                "pyAllocatedBytes": current - memory.pyStart,
+                "pyPeakBytes": memory.pyPeak - memory.pyStart,
+            }
+        )
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Process-wide figures and the largest Python allocation sites
+
+        Returns:
+            dict[str, Any]: Peak RSS, tracemalloc peak and the sites inside src
+                holding the most live Python memory, by the innermost frame of
+                this repo
+        """
+
+        self.stopped.set()
+        self.rss()
+        with self.lock:
+            self.foldPeaks()
+
+        sites: dict[str, list[int]] = {}
+        for statistic in tracemalloc.take_snapshot().statistics("traceback"):
+            # Innermost frame in this repo, so library allocations are charged
+            # to the code that asked for them
+            frame = next(
+                (
+                    frame
+                    for frame in reversed(statistic.traceback)
+                    if frame.filename.startswith(sourceRoot)
+                ),
+                None,
+            )
+            if frame is None:
+                continue
+            site = "{}:{}".format(
+                Path(frame.filename).relative_to(sourceRoot), frame.lineno
+            )
+            total = sites.setdefault(site, [0, 0])
+            total[0] += statistic.size
+            total[1] += statistic.count
+
+        return {
+            "rssPeakBytes": self.peakRss,
+            "pyPeakBytes": self.peakPython,
+            "topLiveAllocations": [
+                {"site": site, "bytes": size, "blocks": count}
+                for site, (size, count) in sorted(
+                    sites.items(), key=lambda item: -item[1][0]
+                )[: self.topAllocations]
+            ],
+        }
@@ -0,0 +1,178 @@
+"""
+Noise models, from the [noise] config section
+
+The "noise" backend runs a circuit under three kinds of error:
+
+- depolarizing: after every single-qubit gate (depolarizing1q) and every CNOT
+  (depolarizing2q)
+- thermal relaxation: T1/T2 decay over the duration of each gate (t1, t2,
+  gateTime1q, gateTime2q, in the same time unit; t1 = 0 disables it)
+- readout: a 0 read as 1 with probability readout01, a 1 read as 0 with
+  probability readout10
+
+The circuit is first lowered to U3 and CNOT, so the errors land on the same
+gates whichever engine runs it: an Aer noise model (engine = "aer") or a
+pyqpanda NoiseQVM (engine = "cpuqvm").
+
+A density matrix takes 4^n amplitudes, so it is only used for small circuits.
+Wider ones sample one noisy trajectory (a statevector) per shot, and Aer runs
+the shots in parallel on the cores [parallelism] allows. NoiseQVM always
+samples trajectories. Either way the shots can also be split across
+processes, see common/shotParallel.py.
+"""
+
+from typing import Any, Final
+
+import pyqpanda as pq
+import qiskit as qk
+from qiskit_aer.noise import (
+    NoiseModel,
+    ReadoutError,
+    depolarizing_error,
+    thermal_relaxation_error,
+)
+
+from common.circuitSpec import CircuitSpec
+from common.gates import gatesFromQiskit
+
+# Gates the circuits are lowered to before the errors are attached
+noisyBasisGates: Final[list[str]] = ["u", "cx"]
+# Widest circuit simulated as a density matrix by method = "auto", 2^20 entries
+defaultDensityMatrixQubits: Final[int] = 10
+
+
+def simulationMethod(numQubits: int, section: dict[str, Any]) -> str:
+    """
+    Aer method of a noisy run
+
+    Args:
+        numQubits (int): Width of the circuit
+        section (dict[str, Any]): The [noise] config section
+
+    Returns:
+        str: "density_matrix", or "statevector" for trajectories
+    """
+
+    match section.get("method", "auto"):
+        case "density_matrix":
+            return "density_matrix"
+        case "trajectories":
+            return "statevector"
+        case "auto":
+            maxQubits = section.get("densityMatrixQubits", defaultDensityMatrixQubits)
+            return "density_matrix" if numQubits <= maxQubits else "statevector"
+        case method:
+            raise ValueError(
+                "Unknown noise method '{}', choose auto, density_matrix "
+                "or trajectories".format(method)
+            )
+
+
+def noisyBasisCircuit(spec: CircuitSpec) -> CircuitSpec:
+    """
+    Lower a circuit to U3 and CNOT, the gates the errors are attached to
+
+    Args:
+        spec (CircuitSpec): Circuit to lower
+
+    Returns:
+        CircuitSpec: Same circuit and measurements, U3 and CNOT gates only
+    """
+
+    # Level 0 keeps every gate as written, so none escapes its error
+    circuit = qk.transpile(
+        spec.toQiskit(), basis_gates=noisyBasisGates, optimization_level=0
+    )
+
+    lowered = CircuitSpec(spec.numQubits, spec.numCbits, spec.name)
+    lowered.ops = gatesFromQiskit(circuit)
+    return lowered
+
+
+def readoutMatrix(section: dict[str, Any]) -> list[list[float]]:
+    """
+    Readout confusion matrix, row i is the distribution read for state i
+
+    Args:
+        section (dict[str, Any]): The [noise] config section
+
+    Returns:
+        list[list[float]]: 2 x 2 matrix
+    """
+
+    readout01 = section.get("readout01", 0.0)
+    readout10 = section.get("readout10", 0.0)
+    return [[1 - readout01, readout01], [readout10, 1 - readout10]]
+
+
+def aerNoiseModel(section: dict[str, Any]) -> NoiseModel:
+    """
+    Aer noise model of the [noise] config section
+
+    Args:
+        section (dict[str, Any]): The [noise] config section
+
+    Returns:
+        NoiseModel: Errors on u, cx and the measurements
+    """
+
+    model = NoiseModel(basis_gates=noisyBasisGates)
+
+    for gate, qubits, suffix in [("u", 1, "1q"), ("cx", 2, "2q")]:
+        error = None
+        probability = section.get("depolarizing" + suffix, 0.0)
+        if probability > 0:
+            error = depolarizing_error(probability, qubits)
+
+        if section.get("t1", 0) > 0:
+            relaxation = thermal_relaxation_error(
+                section["t1"], section["t2"], section["gateTime" + suffix]
+            )
+            if qubits == 2:
+                relaxation = relaxation.expand(relaxation)
+            error = relaxation if error is None else error.compose(relaxation)
+
+        if error is not None:
+            model.add_all_qubit_quantum_error(error, gate)
+
+    if section.get("readout01", 0.0) > 0 or section.get("readout10", 0.0) > 0:
+        model.add_all_qubit_readout_error(ReadoutError(readoutMatrix(section)))
+
+    return model
+
+
+def noiseQVM(section: dict[str, Any]) -> pq.NoiseQVM:
+    """
+    NoiseQVM with the errors of the [noise] config section
+
+    Args:
+        section (dict[str, Any]): The [noise] config section
+
+    Returns:
+        pq.NoiseQVM: Initialized QVM
+    """
+
+    qvm = pq.NoiseQVM()
+
+    gateTypes = {"1q": pq.GateType.U3_GATE, "2q": pq.GateType.CNOT_GATE}
+    for suffix, gateType in gateTypes.items():
+        probability = section.get("depolarizing" + suffix, 0.0)
+        if probability > 0:
+            qvm.set_noise_model(
+                pq.NoiseModel.DEPOLARIZING_KRAUS_OPERATOR, gateType, probability
+            )
+
+        if section.get("t1", 0) > 0:
+            qvm.set_noise_model(
+                pq.NoiseModel.DECOHERENCE_KRAUS_OPERATOR,
+                gateType,
+                section["t1"],
+                section["t2"],
+                section["gateTime" + suffix],
+            )
+
+    if section.get("readout01", 0.0) > 0 or section.get("readout10", 0.0) > 0:
+        qvm.set_readout_error(readoutMatrix(section))
+
+    qvm.init_qvm()
+    return qvm
@@ -0,0 +1,108 @@
+"""
+Parse the OriginIR text that pyqpanda produces for a program
+
+This is how pyqpanda programs reach the simulators in this package:
+pq.convert_qprog_to_originir lowers a QProg to text, and parseOriginIR turns
+that text into the gate tuples of common/gates.py.
+"""
+
+import re
+
+import pyqpanda as pq
+
+from common.gates import Gate, inverseGate
+
+
+# e.g. "CNOT q[0],q[1]" or "RY q[1],(0.3)" or "MEASURE q[0],c[0]"
+instructionPattern = re.compile(r"^(\w+)\s+(.*?)(?:,\((.*)\))?$")
+qubitPattern = re.compile(r"q\[(\d+)\]")
+cbitPattern = re.compile(r"c\[(\d+)\]")
+
+
+def programToOriginIR(prog: pq.QProg, qvm: pq.QuantumMachine) -> str:
+    """
+    Lower a pyqpanda program to OriginIR text
+
+    Args:
+        prog (pq.QProg): Program to lower
+        qvm (pq.QuantumMachine): Machine the qubits of the program belong to
+
+    Returns:
+        str: OriginIR text
+    """
+
+    return pq.convert_qprog_to_originir(prog, qvm)
+
+
+def parseOriginIR(text: str) -> tuple[int, int, list[Gate]]:
+    """
+    Parse OriginIR text into gates and measurements
+
+    Args:
+        text (str): OriginIR text
+
+    Returns:
+        tuple[int, int, list[Gate]]: Number of qubits, number of cbits and the ops
+    """
+
+    numQubits = 0
+    numCbits = 0
+    ops: list[Gate] = []
+    # Gates inside DAGGER ... ENDDAGGER are collected, then inverted in reverse
+    daggerStack: list[list[Gate]] = []
+
+    for lineNumber, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        keyword = line.split()[0]
+        match keyword:
+            case "QINIT":
+                numQubits = int(line.split()[1])
+                continue
+            case "CREG":
+                numCbits = int(line.split()[1])
+                continue
+            case "BARRIER":
+                continue
+            case "DAGGER":
+                daggerStack.append([])
+                continue
+            case "ENDDAGGER":
+                block = daggerStack.pop()
+                target = daggerStack[-1] if daggerStack else ops
+                target.extend(inverseGate(gate) for gate in reversed(block))
+                continue
+            case (
+                "CONTROL"
+                | "ENDCONTROL"
+                | "QIF"
+                | "ELSE"
+                | "ENDQIF"
+                | "QWHILE"
+                | "ENDQWHILE"
+                | "RESET"
+            ):
+                raise ValueError(
+                    "Line {}: {} is not supported".format(lineNumber, keyword)
+                )
+
+        match = instructionPattern.match(line)
+        if match is None:
+            raise ValueError("Line {}: cannot parse '{}'".format(lineNumber, line))
+        name, operands, params = match.groups()
+
+        qubits = tuple(int(q) for q in qubitPattern.findall(operands))
+        if name == "MEASURE":
+            op: Gate = (name, qubits, (int(cbitPattern.findall(operands)[0]),))
+        else:
+            op = (
+                name,
+                qubits,
+                tuple(float(p) for p in params.split(",")) if params else (),
+            )
+
+        (daggerStack[-1] if daggerStack else ops).append(op)
+
+    return numQubits, numCbits, ops
@@ -0,0 +1,121 @@
+"""
+Thread limits of every engine, from the [parallelism] config section
+
+Aer, CPUQVM and the BLAS behind numpy each start as many threads as there are
+cores by default. That is right for one experiment alone, and oversubscribes
+the machine when several run side by side. configureParallelism() reads one
+section and every engine applies it:
+
+- Aer: max_parallel_threads, max_parallel_shots and max_parallel_experiments
+  of every AerSimulator created through aerOptions()
+- CPUQVM: set_max_threads on every QVM passed to limitQVM()
+- BLAS/OpenMP: threadpoolctl when it is installed; the OMP_NUM_THREADS-style
+  environment variables are set as well, which covers the worker processes of
+  common/shotParallel.py and anything loaded later
+
+threads is the default of every limit, 0 meaning all cores.
+src/benchmarks/scaling-benchmark.py measures which values suit the host.
+"""
+
+from typing import Any, Final
+import os
+
+import pyqpanda as pq
+
+# Environment variables read by the OpenMP and BLAS runtimes at startup
+threadEnvironmentVariables: Final[list[str]] = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+class Parallelism:
+    def __init__(self):
+        """
+        No limits, see configureParallelism()
+        """
+
+        self.threads = 0
+        self.aerThreads = 0
+        self.aerParallelShots = 0
+        self.aerParallelExperiments = 0
+        self.qvmThreads = 0
+        self.blasThreads = 0
+        # The config section, to configure worker processes the same way
+        self.section: dict[str, Any] = {}
+        # Keeps the threadpoolctl limits in force, when it is installed
+        self.blasLimiter: Any = None
+
+    def aerOptions(self) -> dict[str, int]:
+        """
+        Thread options for AerSimulator, 0 leaves Aer's own default
+
+        Returns:
+            dict[str, int]: max_parallel_* options of the configured limits
+        """
+
+        options = {
+            "max_parallel_threads": self.aerThreads,
+            "max_parallel_shots": self.aerParallelShots,
+            "max_parallel_experiments": self.aerParallelExperiments,
+        }
+        return {name: value for name, value in options.items() if value > 0}
+
+    def limitQVM(self, qvm: pq.QuantumMachine) -> pq.QuantumMachine:
+        """
+        Apply the thread limit to a QVM
+
+        Args:
+            qvm (pq.QuantumMachine): QVM, already initialized (set_max_threads
+                crashes before init_qvm)
+
+        Returns:
+            pq.QuantumMachine: The same QVM
+        """
+
+        if self.qvmThreads > 0 and hasattr(qvm, "set_max_threads"):
+            qvm.set_max_threads(self.qvmThreads)
+        return qvm
+
+    def limitBlas(self) -> None:
+        if self.blasThreads <= 0:
+            return
+
+        for name in threadEnvironmentVariables:
+            os.environ[name] = str(self.blasThreads)
+
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            # numpy already started its BLAS, which keeps its thread count
+            return
+
+        self.blasLimiter = threadpool_limits(self.blasThreads)
+
+
+parallelism: Final[Parallelism] = Parallelism()
+
+
+def configureParallelism(config: dict[str, Any]) -> None:
+    """
+    Set the thread limits from the [parallelism] config section
+
+    Args:
+        config (dict[str, Any]): The whole configuration
+    """
+
+    section = config.get("parallelism", {})
+    threads = section.get("threads", 0)
+
+    parallelism.section = section
+    parallelism.threads = threads
+    parallelism.aerThreads = section.get("aerThreads", threads)
+    # Unset: Aer decides, within aerThreads
+    parallelism.aerParallelShots = section.get("aerParallelShots", 0)
+    parallelism.aerParallelExperiments = section.get("aerParallelExperiments", 0)
+    parallelism.qvmThreads = section.get("qvmThreads", threads)
+    parallelism.blasThreads = section.get("blasThreads", threads)
+    parallelism.limitBlas()
@@ -0,0 +1,340 @@
+"""
+Estimate what a run will cost before starting it
+
+A statevector of n qubits takes 16 * 2^n bytes, so adderDigits.count = 12 (37
+qubits) asks CPUQVM for 2 TiB. estimateResources reads a CircuitSpec and
+reports its qubits, gate counts, depth, statevector and density matrix sizes
+and a rough time per run, and checkResources compares the memory of the chosen
+backend against the [resources] budget: the run goes ahead, is rerouted to a
+backend that fits, or is refused with a MemoryError before anything is
+allocated.
+"""
+
+from typing import Any, Final
+import tempfile
+
+import psutil
+
+from common.circuitSpec import CircuitSpec
+from common.gates import diagonalGates, permutationGates
+from common.noise import simulationMethod
+from common.sparseSimulator import maxSparseQubits
+from common.tracing import traced
+
+
+# Bytes of one complex128 amplitude
+amplitudeBytes: Final[int] = 16
+# Bytes of one sparse entry: int64 index and complex128 amplitude
+sparseEntryBytes: Final[int] = 24
+# Backends that store the whole statevector in RAM, and how many copies of it
+# ("statevector" is qiskit.quantum_info.Statevector)
+statevectorCopies: Final[dict[str, int]] = {
+    "cpuqvm": 1,
+    "aer": 1,
+    "dense": 2,
+    "statevector": 1,
+}
+# Backends tried, in order, when the chosen one does not fit
+rerouteOrder: Final[list[str]] = ["sparse", "memmap"]
+
+
+@traced()
+def estimateResources(spec: CircuitSpec, shots: int = 1) -> dict[str, Any]:
+    """
+    Count what a circuit needs, independently of the backend
+
+    The support bound is how many basis states a sparse statevector can hold:
+    permutation and diagonal gates keep the support size, any other gate on k
+    qubits can multiply it by at most 2^k.
+
+    Args:
+        spec (CircuitSpec): Circuit to estimate
+        shots (int): Number of shots
+
+    Returns:
+        dict[str, Any]: Qubits, cbits, shots, gate counts by name, depth, qubits
+            of the widest gate, support bound, statevector and density matrix
+            bytes, amplitude updates of one run for a dense and a sparse
+            statevector, and whether gates follow a measurement
+    """
+
+    gateCounts: dict[str, int] = {}
+    lastLayer: dict[int, int] = {}
+    support = 1
+    maxSupport = 1
+    sparseUpdates = 0
+    widestGate = 0
+    measured = False
+    midCircuitMeasurements = False
+
+    for name, qubits, _ in spec.ops:
+        gateCounts[name] = gateCounts.get(name, 0) + 1
+
+        layer = 1 + max((lastLayer.get(qubit, -1) for qubit in qubits), default=-1)
+        for qubit in qubits:
+            lastLayer[qubit] = layer
+
+        if name == "MEASURE":
+            measured = True
+            continue
+        midCircuitMeasurements = midCircuitMeasurements or measured
+        widestGate = max(widestGate, len(qubits))
+
+        if name not in permutationGates and name not in diagonalGates:
+            support = min(support * 2 ** len(qubits), 2**spec.numQubits)
+            maxSupport = max(maxSupport, support)
+        sparseUpdates += support
+
+    statevectorSize = 2**spec.numQubits
+    numGates = sum(count for name, count in gateCounts.items() if name != "MEASURE")
+
+    return {
+        "qubits": spec.numQubits,
+        "cbits": spec.numCbits,
+        "shots": shots,
+        "gates": gateCounts,
+        "depth": 1 + max(lastLayer.values(), default=-1),
+        "widestGate": widestGate,
+        "supportBound": maxSupport,
+        "statevectorBytes": amplitudeBytes * statevectorSize,
+        "densityMatrixBytes": amplitudeBytes * statevectorSize**2,
+        "amplitudeUpdates": numGates * statevectorSize,
+        "sparseAmplitudeUpdates": sparseUpdates,
+        "midCircuitMeasurements": midCircuitMeasurements,
+    }
+
+
+def backendMemory(
+    estimate: dict[str, Any], backend: str, options: dict[str, Any] | None = None
+) -> int:
+    """
+    RAM a backend needs for a circuit
+
+    Args:
+        estimate (dict[str, Any]): Result of estimateResources
+        backend (str): Backend name, see common/executors.py
+        options (dict[str, Any] | None): Config section named after the backend
+
+    Returns:
+        int: Bytes, counting the temporaries of the gate kernels
+    """
+
+    options = options or {}
+    match backend:
+        case "sparse":
+            if estimate["qubits"] > maxSparseQubits:
+                return 2**63
+            # The spread of a branching gate keeps the old and new arrays
+            return 3 * sparseEntryBytes * estimate["supportBound"]
+        case "memmap":
+            chunkQubits = min(options.get("chunkQubits", 24), estimate["qubits"])
+            # Fused gates stay within maxHighQubits qubits above the chunk, but
+            # a single wider gate (a Toffoli, an MCX) gets a pass of its own
+            # holding 2^k chunks for its k high qubits
+            highQubits = max(
+                options.get("maxHighQubits", 2),
+                min(estimate["widestGate"], estimate["qubits"] - chunkQubits),
+            )
+            return 2 * amplitudeBytes * 2 ** (chunkQubits + highQubits)
+        case "noise":
+            if simulationMethod(estimate["qubits"], options) == "density_matrix":
+                return estimate["densityMatrixBytes"]
+            return estimate["statevectorBytes"]
+        case _:
+            return statevectorCopies.get(backend, 1) * estimate["statevectorBytes"]
+
+
+def backendSeconds(
+    estimate: dict[str, Any], backend: str, budget: dict[str, Any] | None = None
+) -> float:
+    """
+    Rough time of one run, from the amplitude update throughput in the budget
+
+    Args:
+        estimate (dict[str, Any]): Result of estimateResources
+        backend (str): Backend name
+        budget (dict[str, Any] | None): The [resources] config section
+
+    Returns:
+        float: Seconds
+    """
+
+    updates = (
+        estimate["sparseAmplitudeUpdates"]
+        if backend == "sparse"
+        else estimate["amplitudeUpdates"]
+    )
+    return updates / (budget or {}).get("amplitudeUpdatesPerSecond", 2e8)
+
+
+def memoryBudget(budget: dict[str, Any] | None = None) -> int:
+    """
+    Memory a run may use
+
+    Args:
+        budget (dict[str, Any] | None): The [resources] config section
+
+    Returns:
+        int: memoryBudgetMiB in bytes, or 80% of the available memory if unset
+    """
+
+    budget = budget or {}
+    if "memoryBudgetMiB" in budget:
+        return int(budget["memoryBudgetMiB"] * 2**20)
+
+    return int(0.8 * psutil.virtual_memory().available)
+
+
+def fitsOnDisk(
+    estimate: dict[str, Any], backend: str, options: dict[str, Any] | None = None
+) -> bool:
+    """
+    Whether the amplitude file of the memmap backend fits on its disk
+
+    Args:
+        estimate (dict[str, Any]): Result of estimateResources
+        backend (str): Backend name, only memmap uses the disk
+        options (dict[str, Any] | None): Config section named after the backend
+
+    Returns:
+        bool: True if the backend does not need the disk or the file fits
+    """
+
+    if backend != "memmap":
+        return True
+
+    directory = (options or {}).get("directory") or tempfile.gettempdir()
+    return estimate["statevectorBytes"] <= psutil.disk_usage(directory).free
+
+
+def formatBytes(size: float) -> str:
+    """
+    Human readable size
+
+    Args:
+        size (float): Size in bytes
+
+    Returns:
+        str: e.g. "2.0 TiB"
+    """
+
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB", "PiB"]:
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024
+
+    return "{:.1f} EiB".format(size)
+
+
+def formatEstimate(
+    estimate: dict[str, Any],
+    backend: str,
+    options: dict[str, Any] | None = None,
+    budget: dict[str, Any] | None = None,
+) -> str:
+    """
+    One line report of an estimate on a backend
+
+    Args:
+        estimate (dict[str, Any]): Result of estimateResources
+        backend (str): Backend name
+        options (dict[str, Any] | None): Config section named after the backend
+        budget (dict[str, Any] | None): The [resources] config section
+
+    Returns:
+        str: The report
+    """
+
+    gates = ", ".join(
+        "{} {}".format(name, count)
+        for name, count in sorted(estimate["gates"].items(), key=lambda item: -item[1])
+    )
+    seconds = backendSeconds(estimate, backend, budget)
+    # Engines re-simulate every shot when gates follow a measurement, and
+    # noisy trajectories are one simulation per shot
+    resimulated = estimate["midCircuitMeasurements"] or (
+        backend == "noise"
+        and simulationMethod(estimate["qubits"], options or {}) == "statevector"
+    )
+    perShot = seconds if resimulated else seconds / max(estimate["shots"], 1)
+
+    return (
+        "{} qubits, depth {}, gates: {}; statevector {}, density matrix {}; "
+        "{} needs {}, ~{:.3g} s per run, ~{:.3g} s per shot".format(
+            estimate["qubits"],
+            estimate["depth"],
+            gates,
+            formatBytes(estimate["statevectorBytes"]),
+            formatBytes(estimate["densityMatrixBytes"]),
+            backend,
+            formatBytes(backendMemory(estimate, backend, options)),
+            seconds,
+            perShot,
+        )
+    )
+
+
+def checkResources(
+    estimate: dict[str, Any],
+    backend: str,
+    options: dict[str, Any] | None = None,
+    budget: dict[str, Any] | None = None,
+    reroute: bool = True,
+) -> tuple[str, dict[str, Any]]:
+    """
+    Make sure a run fits in the memory budget
+
+    The memmap backend also needs its amplitude file to fit on the disk. A
+    rerouted run uses the default options of the backend it moves to, both
+    in the check and in the run, so every entry point reroutes the same way.
+
+    Args:
+        estimate (dict[str, Any]): Result of estimateResources
+        backend (str): Backend the run asks for
+        options (dict[str, Any] | None): Config section named after the backend
+        budget (dict[str, Any] | None): The [resources] config section
+        reroute (bool): Whether the caller can run on another backend
+
+    Raises:
+        MemoryError: Nothing that the caller can run on fits in the budget
+
+    Returns:
+        tuple[str, dict[str, Any]]: Backend to run on, the requested one
+            whenever it fits, and the options to create its executor with
+    """
+
+    budget = budget or {}
+    limit = memoryBudget(budget)
+    if budget.get("report", True):
+        print(
+            "Resources: {}".format(formatEstimate(estimate, backend, options, budget))
+        )
+
+    if backendMemory(estimate, backend, options) <= limit and fitsOnDisk(
+        estimate, backend, options
+    ):
+        return backend, options or {}
+
+    message = "{} needs {} for {} qubits, the budget is {}".format(
+        backend,
+        formatBytes(backendMemory(estimate, backend, options)),
+        estimate["qubits"],
+        formatBytes(limit),
+    )
+
+    # The other backends are ideal, rerouting would drop the noise
+    if (
+        reroute
+        and backend != "noise"
+        and budget.get("onExceed", "reroute") == "reroute"
+    ):
+        for candidate in rerouteOrder:
+            if candidate == backend:
+                continue
+            if backendMemory(estimate, candidate) <= limit and fitsOnDisk(
+                estimate, candidate
+            ):
+                print("{}, rerouting to {}".format(message, candidate))
+                return candidate, {}
+
+    raise MemoryError(message)
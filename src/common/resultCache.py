@@ -0,0 +1,249 @@
+"""
+Disk cache of seeded simulation results
+
+A seeded run is deterministic: the same circuit, engine, engine options, shots
+and seed always give the same counts (see common/executors.py). The cache keys
+a run by a digest of exactly those, and stores its counts as one compact .npy
+file of (outcome, count) pairs, so a repeated run returns without simulating.
+
+Unseeded runs draw fresh randomness on every run and are never cached.
+
+The cache is bounded by [cache] maxSizeMiB with least recently used eviction
+(a hit refreshes the file's modification time). It is off until
+configureCache() enables it from [cache] enabled; the QIE_NO_CACHE environment
+variable bypasses it for one run.
+"""
+
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Final
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from common.circuitSpec import CircuitSpec
+from common.executors import Executor
+from common.sampling import countKey
+from common.tracing import span
+
+
+# Environment variable that bypasses the cache when set
+cacheBypassEnvironmentVariable: Final[str] = "QIE_NO_CACHE"
+# Bytes of the cache key
+cacheKeyBytes: Final[int] = 20
+# Bump when the key or file layout changes, so old entries are never read
+cacheFormatVersion: Final[int] = 1
+
+
+def resultKey(
+    spec: CircuitSpec,
+    backend: str,
+    options: dict[str, Any],
+    shots: int,
+    seed: int,
+) -> str:
+    """
+    Digest of everything that determines the counts of a seeded run
+
+    Args:
+        spec (CircuitSpec): The final circuit
+        backend (str): Executor name
+        options (dict[str, Any]): Executor options, e.g. the Aer method
+        shots (int): Number of shots
+        seed (int): Seed of the sampler
+
+    Returns:
+        str: Hex key
+    """
+
+    digest = blake2b(digest_size=cacheKeyBytes)
+    digest.update(
+        json.dumps(
+            [
+                cacheFormatVersion,
+                backend,
+                options,
+                shots,
+                seed,
+                spec.numQubits,
+                spec.numCbits,
+            ],
+            sort_keys=True,
+            default=str,
+        ).encode()
+    )
+    for name, qubits, params in spec.ops:
+        # repr keeps every bit of the angles
+        digest.update("{}{}{!r};".format(name, qubits, params).encode())
+
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        directory: str | None = None,
+        maxBytes: int = 256 * 2**20,
+        enabled: bool = False,
+    ):
+        """
+        Cache, disabled unless enabled is set
+
+        Args:
+            directory (str | None): Directory of the entries, defaults to the temp directory
+            maxBytes (int): Size above which the least recently used entries are evicted
+            enabled (bool): Look up and store results
+        """
+
+        self.directory = Path(
+            directory or Path(tempfile.gettempdir()) / "quantum-cache"
+        )
+        self.maxBytes = maxBytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        # Whether the last run() was served from the cache
+        self.lastHit = False
+
+    def path(self, key: str) -> Path:
+        return self.directory / (key + ".npy")
+
+    def get(self, key: str, numCbits: int) -> dict[str, int] | None:
+        """
+        Counts stored under a key
+
+        Args:
+            key (str): See resultKey()
+            numCbits (int): Width of the count keys
+
+        Returns:
+            dict[str, int] | None: The counts, None on a miss
+        """
+
+        path = self.path(key)
+        try:
+            pairs = np.load(path)
+        except (OSError, ValueError):
+            # Missing, or cut short by a crash: treat as a miss
+            return None
+
+        # Mark as recently used
+        os.utime(path)
+        return {
+            countKey(int(outcome), numCbits): int(count)
+            for outcome, count in pairs.tolist()
+        }
+
+    def put(self, key: str, counts: dict[str, int]) -> None:
+        """
+        Store counts and evict old entries if the cache grew too large
+
+        Args:
+            key (str): See resultKey()
+            counts (dict[str, int]): Counts keyed by the cbits
+        """
+
+        pairs = np.array(
+            [(int(outcome, 2), count) for outcome, count in counts.items()],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see half an entry
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, suffix=".tmp", delete=False
+        ) as file:
+            np.save(file, pairs)
+        os.replace(file.name, self.path(key))
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used entries until the cache fits in maxBytes
+        """
+
+        entries = []
+        for path in self.directory.glob("*.npy"):
+            try:
+                status = path.stat()
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.npy"):
+            path.unlink(missing_ok=True)
+
+    def run(
+        self,
+        executor: Executor,
+        spec: CircuitSpec,
+        shots: int,
+        seed: int | None = None,
+    ) -> dict[str, int]:
+        """
+        Run a circuit on an executor, through the cache when possible
+
+        Args:
+            executor (Executor): Engine to run on a miss
+            spec (CircuitSpec): Circuit to run
+            shots (int): Number of shots
+            seed (int | None): Seed of the sampler, unseeded runs skip the cache
+
+        Returns:
+            dict[str, int]: Counts keyed by the cbits
+        """
+
+        self.lastHit = False
+        if (
+            not self.enabled
+            or seed is None
+            or os.environ.get(cacheBypassEnvironmentVariable)
+        ):
+            return executor.run(spec, shots, seed)
+
+        key = resultKey(spec, executor.name, executor.options, shots, seed)
+        with span("cache lookup", key=key) as lookup:
+            counts = self.get(key, spec.numCbits)
+            if lookup is not None:
+                lookup.attributes["hit"] = counts is not None
+        if counts is not None:
+            self.hits += 1
+            self.lastHit = True
+            return counts
+
+        self.misses += 1
+        counts = executor.run(spec, shots, seed)
+        with span("cache store", key=key):
+            self.put(key, counts)
+
+        return counts
+
+
+resultCache: Final[ResultCache] = ResultCache()
+
+
+def configureCache(config: dict[str, Any]) -> None:
+    """
+    Set up the shared cache from the [cache] config section
+
+    Args:
+        config (dict[str, Any]): The whole configuration
+    """
+
+    section = config.get("cache", {})
+    resultCache.enabled = section.get("enabled", False)
+    resultCache.directory = Path(
+        section.get("directory", config["exportFiles"]["destination"] + "cache")
+    )
+    resultCache.maxBytes = int(section.get("maxSizeMiB", 256) * 2**20)
@@ -0,0 +1,557 @@
+"""
+Columnar store of past runs, for querying them with pandas
+
+Every recorded run keeps its experiment, parameters, backend, shots, seed,
+timing, the commit of the code and its counts. Runs are buffered and written as
+append-only segments: a directory of one .npy file per column, for the runs
+(one row per run) and the counts (one row per outcome of a run, in long form).
+Text columns (experiment, parameters as canonical JSON, commit, backend) are
+stored as int32 codes into dictionaries kept in index.json, which also lists
+the segments with the codes they hold, so a query opens only the segments of
+the experiments, parameters and commits it asks for.
+
+Columns are memory-mapped (np.load with mmap_mode="r") and handed to pandas
+without a copy; only a query that spans several segments or filters inside one
+concatenates. compact() merges the segments into one, and happens on its own
+once there are [results] maxSegments of them.
+
+Writers take a lock on the directory, so concurrent scripts append safely. The
+store is off until configureResultStore() enables it from [results] enabled.
+"""
+
+from pathlib import Path
+from time import time
+from typing import Any, Final
+import atexit
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common.sampling import countKey
+from common.tracing import span
+
+
+# Bump when the layout changes, so old stores are never misread
+storeFormatVersion: Final[int] = 1
+# Column -> dtype of the runs and counts tables of a segment
+runColumns: Final[dict[str, type]] = {
+    "run": np.int64,
+    "experiment": np.int32,
+    "params": np.int32,
+    "commit": np.int32,
+    "backend": np.int32,
+    "shots": np.int64,
+    # -1 for an unseeded run
+    "seed": np.int64,
+    "seconds": np.float64,
+    # Unix time the run was recorded
+    "timestamp": np.float64,
+    "width": np.int32,
+}
+countColumns: Final[dict[str, type]] = {
+    "run": np.int64,
+    "outcome": np.int64,
+    "count": np.int64,
+}
+# Run columns stored as codes into the dictionaries of the index
+codedColumns: Final[list[str]] = ["experiment", "params", "commit", "backend"]
+
+
+def currentCommit() -> str:
+    """
+    Commit of the code that is running
+
+    Returns:
+        str: Abbreviated hash, with -dirty for uncommitted changes, or "unknown"
+            outside a git checkout
+    """
+
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty", "--abbrev=12"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def encodeParams(params: dict[str, Any]) -> str:
+    """
+    Canonical text of run parameters, equal parameters give equal text
+
+    Args:
+        params (dict[str, Any]): Parameters of a run
+
+    Returns:
+        str: Compact JSON with sorted keys
+    """
+
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ResultStore:
+    def __init__(
+        self,
+        directory: str | None = None,
+        batchRuns: int = 256,
+        maxSegments: int = 64,
+        enabled: bool = False,
+    ):
+        """
+        Store, disabled unless enabled is set
+
+        Args:
+            directory (str | None): Directory of the store, defaults to the temp directory
+            batchRuns (int): Runs buffered before a segment is written
+            maxSegments (int): Segments above which they are compacted into one
+            enabled (bool): Record runs
+        """
+
+        self.directory = Path(
+            directory or Path(tempfile.gettempdir()) / "quantum-results"
+        )
+        self.batchRuns = batchRuns
+        self.maxSegments = maxSegments
+        self.enabled = enabled
+        self.commit: str | None = None
+        self.buffer: list[dict[str, Any]] = []
+        self.registered = False
+
+    def record(
+        self,
+        experiment: str,
+        params: dict[str, Any],
+        backend: str,
+        shots: int,
+        seed: int | None,
+        seconds: float,
+        counts: dict[str, int],
+        cached: bool = False,
+    ) -> None:
+        """
+        Add a run, written with the next segment
+
+        Runs served by the result cache are skipped: their seconds would be the
+        lookup, and the run that filled the cache was recorded when it ran.
+
+        Args:
+            experiment (str): Name of the experiment, e.g. "adder"
+            params (dict[str, Any]): Its inputs, e.g. {"digits": 4, "a": 3, "b": 5}
+            backend (str): Engine that ran it
+            shots (int): Number of shots
+            seed (int | None): Seed of the sampler
+            seconds (float): Wall time of the run
+            counts (dict[str, int]): Counts keyed by the cbits
+            cached (bool): Served by the result cache, see resultCache.lastHit
+        """
+
+        if not self.enabled or cached:
+            return
+
+        if self.commit is None:
+            self.commit = currentCommit()
+        if not self.registered:
+            atexit.register(self.flush)
+            self.registered = True
+
+        width = max((len(key.replace(" ", "")) for key in counts), default=0)
+        if width > 63:
+            raise ValueError(
+                "Outcomes of {} cbits do not fit the int64 outcome column".format(width)
+            )
+
+        self.buffer.append(
+            {
+                "experiment": experiment,
+                "params": encodeParams(params),
+                "commit": self.commit,
+                "backend": backend,
+                "shots": shots,
+                "seed": -1 if seed is None else seed,
+                "seconds": seconds,
+                "timestamp": time(),
+                "width": width,
+                "counts": counts,
+            }
+        )
+        if len(self.buffer) >= self.batchRuns:
+            self.flush()
+
+    def lock(self, shared: bool = False) -> int:
+        # Readers share it, so a compaction never deletes what they are opening
+        self.directory.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(self.directory / ".lock", os.O_RDWR | os.O_CREAT)
+        fcntl.flock(descriptor, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return descriptor
+
+    def unlock(self, descriptor: int) -> None:
+        fcntl.flock(descriptor, fcntl.LOCK_UN)
+        os.close(descriptor)
+
+    def readIndex(self) -> dict[str, Any]:
+        try:
+            with open(self.directory / "index.json") as file:
+                index = json.load(file)
+        except FileNotFoundError:
+            return {
+                "version": storeFormatVersion,
+                "runs": 0,
+                "nextSegment": 0,
+                "dictionaries": {column: [] for column in codedColumns},
+                "segments": [],
+            }
+
+        if index["version"] != storeFormatVersion:
+            raise ValueError(
+                "{} has format version {}, not {}".format(
+                    self.directory, index["version"], storeFormatVersion
+                )
+            )
+        return index
+
+    def writeIndex(self, index: dict[str, Any]) -> None:
+        # Write then rename, so readers never see half an index
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False
+        ) as file:
+            json.dump(index, file)
+        os.replace(file.name, self.directory / "index.json")
+
+    def writeSegment(
+        self,
+        index: dict[str, Any],
+        runs: dict[str, np.ndarray],
+        counts: dict[str, np.ndarray],
+    ) -> None:
+        """
+        Write the columns of a segment and add it to the index (not yet saved)
+
+        Args:
+            index (dict[str, Any]): Index read under the lock
+            runs (dict[str, np.ndarray]): Columns of runColumns
+            counts (dict[str, np.ndarray]): Columns of countColumns
+        """
+
+        # Names are never reused, a reader may still map a compacted segment
+        name = "segment-{:08d}".format(index["nextSegment"])
+        index["nextSegment"] += 1
+        # Built aside then renamed, so a crash leaves no partial segment behind
+        temporary = Path(tempfile.mkdtemp(dir=self.directory, suffix=".tmp"))
+        for table, columns in (("runs", runs), ("counts", counts)):
+            for column, values in columns.items():
+                np.save(temporary / "{}.{}.npy".format(table, column), values)
+        os.replace(temporary, self.directory / name)
+
+        index["segments"].append(
+            {
+                "name": name,
+                "runs": len(runs["run"]),
+                "counts": len(counts["run"]),
+                # Codes it holds, to skip it in queries for others
+                **{
+                    column: sorted(set(runs[column].tolist()))
+                    for column in codedColumns
+                },
+            }
+        )
+
+    def flush(self) -> None:
+        """
+        Write the buffered runs as one segment
+        """
+
+        if not self.buffer:
+            return
+
+        with span("result store flush", runs=len(self.buffer)):
+            descriptor = self.lock()
+            try:
+                index = self.readIndex()
+                dictionaries = index["dictionaries"]
+                lookups = {
+                    column: {
+                        text: code for code, text in enumerate(dictionaries[column])
+                    }
+                    for column in codedColumns
+                }
+
+                def code(column: str, text: str) -> int:
+                    if text not in lookups[column]:
+                        lookups[column][text] = len(dictionaries[column])
+                        dictionaries[column].append(text)
+                    return lookups[column][text]
+
+                first = index["runs"]
+                runs = {
+                    "run": np.arange(first, first + len(self.buffer), dtype=np.int64)
+                }
+                for column in codedColumns:
+                    runs[column] = np.array(
+                        [code(column, entry[column]) for entry in self.buffer],
+                        dtype=runColumns[column],
+                    )
+                for column in ["shots", "seed", "seconds", "timestamp", "width"]:
+                    runs[column] = np.array(
+                        [entry[column] for entry in self.buffer],
+                        dtype=runColumns[column],
+                    )
+
+                pairs = [
+                    (run, int(outcome.replace(" ", ""), 2), count)
+                    for run, entry in zip(runs["run"].tolist(), self.buffer)
+                    for outcome, count in entry["counts"].items()
+                ]
+                table = np.array(pairs, dtype=np.int64).reshape(-1, 3)
+                counts = {
+                    column: np.ascontiguousarray(table[:, i])
+                    for i, column in enumerate(countColumns)
+                }
+
+                self.writeSegment(index, runs, counts)
+                index["runs"] = first + len(self.buffer)
+                compact = len(index["segments"]) > self.maxSegments
+                self.writeIndex(index)
+                self.buffer = []
+
+                if compact:
+                    self.compactLocked(index)
+            finally:
+                self.unlock(descriptor)
+
+    def compact(self) -> None:
+        """
+        Merge every segment into one, so queries map a single file per column
+        """
+
+        self.flush()
+        descriptor = self.lock()
+        try:
+            self.compactLocked(self.readIndex())
+        finally:
+            self.unlock(descriptor)
+
+    def compactLocked(self, index: dict[str, Any]) -> None:
+        old = index["segments"]
+        if len(old) < 2:
+            return
+
+        with span("result store compact", segments=len(old)):
+            runs = {
+                column: np.concatenate(
+                    [self.column(segment, "runs", column) for segment in old]
+                )
+                for column in runColumns
+            }
+            counts = {
+                column: np.concatenate(
+                    [self.column(segment, "counts", column) for segment in old]
+                )
+                for column in countColumns
+            }
+
+            index["segments"] = []
+            self.writeSegment(index, runs, counts)
+            self.writeIndex(index)
+
+        for segment in old:
+            shutil.rmtree(self.directory / segment["name"], ignore_errors=True)
+
+    def column(self, segment: dict[str, Any], table: str, column: str) -> np.ndarray:
+        return np.load(
+            self.directory / segment["name"] / "{}.{}.npy".format(table, column),
+            mmap_mode="r",
+        )
+
+    def select(
+        self,
+        table: str,
+        experiment: str | None = None,
+        params: dict[str, Any] | None = None,
+        commit: str | None = None,
+        backend: str | None = None,
+    ) -> tuple[dict[str, Any], list[dict[str, np.ndarray]]]:
+        """
+        Columns of the matching rows, segment by segment
+
+        Segments without a match are never opened; the columns of a segment
+        whose runs all match are the memory maps themselves.
+
+        Args:
+            table (str): "runs" or "counts"
+            experiment (str | None): Only this experiment
+            params (dict[str, Any] | None): Only runs whose parameters include these
+            commit (str | None): Only runs of this commit (a prefix is enough)
+            backend (str | None): Only runs on this backend
+
+        Returns:
+            tuple[dict[str, Any], list[dict[str, np.ndarray]]]: The index, and
+                column -> values of each segment with matching rows
+        """
+
+        descriptor = self.lock(shared=True)
+        try:
+            index = self.readIndex()
+            dictionaries = index["dictionaries"]
+
+            wanted: dict[str, set[int]] = {}
+            if experiment is not None:
+                wanted["experiment"] = {
+                    code
+                    for code, text in enumerate(dictionaries["experiment"])
+                    if text == experiment
+                }
+            if params is not None:
+                # Through JSON, so e.g. tuples compare equal to the stored lists
+                subset = json.loads(encodeParams(params)).items()
+                wanted["params"] = {
+                    code
+                    for code, text in enumerate(dictionaries["params"])
+                    if subset <= json.loads(text).items()
+                }
+            if commit is not None:
+                wanted["commit"] = {
+                    code
+                    for code, text in enumerate(dictionaries["commit"])
+                    if text.startswith(commit)
+                }
+            if backend is not None:
+                wanted["backend"] = {
+                    code
+                    for code, text in enumerate(dictionaries["backend"])
+                    if text == backend
+                }
+
+            selected = []
+            for segment in index["segments"]:
+                mask = None
+                for column, codes in wanted.items():
+                    held = codes & set(segment[column])
+                    if not held:
+                        break
+                    if held != set(segment[column]):
+                        # Only some runs of the segment match
+                        match = np.isin(
+                            self.column(segment, "runs", column), sorted(held)
+                        )
+                        mask = match if mask is None else mask & match
+                else:
+                    columns = {
+                        column: self.column(segment, table, column)
+                        for column in (runColumns if table == "runs" else countColumns)
+                    }
+                    if mask is not None:
+                        if table == "counts":
+                            mask = np.isin(
+                                columns["run"],
+                                self.column(segment, "runs", "run")[mask],
+                            )
+                        columns = {
+                            column: values[mask] for column, values in columns.items()
+                        }
+                    selected.append(columns)
+        finally:
+            self.unlock(descriptor)
+
+        return index, selected
+
+    def runs(self, **filters: Any) -> pd.DataFrame:
+        """
+        Runs as a DataFrame, one row per run
+
+        Args:
+            **filters (Any): experiment, params, commit and backend, see select()
+
+        Returns:
+            pd.DataFrame: The columns of runColumns, the coded ones as categoricals
+        """
+
+        index, selected = self.select("runs", **filters)
+        frame = self.frame(selected, runColumns)
+        for column in codedColumns:
+            frame[column] = pd.Categorical.from_codes(
+                frame[column].to_numpy(), index["dictionaries"][column]
+            )
+        return frame
+
+    def counts(self, **filters: Any) -> pd.DataFrame:
+        """
+        Counts as a DataFrame, one row per outcome of a run, without a copy
+        when they come from a single segment and every run of it matches
+
+        Args:
+            **filters (Any): experiment, params, commit and backend, see select()
+
+        Returns:
+            pd.DataFrame: run, outcome (cbit c is bit c) and count; join with
+                runs() on run for the rest
+        """
+
+        _, selected = self.select("counts", **filters)
+        return self.frame(selected, countColumns)
+
+    def frame(
+        self, selected: list[dict[str, np.ndarray]], columns: dict[str, type]
+    ) -> pd.DataFrame:
+        if not selected:
+            return pd.DataFrame(
+                {column: np.empty(0, dtype=dtype) for column, dtype in columns.items()}
+            )
+        if len(selected) == 1:
+            # The memory maps back the frame
+            return pd.DataFrame(selected[0], copy=False)
+        return pd.concat(
+            [pd.DataFrame(values, copy=False) for values in selected],
+            ignore_index=True,
+        )
+
+    def countsOf(self, run: int) -> dict[str, int]:
+        """
+        Counts of one run in the form the backends return them
+
+        Args:
+            run (int): Run id, from runs()
+
+        Returns:
+            dict[str, int]: Counts keyed by the cbits
+        """
+
+        runs = self.runs()
+        widths = runs["width"][runs["run"] == run]
+        if widths.empty:
+            raise KeyError("No run {} in {}".format(run, self.directory))
+
+        counts = self.counts()
+        rows = counts[counts["run"] == run]
+        return {
+            countKey(outcome, int(widths.iloc[0])): count
+            for outcome, count in zip(rows["outcome"].tolist(), rows["count"].tolist())
+        }
+
+
+resultStore: Final[ResultStore] = ResultStore()
+
+
+def configureResultStore(config: dict[str, Any]) -> None:
+    """
+    Set up the shared store from the [results] config section
+
+    Args:
+        config (dict[str, Any]): The whole configuration
+    """
+
+    section = config.get("results", {})
+    resultStore.enabled = section.get("enabled", False)
+    resultStore.directory = Path(
+        section.get("directory", config["exportFiles"]["destination"] + "results")
+    )
+    resultStore.batchRuns = section.get("batchRuns", 256)
+    resultStore.maxSegments = section.get("maxSegments", 64)
@@ -0,0 +1,96 @@
+"""
+One sampler for every executor
+
+Given the probability of each measurement outcome, every executor draws its
+counts here. With the same seed, two engines that agree on the probabilities
+therefore return exactly the same counts.
+"""
+
+import numpy as np
+
+from common.tracing import traced
+
+
+# Outcomes less likely than this are treated as impossible
+outcomeTolerance: float = 1e-12
+
+
+def countKey(outcome: int, numCbits: int) -> str:
+    """
+    Format an outcome like pyqpanda and qiskit do, cbit 0 is the rightmost character
+
+    Args:
+        outcome (int): Outcome, cbit c is bit c
+        numCbits (int): Width of the key
+
+    Returns:
+        str: Count key
+    """
+
+    return format(outcome, "0{}b".format(numCbits))
+
+
+@traced()
+def sampleOutcomes(
+    outcomes: np.ndarray,
+    probabilities: np.ndarray,
+    numCbits: int,
+    shots: int,
+    seed: int | None = None,
+) -> dict[str, int]:
+    """
+    Draw counts for the given outcome probabilities
+
+    Args:
+        outcomes (np.ndarray): Outcomes, may repeat (their probabilities are added)
+        probabilities (np.ndarray): Probability of each entry of outcomes
+        numCbits (int): Width of the count keys
+        shots (int): Number of samples
+        seed (int | None): Seed of the sampler
+
+    Returns:
+        dict[str, int]: Counts of the outcomes that occurred
+    """
+
+    keys, inverse = np.unique(np.asarray(outcomes, dtype=np.int64), return_inverse=True)
+    # Float sums, as weights are given (numpy's stubs type bincount as integer)
+    totals: np.ndarray = np.bincount(
+        inverse, weights=probabilities, minlength=keys.size
+    )
+
+    possible = totals > outcomeTolerance
+    keys, totals = keys[possible], totals[possible]
+    # Engines differ in the last bits of the probabilities, and the multinomial
+    # draw flips around p = 0.5, so snap them to the tolerance first
+    totals = np.round(totals / outcomeTolerance) * outcomeTolerance
+
+    rng = np.random.default_rng(seed)
+    counts = rng.multinomial(shots, totals / totals.sum())
+
+    return {
+        countKey(int(key), numCbits): int(count)
+        for key, count in zip(keys, counts)
+        if count > 0
+    }
+
+
+def measurementOutcomes(
+    indices: np.ndarray, measurements: list[tuple[int, int]], numCbits: int
+) -> np.ndarray:
+    """
+    Outcome of each basis state, given which qubit is measured into which cbit
+
+    Args:
+        indices (np.ndarray): Basis state indices, qubit q is bit q
+        measurements (list[tuple[int, int]]): (qubit, cbit) pairs
+        numCbits (int): Cbits beyond this are dropped
+
+    Returns:
+        np.ndarray: Outcome of each index, cbit c is bit c
+    """
+
+    outcomes = np.zeros(indices.shape, dtype=np.int64)
+    for qubit, cbit in measurements:
+        if cbit < numCbits:
+            outcomes |= ((indices >> qubit) & 1) << cbit
+    return outcomes
@@ -0,0 +1,196 @@
+"""
+Split the shots of one run across worker processes
+
+CPUQVM and Aer sample natively shot by shot, so a 10^7 shot run is one long
+sampling stream on one core. Here the shots are cut into chunks of at most
+chunkShots, each chunk runs as its own stream in a process pool, and the
+partial counts are summed, which merges them exactly.
+
+The chunking depends only on the shot count, never on the number of workers,
+and with a seed each chunk gets its own seed spawned from it by
+numpy.random.SeedSequence. A seeded run therefore gives the same counts with
+any number of workers. Unseeded chunks sample with fresh randomness.
+
+Runs that do not sample shot by shot are not split: with a seed, CPUQVM, Aer
+and the numpy engines compute the outcome probabilities once and draw every
+shot in one multinomial (common/sampling.py), which keeps their counts
+identical across engines. Only the noise engine on Aer seeds its own
+shot-by-shot sampler, so it is the one seeded run that is split. Runs of at
+most chunkShots shots are never split.
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+import multiprocessing
+
+import numpy as np
+
+from common.circuitSpec import CircuitSpec
+from common.executors import Executor, createExecutor
+from common.parallelism import configureParallelism, parallelism
+from common.tracing import span
+
+
+def chunkShotCounts(shots: int, chunkShots: int) -> list[int]:
+    """
+    Cut a shot count into near-equal chunks
+
+    Args:
+        shots (int): Total shots
+        chunkShots (int): Largest chunk
+
+    Returns:
+        list[int]: Shots of each chunk, summing to shots
+    """
+
+    numChunks = max(1, -(-shots // chunkShots))
+    base, extra = divmod(shots, numChunks)
+    return [base + (index < extra) for index in range(numChunks)]
+
+
+def chunkSeeds(seed: int | None, numChunks: int) -> list[int | None]:
+    """
+    Independent seeds of the chunks of a run
+
+    Args:
+        seed (int | None): Seed of the whole run, None for fresh randomness
+        numChunks (int): Number of chunks
+
+    Returns:
+        list[int | None]: Seed of each chunk
+    """
+
+    if seed is None:
+        return [None] * numChunks
+
+    return [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(numChunks)
+    ]
+
+
+def mergeCounts(parts: list[dict[str, int]]) -> dict[str, int]:
+    """
+    Sum partial counts
+
+    Args:
+        parts (list[dict[str, int]]): Counts of each chunk
+
+    Returns:
+        dict[str, int]: Total counts
+    """
+
+    total: Counter[str] = Counter()
+    for part in parts:
+        total.update(part)
+    return dict(total)
+
+
+def runChunk(
+    name: str,
+    options: dict[str, Any],
+    spec: CircuitSpec,
+    shots: int,
+    seed: int | None,
+) -> dict[str, int]:
+    # Runs in a worker process, so the executor is rebuilt from its name
+    return createExecutor(name, options).runShots(spec, shots, seed)
+
+
+class ShotParallelExecutor(Executor):
+    def __init__(self, executor: Executor, workers: int = 1, chunkShots: int = 10**6):
+        """
+        Run the shots of an executor in parallel chunks
+
+        Args:
+            executor (Executor): Engine that runs each chunk
+            workers (int): Worker processes, 1 runs the chunks one after another
+            chunkShots (int): Largest chunk
+        """
+
+        # Reports and cache keys see the wrapped engine, plus the chunking,
+        # which changes the counts of a seeded run
+        super().__init__({**executor.options, "chunkShots": chunkShots})
+        self.name = executor.name
+        self.executor = executor
+        self.workers = workers
+        self.chunkShots = chunkShots
+
+    def splits(self, shots: int, seed: int | None) -> bool:
+        """
+        Whether a run is split into chunks
+
+        Args:
+            shots (int): Number of shots
+            seed (int | None): Seed of the sampler
+
+        Returns:
+            bool: The engine samples shot by shot and shots exceed chunkShots
+        """
+
+        return (
+            self.executor.samplesShots
+            and (seed is None or self.executor.seedsShots)
+            and shots > self.chunkShots
+        )
+
+    def run(
+        self, spec: CircuitSpec, shots: int, seed: int | None = None
+    ) -> dict[str, int]:
+        if not self.splits(shots, seed):
+            return self.executor.run(spec, shots, seed)
+
+        chunks = chunkShotCounts(shots, self.chunkShots)
+        seeds = chunkSeeds(seed, len(chunks))
+        workers = min(self.workers, len(chunks))
+
+        with span("shot parallel", chunks=len(chunks), workers=workers):
+            if workers <= 1:
+                parts = [
+                    self.executor.runShots(spec, chunk, chunkSeed)
+                    for chunk, chunkSeed in zip(chunks, seeds)
+                ]
+            else:
+                # spawn: the engines start OpenMP threads, which do not survive fork
+                # Workers apply the same thread limits as this process
+                with ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=configureParallelism,
+                    initargs=({"parallelism": parallelism.section},),
+                ) as pool:
+                    parts = list(
+                        pool.map(
+                            runChunk,
+                            [self.name] * len(chunks),
+                            [self.executor.options] * len(chunks),
+                            [spec] * len(chunks),
+                            chunks,
+                            seeds,
+                        )
+                    )
+
+        return mergeCounts(parts)
+
+
+def parallelExecutor(
+    executor: Executor, simulation: dict[str, Any] | None = None
+) -> ShotParallelExecutor:
+    """
+    Wrap an executor as configured by [simulation] shotWorkers and shotChunk
+
+    Args:
+        executor (Executor): Engine to wrap
+        simulation (dict[str, Any] | None): The [simulation] config section
+
+    Returns:
+        ShotParallelExecutor: The shot-parallel executor
+    """
+
+    simulation = simulation or {}
+    return ShotParallelExecutor(
+        executor,
+        simulation.get("shotWorkers", 1),
+        int(simulation.get("shotChunk", 10**6)),
+    )
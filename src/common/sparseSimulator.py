@@ -0,0 +1,231 @@
+"""
+Sparse statevector simulator
+
+The state is kept as two numpy arrays: the basis indices with a non-zero
+amplitude and those amplitudes. Memory and time scale with the size of the
+support rather than with 2^n, which suits the experiment-2 arithmetic
+circuits: with fixed inputs they only ever hold one basis state, no matter how
+many qubits they use.
+"""
+
+from typing import Final
+
+import numpy as np
+
+from common.gates import Gate, diagonalGates, gateMatrix, permutationGates
+from common.sampling import measurementOutcomes, sampleOutcomes
+
+
+# Largest register that fits in the int64 basis indices
+maxSparseQubits: Final[int] = 62
+# Amplitudes with a probability below this are dropped from the support
+pruneTolerance: float = 1e-14
+
+
+def spreadOffsets(qubits: tuple[int, ...]) -> tuple[np.ndarray, int]:
+    """
+    Basis index offset of every local index once spread onto the gate qubits
+
+    Args:
+        qubits (tuple[int, ...]): Gate qubits, qubits[0] is the most significant bit
+
+    Returns:
+        tuple[np.ndarray, int]: Offsets of the 2^k local indices, and the mask of the qubits
+    """
+
+    offsets = np.zeros(2 ** len(qubits), dtype=np.int64)
+    for local in range(offsets.size):
+        for position, qubit in enumerate(qubits):
+            if (local >> (len(qubits) - 1 - position)) & 1:
+                offsets[local] |= 1 << qubit
+
+    mask = 0
+    for qubit in qubits:
+        mask |= 1 << qubit
+
+    return offsets, mask
+
+
+class SparseStatevector:
+    def __init__(self, numQubits: int):
+        """
+        Start in |0...0>
+
+        Args:
+            numQubits (int): Number of qubits
+        """
+
+        if numQubits > maxSparseQubits:
+            raise ValueError(
+                "At most {} qubits are supported, got {}".format(
+                    maxSparseQubits, numQubits
+                )
+            )
+
+        self.numQubits = numQubits
+        self.indices = np.zeros(1, dtype=np.int64)
+        self.amplitudes = np.ones(1, dtype=complex)
+
+    @property
+    def supportSize(self) -> int:
+        """
+        Number of basis states with a non-zero amplitude
+        """
+
+        return int(self.indices.size)
+
+    def localIndices(self, qubits: tuple[int, ...]) -> np.ndarray:
+        """
+        Local index of every basis state in the support with respect to some qubits
+
+        Args:
+            qubits (tuple[int, ...]): Gate qubits, qubits[0] is the most significant bit
+
+        Returns:
+            np.ndarray: Local index for every entry of the support
+        """
+
+        local = np.zeros(self.indices.shape, dtype=np.int64)
+        for qubit in qubits:
+            local = (local << 1) | ((self.indices >> qubit) & 1)
+        return local
+
+    def applyPermutationTable(self, gate: Gate) -> None:
+        """
+        Apply a fused PERMUTATION gate by relabeling basis states
+
+        Args:
+            gate (Gate): PERMUTATION gate
+        """
+
+        qubits = gate[1]
+        table = np.array(gate[2], dtype=np.int64)
+        offsets, mask = spreadOffsets(qubits)
+
+        self.indices = (self.indices & ~mask) | offsets[
+            table[self.localIndices(qubits)]
+        ]
+
+    def applyPermutation(self, name: str, qubits: tuple[int, ...]) -> None:
+        """
+        Apply an X-type gate by relabeling basis states, amplitudes are untouched
+
+        Args:
+            name (str): One of permutationGates
+            qubits (tuple[int, ...]): Controls first, target last
+        """
+
+        if name == "SWAP":
+            first, second = qubits
+            differ = ((self.indices >> first) ^ (self.indices >> second)) & 1
+            self.indices = self.indices ^ (differ << first) ^ (differ << second)
+            return
+
+        *controls, target = qubits
+        flip = np.ones(self.indices.shape, dtype=np.int64)
+        for control in controls:
+            flip &= (self.indices >> control) & 1
+        self.indices = self.indices ^ (flip << target)
+
+    def applyDiagonal(self, gate: Gate) -> None:
+        """
+        Apply a phase gate by scaling amplitudes, the support is untouched
+
+        Args:
+            gate (Gate): One of diagonalGates
+        """
+
+        phases = np.diag(gateMatrix(gate))
+        self.amplitudes = self.amplitudes * phases[self.localIndices(gate[1])]
+
+    def applyMatrix(self, gate: Gate) -> None:
+        """
+        Apply an arbitrary gate, the support can grow by up to 2^k
+
+        Args:
+            gate (Gate): Any gate understood by gateMatrix
+        """
+
+        qubits = gate[1]
+        matrix = gateMatrix(gate)
+        offsets, mask = spreadOffsets(qubits)
+
+        # Every support entry feeds every output of its 2^k block
+        bases = self.indices & ~mask
+        contributions = (
+            matrix[:, self.localIndices(qubits)].T * self.amplitudes[:, None]
+        )
+        outputIndices = (bases[:, None] | offsets[None, :]).ravel()
+
+        # Entries of the same block land on the same outputs, add them up
+        self.indices, inverse = np.unique(outputIndices, return_inverse=True)
+        self.amplitudes = np.zeros(self.indices.size, dtype=complex)
+        np.add.at(self.amplitudes, inverse, contributions.ravel())
+
+        self.prune()
+
+    def prune(self) -> None:
+        """
+        Drop basis states whose amplitude has vanished
+        """
+
+        keep = np.abs(self.amplitudes) ** 2 > pruneTolerance
+        self.indices = self.indices[keep]
+        self.amplitudes = self.amplitudes[keep]
+
+    def apply(self, gate: Gate) -> None:
+        """
+        Apply a gate with the cheapest method available for it
+
+        Args:
+            gate (Gate): Gate to apply
+        """
+
+        name, qubits, _ = gate
+        if name in permutationGates:
+            self.applyPermutation(name, qubits)
+        elif name == "PERMUTATION":
+            self.applyPermutationTable(gate)
+        elif name in diagonalGates:
+            self.applyDiagonal(gate)
+        else:
+            self.applyMatrix(gate)
+
+    def run(self, gates: list[Gate]) -> None:
+        """
+        Apply gates in order
+
+        Args:
+            gates (list[Gate]): Gates without measurements
+        """
+
+        for gate in gates:
+            self.apply(gate)
+
+    def sampleCounts(
+        self,
+        measurements: list[tuple[int, int]],
+        numCbits: int,
+        shots: int,
+        seed: int | None = None,
+    ) -> dict[str, int]:
+        """
+        Sample measurement outcomes from the final state
+
+        Args:
+            measurements (list[tuple[int, int]]): (qubit, cbit) pairs
+            numCbits (int): Width of the outcome keys, cbits beyond it are dropped
+            shots (int): Number of samples
+            seed (int | None): Seed of the sampler
+
+        Returns:
+            dict[str, int]: Counts keyed like pyqpanda, cbit 0 is the rightmost character
+        """
+
+        return sampleOutcomes(
+            measurementOutcomes(self.indices, measurements, numCbits),
+            np.abs(self.amplitudes) ** 2,
+            numCbits,
+            shots,
+            seed,
+        )
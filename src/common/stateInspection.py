@@ -0,0 +1,295 @@
+"""
+Scalable inspection of statevectors
+
+Everything here works straight from the 2^n amplitudes, so memory and time stay
+O(2^n) instead of the O(4^n) needed by a density matrix (e.g. the "city" plot).
+Qubit ordering follows qiskit: qubit i is bit i of the basis index.
+"""
+
+from typing import Any
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from common.tracing import traced
+
+
+# Tolerance used to decide whether traced qubits factor out of the state
+separabilityTolerance: float = 1e-9
+
+
+def amplitudesOf(state: Any) -> np.ndarray:
+    """
+    Get the raw amplitudes of a statevector
+
+    Args:
+        state (Any): qiskit Statevector, pyqpanda qstate list or numpy array
+
+    Returns:
+        np.ndarray: Amplitudes as a flat complex array
+    """
+
+    amplitudes = np.asarray(getattr(state, "data", state), dtype=complex).ravel()
+    numQubits = int(amplitudes.size).bit_length() - 1
+    if amplitudes.size != 2**numQubits:
+        raise ValueError(
+            "Statevector length {} is not a power of 2".format(amplitudes.size)
+        )
+    return amplitudes
+
+
+def splitQubits(
+    amplitudes: np.ndarray, keepQubits: list[int]
+) -> tuple[np.ndarray, list[int]]:
+    """
+    Reshape the amplitudes into a (kept, traced) matrix without copying more than once
+
+    Args:
+        amplitudes (np.ndarray): Flat amplitudes of an n-qubit state
+        keepQubits (list[int]): Qubits to keep, keepQubits[j] becomes bit j of the row index
+
+    Returns:
+        tuple[np.ndarray, list[int]]: The 2^k x 2^(n-k) matrix and the traced qubits
+    """
+
+    numQubits = amplitudes.size.bit_length() - 1
+    if len(set(keepQubits)) != len(keepQubits) or any(
+        q < 0 or q >= numQubits for q in keepQubits
+    ):
+        raise ValueError("Invalid qubits to keep: {}".format(keepQubits))
+
+    tracedQubits = [q for q in range(numQubits) if q not in keepQubits]
+
+    # Axis 0 of the tensor is the most significant qubit (n - 1)
+    tensor = amplitudes.reshape([2] * numQubits)
+    axes = [numQubits - 1 - q for q in reversed(keepQubits)] + [
+        numQubits - 1 - q for q in reversed(tracedQubits)
+    ]
+    matrix = tensor.transpose(axes).reshape(
+        2 ** len(keepQubits), 2 ** len(tracedQubits)
+    )
+
+    return matrix, tracedQubits
+
+
+def marginalProbabilities(state: Any, keepQubits: list[int]) -> np.ndarray:
+    """
+    Probabilities of the kept qubits with every other qubit summed out
+
+    Args:
+        state (Any): Statevector to inspect
+        keepQubits (list[int]): Qubits to keep, keepQubits[j] becomes bit j of the index
+
+    Returns:
+        np.ndarray: 2^k marginal probabilities
+    """
+
+    matrix, _ = splitQubits(amplitudesOf(state), keepQubits)
+    return np.sum(np.abs(matrix) ** 2, axis=1)
+
+
+def traceOutQubits(state: Any, traceQubits: list[int]) -> tuple[np.ndarray, bool]:
+    """
+    Remove qubits (e.g. the oracle ancilla) from a statevector
+
+    If the traced qubits are in a product state with the rest, the result is the
+    exact reduced statevector, phases included. Otherwise the reduced state is
+    mixed, and the result carries the marginal probabilities only (as real
+    square-root amplitudes).
+
+    Args:
+        state (Any): Statevector to reduce
+        traceQubits (list[int]): Qubits to trace out
+
+    Returns:
+        tuple[np.ndarray, bool]: Reduced amplitudes and whether they are a pure state
+    """
+
+    amplitudes = amplitudesOf(state)
+    numQubits = amplitudes.size.bit_length() - 1
+    keepQubits = [q for q in range(numQubits) if q not in traceQubits]
+    matrix, _ = splitQubits(amplitudes, keepQubits)
+
+    # A rank-1 matrix means the traced qubits factor out;
+    # its dominant column is then the reduced state up to normalization
+    columnNorms = np.sum(np.abs(matrix) ** 2, axis=0)
+    dominant = matrix[:, int(np.argmax(columnNorms))]
+    dominant = dominant / np.linalg.norm(dominant)
+    projection = dominant.conj() @ matrix
+    residual = float(np.sum(columnNorms) - np.sum(np.abs(projection) ** 2))
+
+    if residual < separabilityTolerance:
+        return dominant, True
+
+    return np.sqrt(np.sum(np.abs(matrix) ** 2, axis=1)).astype(complex), False
+
+
+def topAmplitudes(state: Any, k: int) -> list[tuple[int, complex]]:
+    """
+    The k most probable basis states, found in O(2^n) with a partial sort
+
+    Args:
+        state (Any): Statevector to inspect
+        k (int): Number of basis states to return
+
+    Returns:
+        list[tuple[int, complex]]: (basis index, amplitude), most probable first
+    """
+
+    amplitudes = amplitudesOf(state)
+    k = min(k, amplitudes.size)
+    probabilities = np.abs(amplitudes) ** 2
+    candidates = np.argpartition(probabilities, -k)[-k:]
+    ordered = candidates[np.argsort(probabilities[candidates])[::-1]]
+
+    return [(int(index), complex(amplitudes[index])) for index in ordered]
+
+
+def phaseHistogram(
+    state: Any, bins: int = 32, threshold: float = 1e-12
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Histogram of amplitude phases, weighted by probability
+
+    Args:
+        state (Any): Statevector to inspect
+        bins (int): Number of bins over [-pi, pi]
+        threshold (float): Probabilities below this are ignored, their phase is noise
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Weights per bin and the bin edges
+    """
+
+    amplitudes = amplitudesOf(state)
+    probabilities = np.abs(amplitudes) ** 2
+    mask = probabilities > threshold
+
+    return np.histogram(
+        np.angle(amplitudes[mask]),
+        bins=bins,
+        range=(-np.pi, np.pi),
+        weights=probabilities[mask],
+    )
+
+
+def plotTopAmplitudes(state: Any, k: int, filename: str, title: str = "") -> None:
+    """
+    Bar plot of the k most probable basis states, colored by phase
+
+    Args:
+        state (Any): Statevector to plot
+        k (int): Number of basis states to show
+        filename (str): Output png file
+        title (str): Plot title
+    """
+
+    amplitudes = amplitudesOf(state)
+    numQubits = amplitudes.size.bit_length() - 1
+    top = topAmplitudes(amplitudes, k)
+
+    labels = [format(index, "0{}b".format(numQubits)) for index, _ in top]
+    probabilities = [abs(amplitude) ** 2 for _, amplitude in top]
+    phases = np.array([np.angle(amplitude) for _, amplitude in top])
+    colors = plt.get_cmap("hsv")((phases + np.pi) / (2 * np.pi))
+
+    fig, ax = plt.subplots(figsize=(max(6, len(top) * 0.5), 4))
+    ax.bar(labels, probabilities, color=colors)
+    ax.set_ylabel("Probability")
+    ax.set_title(title or "Top {} amplitudes (color = phase)".format(len(top)))
+    ax.tick_params(axis="x", labelrotation=90)
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def plotMarginals(
+    state: Any, keepQubits: list[int], filename: str, title: str = ""
+) -> None:
+    """
+    Bar plot of the marginal distribution over selected qubits
+
+    Args:
+        state (Any): Statevector to plot
+        keepQubits (list[int]): Qubits to keep, keepQubits[0] is the rightmost label bit
+        filename (str): Output png file
+        title (str): Plot title
+    """
+
+    probabilities = marginalProbabilities(state, keepQubits)
+    labels = [
+        format(index, "0{}b".format(len(keepQubits)))
+        for index in range(probabilities.size)
+    ]
+
+    fig, ax = plt.subplots(figsize=(max(6, len(labels) * 0.4), 4))
+    ax.bar(labels, probabilities)
+    ax.set_ylabel("Probability")
+    ax.set_title(title or "Marginal over qubits {}".format(keepQubits))
+    ax.tick_params(axis="x", labelrotation=90)
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def plotPhaseHistogram(state: Any, filename: str, title: str = "") -> None:
+    """
+    Polar histogram of amplitude phases, weighted by probability
+
+    Args:
+        state (Any): Statevector to plot
+        filename (str): Output png file
+        title (str): Plot title
+    """
+
+    weights, edges = phaseHistogram(state)
+
+    fig = plt.figure(figsize=(5, 5))
+    ax = fig.add_subplot(projection="polar")
+    ax.bar(edges[:-1], weights, width=np.diff(edges), align="edge")
+    ax.set_title(title or "Phase histogram")
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+@traced()
+def drawStateSummary(
+    state: Any,
+    traceQubits: list[int],
+    filenamePrefix: str,
+    topK: int = 16,
+    marginalQubits: list[int] | None = None,
+) -> None:
+    """
+    Trace out workspace qubits, then plot top amplitudes, marginals and phases
+
+    Args:
+        state (Any): Statevector to summarize
+        traceQubits (list[int]): Workspace qubits (e.g. the oracle ancilla) to remove first
+        filenamePrefix (str): Prefix of the three output png files
+        topK (int): Number of basis states in the top amplitudes plot
+        marginalQubits (list[int] | None): Qubits of the marginal plot,
+            defaults to the first (at most 6) qubits that are not traced out
+    """
+
+    amplitudes = amplitudesOf(state)
+    reduced, isPure = traceOutQubits(amplitudes, traceQubits)
+
+    if marginalQubits is None:
+        numQubits = amplitudes.size.bit_length() - 1
+        marginalQubits = [q for q in range(numQubits) if q not in traceQubits][:6]
+
+    plotTopAmplitudes(
+        reduced,
+        topK,
+        filenamePrefix + "-top-amplitudes.png",
+        title=(
+            "Top {} amplitudes (color = phase)".format(topK)
+            if isPure
+            else "Top {} probabilities (mixed state, no phase)".format(topK)
+        ),
+    )
+    plotMarginals(amplitudes, marginalQubits, filenamePrefix + "-marginals.png")
+    # Phases of a mixed reduced state are meaningless, use the full state instead
+    plotPhaseHistogram(
+        reduced if isPure else amplitudes, filenamePrefix + "-phases.png"
+    )
@@ -0,0 +1,329 @@
+"""
+Templated form of a circuit that stores each repeated block once, for reports
+
+Circuits here are built from blocks that repeat on relabeled qubits: the
+adder applies the same singleAdderCircuit to every bit, and the Grover oracle
+uncomputes each sub-expression with the mirror image of the block that
+computed it. A TemplateCircuit keeps one BlockTemplate per distinct block,
+in flat numpy arrays and local qubit numbers, and every block of the circuit is
+a BlockInstance: the template, the qubits it maps onto, and whether it is
+applied inverted.
+
+Templates are deduplicated by a structural key, a digest of the gates in a
+canonical order on qubits numbered by first use (see relabel()).
+
+This is a reporting tool: stats() tells how much of a circuit repeats and how
+small its templated form would be. The executors and the result cache still
+take the flat gates of a CircuitSpec.
+"""
+
+from hashlib import blake2b
+from typing import Final
+
+import numpy as np
+import qiskit as qk
+
+from common.circuitSpec import CircuitSpec
+from common.gates import Gate, gatesFromQiskit, inverseGate
+from common.tracing import traced
+
+# Bytes of the structural key
+templateKeyBytes: Final[int] = 16
+
+
+class BlockTemplate:
+    __slots__ = (
+        "names",
+        "arities",
+        "operands",
+        "paramCounts",
+        "params",
+        "numQubits",
+        "key",
+    )
+
+    def __init__(self, gates: list[Gate]):
+        """
+        Store a block in canonical order on local qubits 0, 1, ...
+
+        Args:
+            gates (list[Gate]): Gates of the block on local qubits, already canonical
+        """
+
+        self.names: tuple[str, ...] = tuple(name for name, _, _ in gates)
+        self.arities = np.array([len(qubits) for _, qubits, _ in gates], np.uint8)
+        self.operands = np.array(
+            [qubit for _, qubits, _ in gates for qubit in qubits], np.int32
+        )
+        self.paramCounts = np.array([len(params) for _, _, params in gates], np.uint32)
+        self.params = np.array(
+            [param for _, _, params in gates for param in params], np.float64
+        )
+        self.numQubits = int(self.operands.max()) + 1 if len(self.operands) else 0
+
+        digest = blake2b(digest_size=templateKeyBytes)
+        digest.update(" ".join(self.names).encode())
+        for array in (self.arities, self.operands, self.paramCounts, self.params):
+            digest.update(array.tobytes())
+        self.key: str = digest.hexdigest()
+
+    def gates(self, qubits: np.ndarray, inverse: bool = False) -> list[Gate]:
+        """
+        Expand the template onto global qubits
+
+        Args:
+            qubits (np.ndarray): Global qubit of each local qubit
+            inverse (bool): Expand the inverse of the block
+
+        Returns:
+            list[Gate]: Gates on the global qubits
+        """
+
+        globalOperands = qubits[self.operands].tolist()
+        params = self.params.tolist()
+
+        gates: list[Gate] = []
+        operandIndex = paramIndex = 0
+        for name, arity, paramCount in zip(
+            self.names, self.arities.tolist(), self.paramCounts.tolist()
+        ):
+            gates.append(
+                (
+                    name,
+                    tuple(globalOperands[operandIndex : operandIndex + arity]),
+                    tuple(params[paramIndex : paramIndex + paramCount]),
+                )
+            )
+            operandIndex += arity
+            paramIndex += paramCount
+
+        if inverse:
+            return [inverseGate(gate) for gate in reversed(gates)]
+        return gates
+
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (self.arities, self.operands, self.paramCounts, self.params)
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class BlockInstance:
+    __slots__ = ("template", "qubits", "inverse")
+
+    def __init__(self, template: BlockTemplate, qubits: np.ndarray, inverse: bool):
+        """
+        One block of a circuit
+
+        Args:
+            template (BlockTemplate): Shared template of the block
+            qubits (np.ndarray): Global qubit of each local qubit of the template
+            inverse (bool): The block is the inverse of the template
+        """
+
+        self.template = template
+        self.qubits = qubits
+        self.inverse = inverse
+
+    def gates(self) -> list[Gate]:
+        return self.template.gates(self.qubits, self.inverse)
+
+
+def relabel(gates: list[Gate]) -> tuple[list[Gate], np.ndarray]:
+    """
+    Canonicalize a block and renumber its qubits by first use
+
+    Gates are sorted by layer, and within a layer (where they act on disjoint
+    qubits) by name, params and the local numbers of the qubits earlier layers
+    already numbered; gates on qubits not seen yet keep their program order.
+    Nothing in that order depends on the global qubit numbers, so copies of a
+    block on relabeled qubits give the same local gates, and x(1); x(2) and
+    x(2); x(1) are equal.
+
+    Args:
+        gates (list[Gate]): Gates of a block on global qubits
+
+    Returns:
+        tuple[list[Gate], np.ndarray]: Local gates, and the global qubit of each local qubit
+    """
+
+    lastLayer: dict[int, int] = {}
+    layers: list[list[Gate]] = []
+    for gate in gates:
+        layer = 1 + max((lastLayer.get(qubit, -1) for qubit in gate[1]), default=-1)
+        for qubit in gate[1]:
+            lastLayer[qubit] = layer
+        if layer == len(layers):
+            layers.append([])
+        layers[layer].append(gate)
+
+    localOf: dict[int, int] = {}
+    local: list[Gate] = []
+    for layerGates in layers:
+        # Stable, so ties keep program order; -1 stands for a new qubit
+        layerGates.sort(
+            key=lambda gate: (
+                gate[0],
+                gate[2],
+                tuple(localOf.get(qubit, -1) for qubit in gate[1]),
+            )
+        )
+        for name, qubits, params in layerGates:
+            local.append(
+                (
+                    name,
+                    tuple(localOf.setdefault(qubit, len(localOf)) for qubit in qubits),
+                    params,
+                )
+            )
+
+    return local, np.array(list(localOf), np.int32)
+
+
+class TemplateCircuit:
+    __slots__ = ("numQubits", "numCbits", "name", "templates", "blocks")
+
+    def __init__(self, numQubits: int, numCbits: int = 0, name: str = ""):
+        """
+        Create an empty circuit
+
+        Args:
+            numQubits (int): Number of qubits
+            numCbits (int): Number of classical bits
+            name (str): Name used in reports
+        """
+
+        self.numQubits = numQubits
+        self.numCbits = numCbits
+        self.name = name
+        self.templates: dict[str, BlockTemplate] = {}
+        self.blocks: list[BlockInstance] = []
+
+    def addBlock(self, gates: list[Gate]) -> BlockInstance:
+        """
+        Append a block, reusing a template that matches it or its inverse
+
+        Args:
+            gates (list[Gate]): Gates of the block on global qubits
+
+        Returns:
+            BlockInstance: The appended block
+        """
+
+        local, qubits = relabel(gates)
+        template = BlockTemplate(local)
+        inverse = False
+
+        if template.key not in self.templates:
+            try:
+                mirrored, mirroredQubits = relabel(
+                    [inverseGate(gate) for gate in reversed(gates)]
+                )
+            except ValueError:
+                # Measurements have no inverse
+                mirrored = []
+
+            if mirrored:
+                mirror = BlockTemplate(mirrored)
+                if mirror.key in self.templates:
+                    template, qubits, inverse = mirror, mirroredQubits, True
+
+        template = self.templates.setdefault(template.key, template)
+        block = BlockInstance(template, qubits, inverse)
+        self.blocks.append(block)
+
+        return block
+
+    def gates(self) -> list[Gate]:
+        """
+        Expand every block
+
+        Returns:
+            list[Gate]: Gates and measurements in program order
+        """
+
+        return [gate for block in self.blocks for gate in block.gates()]
+
+    def toCircuitSpec(self) -> CircuitSpec:
+        spec = CircuitSpec(self.numQubits, self.numCbits, self.name)
+        spec.ops = self.gates()
+        return spec
+
+    def stats(self) -> dict[str, int]:
+        """
+        How much the templates save
+
+        Returns:
+            dict[str, int]: Block, template and gate counts, and bytes of the gate arrays
+        """
+
+        return {
+            "blocks": len(self.blocks),
+            "templates": len(self.templates),
+            "invertedBlocks": sum(block.inverse for block in self.blocks),
+            "storedGates": sum(len(template) for template in self.templates.values()),
+            "gates": sum(len(block.template) for block in self.blocks),
+            "storedBytes": sum(
+                template.nbytes() for template in self.templates.values()
+            )
+            + sum(block.qubits.nbytes for block in self.blocks),
+        }
+
+    @classmethod
+    def fromBlocks(
+        cls, numQubits: int, numCbits: int, blocks: list[list[Gate]], name: str = ""
+    ) -> "TemplateCircuit":
+        """
+        Build a circuit from a list of blocks
+
+        Args:
+            numQubits (int): Number of qubits
+            numCbits (int): Number of classical bits
+            blocks (list[list[Gate]]): Gates of each block on global qubits
+            name (str): Name used in reports
+
+        Returns:
+            TemplateCircuit: The circuit
+        """
+
+        circuit = cls(numQubits, numCbits, name)
+        for gates in blocks:
+            if gates:
+                circuit.addBlock(gates)
+
+        return circuit
+
+    @classmethod
+    @traced()
+    def fromQiskit(cls, circuit: qk.QuantumCircuit) -> "TemplateCircuit":
+        """
+        Import a qiskit circuit, one block between each pair of barriers
+
+        Args:
+            circuit (qk.QuantumCircuit): Circuit to import
+
+        Returns:
+            TemplateCircuit: The circuit
+        """
+
+        sections: list[qk.QuantumCircuit] = [circuit.copy_empty_like()]
+        for instruction in circuit.data:
+            if instruction.operation.name == "barrier":
+                sections.append(circuit.copy_empty_like())
+            else:
+                sections[-1].append(instruction)
+
+        return cls.fromBlocks(
+            circuit.num_qubits,
+            circuit.num_clbits,
+            [gatesFromQiskit(section) for section in sections],
+            circuit.name,
+        )
+
+    def __repr__(self) -> str:
+        return "TemplateCircuit(name={!r}, qubits={}, {})".format(
+            self.name, self.numQubits, self.stats()
+        )
@@ -0,0 +1,286 @@
+"""
+Nested timing spans around the hot spots of the experiments
+
+Tracing is off unless the QIE_TRACE environment variable names an output file,
+or [tracing] enabled = true in config.toml. When it is off, span() hands back
+one shared no-op context manager and traced functions cost a flag check, so the
+instrumentation can stay in place.
+
+Spans nest per thread. They are buffered in memory and written when the
+process exits, either as JSON lines (one span per line, for scripts) or in the
+Chrome trace event format (open it in chrome://tracing or ui.perfetto.dev). A
+path ending in .jsonl selects JSON lines.
+
+Memory profiling (common/memoryProfiling.py) adds memory figures to every span
+when [profiling] memory = true or QIE_MEMORY_PROFILE is set, and enables
+tracing if needed.
+"""
+
+from contextlib import nullcontext
+from functools import wraps
+from time import perf_counter_ns, time_ns
+from typing import Any, Callable, Final
+import atexit
+import itertools
+import json
+import os
+import threading
+
+from common.memoryProfiling import MemoryProfiler, memoryProfileEnvironmentVariable
+
+# Environment variable holding the trace file, enables tracing when set
+traceEnvironmentVariable: Final[str] = "QIE_TRACE"
+traceFormats: Final[list[str]] = ["chrome", "jsonl"]
+
+
+class Tracer:
+    def __init__(self):
+        """
+        Disabled tracer, see enable()
+        """
+
+        self.enabled = False
+        self.path: str | None = None
+        self.format = "chrome"
+        self.events: list[dict[str, Any]] = []
+        # Functions called with every span entered, and every span finished
+        self.enterHooks: list[Callable[["Span"], None]] = []
+        self.spanHooks: list[Callable[["Span"], None]] = []
+        self.memoryProfiler: MemoryProfiler | None = None
+        self.local = threading.local()
+        self.ids = itertools.count()
+        # perf_counter_ns of the wall clock time_ns origin, for absolute timestamps
+        self.originCounter = perf_counter_ns()
+        self.originWall = time_ns()
+        self.registered = False
+
+    def enable(self, path: str, format: str | None = None) -> None:
+        """
+        Start recording spans
+
+        Args:
+            path (str): Trace file written at exit
+            format (str | None): One of traceFormats, defaults to the file extension
+        """
+
+        if format is None:
+            format = "jsonl" if path.endswith(".jsonl") else "chrome"
+        if format not in traceFormats:
+            raise ValueError(
+                "Unknown trace format '{}', choose one of {}".format(
+                    format, traceFormats
+                )
+            )
+
+        self.enabled = True
+        self.path = path
+        self.format = format
+        if not self.registered:
+            atexit.register(self.write)
+            self.registered = True
+
+    def enableMemoryProfiling(
+        self, sampleInterval: float = 0.01, topAllocations: int = 10
+    ) -> None:
+        """
+        Add memory figures to every span, see common/memoryProfiling.py
+
+        Args:
+            sampleInterval (float): Seconds between RSS samples
+            topAllocations (int): Allocation sites listed in the summary
+        """
+
+        if self.memoryProfiler is not None:
+            return
+
+        self.memoryProfiler = MemoryProfiler(sampleInterval, topAllocations)
+        self.enterHooks.append(self.memoryProfiler.enter)
+        self.spanHooks.append(self.memoryProfiler.exit)
+        self.memoryProfiler.start()
+
+    def stack(self) -> list["Span"]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def write(self) -> None:
+        """
+        Write the recorded spans to the trace file
+        """
+
+        if not self.enabled or self.path is None:
+            return
+
+        if self.memoryProfiler is not None:
+            with Span("memory summary", {}) as summary:
+                summary.attributes.update(self.memoryProfiler.summary())
+
+        with open(self.path, "w") as file:
+            if self.format == "jsonl":
+                for event in self.events:
+                    file.write(json.dumps(event, default=str) + "\n")
+                return
+
+            json.dump(
+                {
+                    "traceEvents": [
+                        {
+                            "name": event["name"],
+                            "ph": "X",
+                            "ts": event["start"] * 1e6,
+                            "dur": event["duration"] * 1e6,
+                            "pid": event["pid"],
+                            "tid": event["tid"],
+                            "args": event["attributes"],
+                        }
+                        for event in self.events
+                    ],
+                    "displayTimeUnit": "ms",
+                },
+                file,
+                default=str,
+            )
+
+
+tracer: Final[Tracer] = Tracer()
+
+
+class Span:
+    __slots__ = ("name", "attributes", "id", "parent", "depth", "start", "duration")
+
+    def __init__(self, name: str, attributes: dict[str, Any]):
+        """
+        One timed region, use span() rather than this directly
+
+        Args:
+            name (str): Span name
+            attributes (dict[str, Any]): Extra fields recorded with the span
+        """
+
+        self.name = name
+        self.attributes = attributes
+        self.id = 0
+        self.parent: int | None = None
+        self.depth = 0
+        self.start = 0
+        self.duration = 0
+
+    def __enter__(self) -> "Span":
+        stack = tracer.stack()
+        self.parent = stack[-1].id if stack else None
+        self.depth = len(stack)
+        self.id = next(tracer.ids)
+        stack.append(self)
+        for hook in tracer.enterHooks:
+            hook(self)
+
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = perf_counter_ns() - self.start
+        tracer.stack().pop()
+
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        for hook in tracer.spanHooks:
+            hook(self)
+
+        tracer.events.append(
+            {
+                "name": self.name,
+                "id": self.id,
+                "parent": self.parent,
+                "depth": self.depth,
+                # Seconds since the epoch, and seconds
+                "start": (tracer.originWall + self.start - tracer.originCounter) / 1e9,
+                "duration": self.duration / 1e9,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "attributes": self.attributes,
+            }
+        )
+
+
+# Returned by span() while tracing is off
+noSpan: Final[nullcontext] = nullcontext()
+
+
+def span(name: str, **attributes: Any) -> Span | nullcontext:
+    """
+    Time a block as a span, e.g. with span("simulate", backend="sparse"):
+
+    Args:
+        name (str): Span name
+        **attributes (Any): Extra fields recorded with the span
+
+    Returns:
+        Span | nullcontext: Context manager, a no-op while tracing is off
+    """
+
+    if not tracer.enabled:
+        return noSpan
+    return Span(name, attributes)
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """
+    Decorator that records every call of a function as a span
+
+    Args:
+        name (str | None): Span name, defaults to the qualified function name
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator
+    """
+
+    def decorator(function: Callable) -> Callable:
+        spanName = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with Span(spanName, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def configureTracing(config: dict[str, Any]) -> None:
+    """
+    Enable tracing from the environment or the [tracing] config section
+
+    QIE_TRACE takes precedence. Tracing enabled by the environment also covers
+    the config load, which happens before this can read the config. Memory
+    profiling turns tracing on, as it reports through the spans.
+
+    Args:
+        config (dict[str, Any]): The whole configuration
+    """
+
+    section = config.get("tracing", {})
+    profiling = config.get("profiling", {})
+    memory = profiling.get("memory", False) or bool(
+        os.environ.get(memoryProfileEnvironmentVariable)
+    )
+
+    if not tracer.enabled and (section.get("enabled", False) or memory):
+        tracer.enable(
+            section.get("output", config["exportFiles"]["destination"] + "trace.json"),
+            section.get("format"),
+        )
+
+    if memory:
+        tracer.enableMemoryProfiling(
+            profiling.get("sampleInterval", 0.01),
+            profiling.get("topAllocations", 10),
+        )
+
+
+if os.environ.get(traceEnvironmentVariable):
+    tracer.enable(os.environ[traceEnvironmentVariable])
+    if os.environ.get(memoryProfileEnvironmentVariable):
+        tracer.enableMemoryProfiling()
@@ -0,0 +1,95 @@
+"""
+Read a whole truth table out of one statevector
+
+For a classical reversible circuit with its inputs in uniform superposition,
+every basis state in the support of the final statevector is one row of the
+truth table: the input registers still hold the inputs, and the output
+registers hold the matching outputs.
+"""
+
+from typing import Any
+
+import numpy as np
+
+from common.tracing import traced
+
+
+# Amplitudes with a probability below this are treated as zero
+supportTolerance: float = 1e-12
+
+
+def statevectorBytes(numQubits: int) -> int:
+    """
+    Memory taken by a dense complex128 statevector
+
+    Args:
+        numQubits (int): Number of qubits
+
+    Returns:
+        int: Size in bytes
+    """
+
+    return 16 * 2**numQubits
+
+
+def registerValues(indices: np.ndarray, qubits: list[int]) -> np.ndarray:
+    """
+    Decode a register out of basis state indices
+
+    Args:
+        indices (np.ndarray): Basis state indices, qubit q is bit q of the index
+        qubits (list[int]): Qubits of the register, most significant bit first
+
+    Returns:
+        np.ndarray: Value of the register for every index
+    """
+
+    values = np.zeros(indices.shape, dtype=np.int64)
+    for qubit in qubits:
+        values = (values << 1) | ((indices >> qubit) & 1)
+    return values
+
+
+def registerIndices(values: np.ndarray, qubits: list[int]) -> np.ndarray:
+    """
+    Encode register values as basis state indices, the inverse of registerValues
+
+    Args:
+        values (np.ndarray): Value of the register
+        qubits (list[int]): Qubits of the register, most significant bit first
+
+    Returns:
+        np.ndarray: Index with only the register set, qubit q is bit q
+    """
+
+    indices = np.zeros(np.shape(values), dtype=np.int64)
+    for position, qubit in enumerate(reversed(qubits)):
+        indices |= ((np.asarray(values, dtype=np.int64) >> position) & 1) << qubit
+    return indices
+
+
+@traced()
+def truthTableFromState(
+    state: Any, registers: dict[str, list[int]]
+) -> list[dict[str, int]]:
+    """
+    Every row of the truth table held by a statevector
+
+    Args:
+        state (Any): Final statevector (list, numpy array or qiskit Statevector)
+        registers (dict[str, list[int]]): Register name -> qubits, most significant bit first
+
+    Returns:
+        list[dict[str, int]]: One {register name: value} row per basis state in the support
+    """
+
+    amplitudes = np.asarray(getattr(state, "data", state), dtype=complex)
+    support = np.flatnonzero(np.abs(amplitudes) ** 2 > supportTolerance)
+
+    columns = {
+        name: registerValues(support, qubits) for name, qubits in registers.items()
+    }
+    return [
+        {name: int(column[row]) for name, column in columns.items()}
+        for row in range(support.size)
+    ]
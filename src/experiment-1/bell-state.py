@@ -1,8 +1,25 @@
+from pathlib import Path
+from time import perf_counter
 from typing import Any, Final
+import asyncio
+import sys
 import tomllib
 import pyqpanda as pq
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.characterization import characterizedCounts
+from common.circuitSpec import CircuitSpec
+from common.executors import createExecutor
+from common.jobs import JobRunner
+from common.parallelism import configureParallelism, parallelism
+from common.resources import checkResources, estimateResources
+from common.resultStore import configureResultStore, resultStore
+from common.tracing import configureTracing, span, traced
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     with open("config/config.toml", "rb") as file:
         return tomllib.load(file)
@@ -29,20 +46,72 @@ def setAppropriateInput(quBits: list[pq.Qubit], round: int) -> pq.QCircuit:
     return initCircuit
 
 
-def main():
+def drawProgram(prog: pq.QProg, filename: str):
+    with span("draw"):
+        pq.draw_qprog(prog, "pic", filename=filename)
+
+
+# Simulate the core circuit once for all four inputs,
+# see common/characterization.py
+def characterizedRun(
+    qvm: pq.CPUQVM,
+    quBits: list[pq.Qubit],
+    cBits: list[pq.ClassicalCondition],
+    shots: int,
+    seed: int | None,
+):
+    prog = pq.QProg()
+    (
+        prog
+        << pq.H(quBits[0])
+        << pq.CNOT(quBits[0], quBits[1])
+        << pq.Measure(quBits[0], cBits[0])
+        << pq.Measure(quBits[1], cBits[1])
+    )
+
+    # Input |xy> of a round sets qubit 0 to x and qubit 1 to y,
+    # and qubit q is bit q of the basis index
+    inputs = {round: (round >> 1) | ((round & 1) << 1) for round in range(4)}
+    counts = characterizedCounts(
+        CircuitSpec.fromPyQPanda(prog, qvm, len(cBits)),
+        list(inputs.values()),
+        shots,
+        seed,
+    )
+
+    for round, index in inputs.items():
+        print("\nSet input as |{:02b}>".format(round))
+        print("Output: {}".format(counts[index]))
+
+
+async def main():
     # Load configuration
     config: Final[dict[str, Any]] = configInformation()
-
-    # Initialize QVM
+    configureTracing(config)
+    configureParallelism(config)
+    configureResultStore(config)
+    shots: int = config["simulation"]["shots"]
+    # The four rounds run as one batch, a single job on Aer
+    batchBackend: str = config["simulation"].get("batchBackend", "aer")
+
+    # Initialize QVM, which only builds the programs
     qvm = pq.CPUQVM()
     qvm.init_qvm()
+    parallelism.limitQVM(qvm)
 
     quBits = qvm.qAlloc_many(2)
     cBits = qvm.cAlloc_many(2)
 
-    for round in range(4):
-        print("\nSet input as |{:02b}>".format(round))
+    # One simulation for every input instead of one run per round
+    if config["simulation"].get("characterize", False):
+        characterizedRun(qvm, quBits, cBits, shots, config["simulation"].get("seed"))
+        qvm.finalize()
+        return
 
+    specs: dict[int, CircuitSpec] = {}
+    # Drawings are written on the I/O pool of the jobs, see common/jobs.py
+    jobs = JobRunner(config)
+    for round in range(4):
         initCircuit = setAppropriateInput(quBits, round)
 
         # Core circuit
@@ -60,20 +129,49 @@ def main():
             << pq.Measure(quBits[1], cBits[1])
         )
 
-        print("Program be like: {}".format(prog))
-        pq.draw_qprog(
+        print("Program for input |{:02b}> be like: {}".format(round, prog))
+        jobs.offload(
+            drawProgram,
             prog,
-            "pic",
-            filename=config["exportFiles"]["destination"]
+            config["exportFiles"]["destination"]
             + "program-bell-state-input-"
             + str(round),
         )
 
-        result = qvm.run_with_configuration(prog, cBits, config["simulation"]["shots"])
-        print("Output: {}".format(result))
+        specs[round] = CircuitSpec.fromPyQPanda(prog, qvm, len(cBits))
+        checkResources(
+            estimateResources(specs[round], shots),
+            batchBackend,
+            budget=config.get("resources", {}),
+            reroute=False,
+        )
 
+    # The batch simulates while the drawings are written
+    async with jobs:
+        start = perf_counter()
+        results = await jobs.submit(
+            createExecutor(batchBackend, config.get(batchBackend, {})).runBatch,
+            specs,
+            shots,
+            config["simulation"].get("seed"),
+        )
+        seconds = perf_counter() - start
     qvm.finalize()
 
+    for round, result in results.items():
+        # The rounds share the time of their batch
+        resultStore.record(
+            "bell-state",
+            {"input": round},
+            batchBackend,
+            shots,
+            config["simulation"].get("seed"),
+            seconds / len(results),
+            result,
+        )
+        print("\nSet input as |{:02b}>".format(round))
+        print("Output: {}".format(result))
+
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,10 +1,22 @@
 from math import acos, sqrt
+from pathlib import Path
+from time import perf_counter
 from typing import Any, Final
+import sys
 
 import tomllib
 import pyqpanda as pq
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.backends import runProgram
+from common.parallelism import configureParallelism, parallelism
+from common.resultStore import configureResultStore, resultStore
+from common.tracing import configureTracing, span, traced
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     with open("config/config.toml", "rb") as file:
         return tomllib.load(file)
@@ -32,10 +44,14 @@ def prepareStateGate(qubit: pq.Qubit, alpha: float, beta: float) -> pq.QGate | N
 def main():
     # Load configuration
     config: Final[dict[str, Any]] = configInformation()
+    configureTracing(config)
+    configureParallelism(config)
+    configureResultStore(config)
 
     # Initialize QVM
     qvm = pq.CPUQVM()
     qvm.init_qvm()
+    parallelism.limitQVM(qvm)
 
     # quBits[0] : \phi
     # quBits[1 and 2] : EPR Pair
@@ -67,13 +83,38 @@ def main():
     prog << pq.Measure(quBits[2], cBits[2])
 
     print("Program be like: {}".format(prog))
-    pq.draw_qprog(
+    with span("draw"):
+        pq.draw_qprog(
+            prog,
+            "pic",
+            filename=config["exportFiles"]["destination"]
+            + "quantum-teleportation-prog",
+        )
+
+    # Gates follow the measurements, so CPUQVM re-simulates every shot;
+    # backend = "noise" runs it under the [noise] model, see common/noise.py
+    backend = config["simulation"].get("backend", "cpuqvm")
+    start = perf_counter()
+    result = runProgram(
+        backend,
+        qvm,
         prog,
-        "pic",
-        filename=config["exportFiles"]["destination"] + "quantum-teleportation-prog",
+        cBits,
+        config["simulation"]["shots"],
+        config["simulation"].get("seed"),
+        config.get(backend, {}),
+        config.get("resources", {}),
+        config["simulation"],
+    )
+    resultStore.record(
+        "quantum-teleportation",
+        {"alpha": sqrt(2) / 2, "beta": sqrt(2) / 2},
+        backend,
+        config["simulation"]["shots"],
+        config["simulation"].get("seed"),
+        perf_counter() - start,
+        result,
     )
-
-    result = qvm.run_with_configuration(prog, cBits, config["simulation"]["shots"])
     print("Result for all qubits: {}".format(result))
 
     # get all result with key ended with '0' or '1'
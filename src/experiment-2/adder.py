@@ -1,8 +1,27 @@
+from pathlib import Path
+from time import perf_counter
 from typing import Any, Final
+import sys
 import tomllib
+import numpy as np
 import pyqpanda as pq
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.backends import createQVM, runProgram
+from common.characterization import permutationTable
+from common.circuitSpec import CircuitSpec
+from common.parallelism import configureParallelism
+from common.resources import checkResources, estimateResources
+from common.resultCache import configureCache, resultCache
+from common.resultStore import configureResultStore, resultStore
+from common.templateCircuit import TemplateCircuit
+from common.tracing import configureTracing, span, traced
+from common.truthTable import registerIndices, registerValues, truthTableFromState
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     with open("config/config.toml", "rb") as file:
         return tomllib.load(file)
@@ -10,13 +29,27 @@ def configInformation() -> dict[str, Any]:
 
 # Load configuration
 config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Reuse the counts of repeated seeded runs, see common/resultCache.py
+configureCache(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
+
+# Simulator that runs the programs, see common/backends.py
+backend: Final[str] = config["simulation"].get("backend", "cpuqvm")
+# Seed of the sampler, for the backends that take one
+simulationSeed: Final[int | None] = config["simulation"].get("seed")
+# Options of the backend, from the config section named after it (e.g. [memmap])
+backendOptions: Final[dict[str, Any]] = config.get(backend, {})
+# Memory budget checked before every run, see common/resources.py
+resourceBudget: Final[dict[str, Any]] = config.get("resources", {})
 
 
 class AdderProgram:
     def __init__(self, workingDigits: int):
-        self.qvm = pq.CPUQVM()  # Initialize QVM
-        self.qvm.init_qvm()
-
         self.workingDigits = workingDigits
         # 2 * nDigits : input for a and b
         numInputDigits = 2 * workingDigits
@@ -26,9 +59,9 @@ class AdderProgram:
         numSumDigits = workingDigits
 
         # Allocate qubits and cbits
-        self.qubits = self.qvm.qAlloc_many(
-            numInputDigits + numCinAndCOutDigit + numSumDigits
-        )
+        numQubits = numInputDigits + numCinAndCOutDigit + numSumDigits
+        self.qvm = createQVM(backend, numQubits, resourceBudget)  # Initialize QVM
+        self.qubits = self.qvm.qAlloc_many(numQubits)
         self.cBits = self.qvm.cAlloc_many(numSumDigits)
 
         # [0 to n - 1]: a_{n-1} to a_0
@@ -67,6 +100,18 @@ class AdderProgram:
 
         return circuit
 
+    # Put every bit of a and b in superposition, so all inputs are added at once
+    def superposedInputCircuit(self) -> pq.QCircuit:
+        circuit = pq.QCircuit()
+
+        for i in range(self.workingDigits):
+            circuit << pq.H(self.qubits[self.aBeginIndex + i])
+            circuit << pq.H(self.qubits[self.bBeginIndex + i])
+
+        circuit << pq.BARRIER(self.qubits)
+
+        return circuit
+
     # this is for each bit
     # bit index is invoked for the same digits qubits
     #   e.g. qubits[0]
@@ -107,7 +152,21 @@ class AdderProgram:
 
         return circuit
 
+    # Every singleAdderCircuit is the same block on other qubits,
+    # so the templated form stores it once plus a qubit mapping per bit
+    def templateCircuit(self) -> TemplateCircuit:
+        blocks = []
+        for i in range(self.workingDigits - 1, -1, -1):
+            prog = pq.QProg()
+            prog << self.singleAdderCircuit(i)
+            blocks.append(CircuitSpec.fromPyQPanda(prog, self.qvm).ops)
+
+        return TemplateCircuit.fromBlocks(
+            len(self.qubits), len(self.cBits), blocks, name="adder"
+        )
+
     # A and B are for digits binary number
+    @traced()
     def combinationCircuit(self, a: int, b: int) -> pq.QCircuit:
         circuit = pq.QCircuit()
 
@@ -131,13 +190,113 @@ class AdderProgram:
                 self.cBits[i],
             )
 
-        pq.draw_qprog(
-            prog, "pic", filename=config["exportFiles"]["destination"] + "adder"
-        )
+        with span("draw"):
+            pq.draw_qprog(
+                prog, "pic", filename=config["exportFiles"]["destination"] + "adder"
+            )
 
-        result = self.qvm.run_with_configuration(prog, self.cBits, iterations)
+        start = perf_counter()
+        result = runProgram(
+            backend,
+            self.qvm,
+            prog,
+            self.cBits,
+            iterations,
+            simulationSeed,
+            backendOptions,
+            resourceBudget,
+            config["simulation"],
+        )
+        resultStore.record(
+            "adder",
+            {"digits": self.workingDigits, "a": a, "b": b},
+            backend,
+            iterations,
+            simulationSeed,
+            perf_counter() - start,
+            result,
+            cached=resultCache.lastHit,
+        )
         print("Result: {}".format(result))
 
+    # Evaluate every (a, b) pair in one statevector run,
+    # instead of 2^(2n) separate runs with fixed inputs
+    def exhaustiveRun(self) -> list[dict[str, int]]:
+        prog = pq.QProg()
+        prog << self.superposedInputCircuit()
+        for i in range(self.workingDigits - 1, -1, -1):
+            prog << self.singleAdderCircuit(i)
+
+        # The truth table needs the whole statevector, so there is no rerouting
+        checkResources(
+            estimateResources(CircuitSpec.fromPyQPanda(prog, self.qvm)),
+            "cpuqvm",
+            budget=resourceBudget,
+            reroute=False,
+        )
+        self.qvm.directly_run(prog)
+
+        # Each basis state in the support is one row: a, b, sum and carry out
+        table = truthTableFromState(
+            self.qvm.get_qstate(),
+            {
+                "a": list(
+                    range(self.aBeginIndex, self.aBeginIndex + self.workingDigits)
+                ),
+                "b": list(
+                    range(self.bBeginIndex, self.bBeginIndex + self.workingDigits)
+                ),
+                "sum": list(
+                    range(self.sumBeginIndex, self.sumBeginIndex + self.workingDigits)
+                ),
+                "cout": [self.cInCoutIndex],
+            },
+        )
+
+        for row in sorted(table, key=lambda row: (row["a"], row["b"])):
+            print(
+                "{} + {} = {} (carry {})".format(
+                    row["a"], row["b"], row["sum"], row["cout"]
+                )
+            )
+
+        return table
+
+    # Evaluate every (a, b) pair from the permutation table of the adder,
+    # 2^(2n) basis indices relabeled once instead of a 2^(3n+1) statevector
+    def characterizedRun(self) -> list[dict[str, int]]:
+        prog = pq.QProg()
+        for i in range(self.workingDigits - 1, -1, -1):
+            prog << self.singleAdderCircuit(i)
+
+        aQubits = list(range(self.aBeginIndex, self.aBeginIndex + self.workingDigits))
+        bQubits = list(range(self.bBeginIndex, self.bBeginIndex + self.workingDigits))
+        pairs = np.arange(2 ** (2 * self.workingDigits))
+        aValues, bValues = pairs >> self.workingDigits, pairs % 2**self.workingDigits
+
+        outputs = permutationTable(
+            CircuitSpec.fromPyQPanda(prog, self.qvm),
+            registerIndices(aValues, aQubits) | registerIndices(bValues, bQubits),
+        )
+        sums = registerValues(
+            outputs,
+            list(range(self.sumBeginIndex, self.sumBeginIndex + self.workingDigits)),
+        )
+        carries = registerValues(outputs, [self.cInCoutIndex])
+
+        table = [
+            {"a": int(a), "b": int(b), "sum": int(total), "cout": int(carry)}
+            for a, b, total, carry in zip(aValues, bValues, sums, carries)
+        ]
+        for row in table:
+            print(
+                "{} + {} = {} (carry {})".format(
+                    row["a"], row["b"], row["sum"], row["cout"]
+                )
+            )
+
+        return table
+
     # Destructor using 'with'
     def __enter__(self):
         return self
@@ -149,10 +308,24 @@ class AdderProgram:
 def main():
     nDigits: int = config["adderDigits"]["count"]
     runIterations: int = config["adderDigits"]["iterations"]
+    # Evaluate all inputs at once from the statevector instead of sampling one pair
+    exhaustive: bool = config["adderDigits"].get("exhaustive", False)
+    # Same table from the permutation of the basis states, without a statevector
+    characterize: bool = config["adderDigits"].get("characterize", False)
 
     print("nDigits = {}, runIterations = {}".format(nDigits, runIterations))
 
     with AdderProgram(nDigits) as program:
+        # The truth tables sample no shots, so only run() is recorded in the store
+        if characterize:
+            program.characterizedRun()
+            return
+        if exhaustive:
+            program.exhaustiveRun()
+            return
+
+        # Reported once here, the benchmarks call run() repeatedly
+        print("Structure: {}".format(program.templateCircuit()))
         program.run(0b1000, 0b0111, runIterations)
 
 
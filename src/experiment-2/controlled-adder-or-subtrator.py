@@ -1,8 +1,24 @@
+from pathlib import Path
+from time import perf_counter
 from typing import Any, Final
+import sys
 import tomllib
 import pyqpanda as pq
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.backends import createQVM, runProgram
+from common.circuitSpec import CircuitSpec
+from common.parallelism import configureParallelism
+from common.resources import checkResources, estimateResources
+from common.resultCache import configureCache, resultCache
+from common.resultStore import configureResultStore, resultStore
+from common.tracing import configureTracing, span, traced
+from common.truthTable import truthTableFromState
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     with open("config/config.toml", "rb") as file:
         return tomllib.load(file)
@@ -10,6 +26,23 @@ def configInformation() -> dict[str, Any]:
 
 # Load configuration
 config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Reuse the counts of repeated seeded runs, see common/resultCache.py
+configureCache(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
+
+# Simulator that runs the programs, see common/backends.py
+backend: Final[str] = config["simulation"].get("backend", "cpuqvm")
+# Seed of the sampler, for the backends that take one
+simulationSeed: Final[int | None] = config["simulation"].get("seed")
+# Options of the backend, from the config section named after it (e.g. [memmap])
+backendOptions: Final[dict[str, Any]] = config.get(backend, {})
+# Memory budget checked before every run, see common/resources.py
+resourceBudget: Final[dict[str, Any]] = config.get("resources", {})
 
 
 class ControlledSubtractorProgram:
@@ -20,9 +53,6 @@ class ControlledSubtractorProgram:
         Args:
             workingDigits (int): The number of digits to be used in the quantum operations.
         """
-        self.qvm = pq.CPUQVM()  # Initialize QVM
-        self.qvm.init_qvm()
-
         self.workingDigits = workingDigits
         # 2 * nDigits : input for a and b
         numInputDigits = 2 * workingDigits
@@ -34,10 +64,13 @@ class ControlledSubtractorProgram:
         numControlDigits = 1
 
         # Allocate qubits and cbits
-        self.qubits = self.qvm.qAlloc_many(
+        # The extra cbit holds the control qubit when it is measured (see runSuperposed)
+        numQubits = (
             numInputDigits + numCinAndCOutDigit + numSumDigits + numControlDigits
         )
-        self.cBits = self.qvm.cAlloc_many(numSumDigits)
+        self.qvm = createQVM(backend, numQubits, resourceBudget)  # Initialize QVM
+        self.qubits = self.qvm.qAlloc_many(numQubits)
+        self.cBits = self.qvm.cAlloc_many(numSumDigits + numControlDigits)
 
         # [0 to n - 1]: a_{n-1} to a_0
         # [n to 2n - 1]: b_{n-1} to b_0
@@ -51,7 +84,7 @@ class ControlledSubtractorProgram:
         self.controlIndex = 3 * self.workingDigits + 1
 
     def prepareInputCircuit(
-        self, a: int, b: int, isDoingSubtraction: int
+        self, a: int, b: int, isDoingSubtraction: int | None
     ) -> pq.QCircuit:
         """
         Prepare the input circuit by setting the initial values of qubits based on the binary representation of a and b.
@@ -59,7 +92,8 @@ class ControlledSubtractorProgram:
         Args:
             a (int): The integer value for the first operand.
             b (int): The integer value for the second operand.
-            isDoingSubtraction (int): Flag to indicate if the operation is subtraction (1) or addition (0).
+            isDoingSubtraction (int | None): Flag to indicate if the operation is subtraction (1) or addition (0).
+                None puts the control qubit in |+> so that both are done at once.
 
         Returns:
             pq.QCircuit: The quantum circuit with the prepared input.
@@ -91,13 +125,34 @@ class ControlledSubtractorProgram:
             if bInBinary[i] == 1:
                 circuit << pq.X(self.qubits[self.bBeginIndex + i])
 
-        if isDoingSubtraction:
+        if isDoingSubtraction is None:
+            circuit << pq.H(self.qubits[self.controlIndex])
+        elif isDoingSubtraction:
             circuit << pq.X(self.qubits[self.controlIndex])
 
         circuit << pq.BARRIER(self.qubits)
 
         return circuit
 
+    def superposedInputCircuit(self) -> pq.QCircuit:
+        """
+        Put every bit of a and b, and the control qubit, in superposition.
+
+        Returns:
+            pq.QCircuit: The quantum circuit preparing all inputs at once.
+        """
+
+        circuit = pq.QCircuit()
+
+        for i in range(self.workingDigits):
+            circuit << pq.H(self.qubits[self.aBeginIndex + i])
+            circuit << pq.H(self.qubits[self.bBeginIndex + i])
+        circuit << pq.H(self.qubits[self.controlIndex])
+
+        circuit << pq.BARRIER(self.qubits)
+
+        return circuit
+
     def preControlledInverseCircuit(self) -> pq.QCircuit:
         """
         Prepare the pre-controlled inverse circuit.
@@ -184,8 +239,9 @@ class ControlledSubtractorProgram:
         return circuit
 
 
+    @traced()
     def combinationCircuit(
-        self, a: int, b: int, isDoingSubtraction: int
+        self, a: int, b: int, isDoingSubtraction: int | None
     ) -> pq.QCircuit:
         """
         Combine the quantum circuits for the pre-controlled inverse, single adder, and post-controlled inverse operations.
@@ -193,7 +249,8 @@ class ControlledSubtractorProgram:
         Args:
             a (int): The integer value for the first operand.
             b (int): The integer value for the second operand.
-            isDoingSubtraction (int): Flag to indicate if the operation is subtraction (1) or addition (0).
+            isDoingSubtraction (int | None): Flag to indicate if the operation is subtraction (1) or addition (0).
+                None superposes both operations.
 
         Returns:
             pq.QCircuit: The quantum circuit with the combined operations.
@@ -241,19 +298,184 @@ class ControlledSubtractorProgram:
                 self.cBits[i],
             )
 
-        pq.draw_qprog(
+        with span("draw"):
+            pq.draw_qprog(
+                prog,
+                "pic",
+                filename=(
+                    config["exportFiles"]["destination"]
+                    + "controlled-adder-or-subtractor-"
+                    + ("subtracting" if isDoingSubtraction else "adding")
+                ),
+            )
+
+        start = perf_counter()
+        result = runProgram(
+            backend,
+            self.qvm,
             prog,
-            "pic",
-            filename=(
-                config["exportFiles"]["destination"]
-                + "controlled-adder-or-subtractor-"
-                + ("subtracting" if isDoingSubtraction else "adding")
-            ),
+            self.cBits[: self.workingDigits],
+            iterations,
+            simulationSeed,
+            backendOptions,
+            resourceBudget,
+            config["simulation"],
+        )
+        resultStore.record(
+            "controlled-adder-or-subtractor",
+            {
+                "digits": self.workingDigits,
+                "a": a,
+                "b": b,
+                "control": isDoingSubtraction,
+            },
+            backend,
+            iterations,
+            simulationSeed,
+            perf_counter() - start,
+            result,
+            cached=resultCache.lastHit,
+        )
+        print("Result: {}".format(result))
+
+    def runSuperposed(
+        self, a: int, b: int, iterations: int
+    ) -> dict[str, dict[str, int]]:
+        """
+        Run addition and subtraction in a single execution.
+
+        The control qubit is put in |+> and measured along with the result,
+        so each shot does a + b or a - b with probability 1/2 each.
+        The joint outcomes are then split by the control bit.
+
+        Args:
+            a (int): The integer value for the first operand.
+            b (int): The integer value for the second operand.
+            iterations (int): The number of iterations to run the program.
+
+        Returns:
+            dict[str, dict[str, int]]: Results of "adding" and "subtracting" respectively
+        """
+
+        circuit = self.combinationCircuit(a, b, None)
+
+        prog = pq.QProg()
+        prog << circuit
+
+        # Add measurement, the control qubit goes to the most significant cbit
+        for i in range(self.workingDigits):
+            prog << pq.Measure(
+                self.qubits[self.sumBeginIndex + self.workingDigits - 1 - i],
+                self.cBits[i],
+            )
+        prog << pq.Measure(
+            self.qubits[self.controlIndex], self.cBits[self.workingDigits]
         )
 
-        result = self.qvm.run_with_configuration(prog, self.cBits, iterations)
+        with span("draw"):
+            pq.draw_qprog(
+                prog,
+                "pic",
+                filename=(
+                    config["exportFiles"]["destination"]
+                    + "controlled-adder-or-subtractor-superposed"
+                ),
+            )
+
+        start = perf_counter()
+        result = runProgram(
+            backend,
+            self.qvm,
+            prog,
+            self.cBits,
+            iterations,
+            simulationSeed,
+            backendOptions,
+            resourceBudget,
+            config["simulation"],
+        )
+        resultStore.record(
+            "controlled-adder-or-subtractor",
+            {
+                "digits": self.workingDigits,
+                "a": a,
+                "b": b,
+                "control": "superposed",
+            },
+            backend,
+            iterations,
+            simulationSeed,
+            perf_counter() - start,
+            result,
+            cached=resultCache.lastHit,
+        )
         print("Result: {}".format(result))
 
+        # Demultiplex by the control bit, which is the leftmost character of each key
+        demultiplexed: dict[str, dict[str, int]] = {"adding": {}, "subtracting": {}}
+        for key, value in result.items():
+            operation = "subtracting" if key[0] == "1" else "adding"
+            demultiplexed[operation][key[1:]] = value
+
+        print("Result for adding: {}".format(demultiplexed["adding"]))
+        print("Result for subtracting: {}".format(demultiplexed["subtracting"]))
+
+        return demultiplexed
+
+    def exhaustiveRun(self) -> list[dict[str, int]]:
+        """
+        Evaluate every (a, b, operation) combination in one statevector run.
+
+        All inputs and the control qubit are put in uniform superposition,
+        so each basis state in the support of the final statevector is one row
+        of the truth table. This replaces 2^(2n + 1) separate runs.
+
+        Returns:
+            list[dict[str, int]]: Rows with the keys "a", "b", "control" and "result"
+        """
+
+        prog = pq.QProg()
+        prog << self.superposedInputCircuit() << self.preControlledInverseCircuit()
+        for i in range(self.workingDigits - 1, -1, -1):
+            prog << self.singleAdderCircuit(i)
+        prog << self.postControlledInverseCircuit()
+        # Invert A again so that its register reads as the original input
+        prog << self.preControlledInverseCircuit()
+
+        # The truth table needs the whole statevector, so there is no rerouting
+        checkResources(
+            estimateResources(CircuitSpec.fromPyQPanda(prog, self.qvm)),
+            "cpuqvm",
+            budget=resourceBudget,
+            reroute=False,
+        )
+        self.qvm.directly_run(prog)
+
+        table = truthTableFromState(
+            self.qvm.get_qstate(),
+            {
+                "a": list(
+                    range(self.aBeginIndex, self.aBeginIndex + self.workingDigits)
+                ),
+                "b": list(
+                    range(self.bBeginIndex, self.bBeginIndex + self.workingDigits)
+                ),
+                "control": [self.controlIndex],
+                "result": list(
+                    range(self.sumBeginIndex, self.sumBeginIndex + self.workingDigits)
+                ),
+            },
+        )
+
+        for row in sorted(table, key=lambda row: (row["control"], row["a"], row["b"])):
+            print(
+                "{} {} {} = {}".format(
+                    row["a"], "-" if row["control"] else "+", row["b"], row["result"]
+                )
+            )
+
+        return table
+
     # Destructor using 'with'
     def __enter__(self):
         """
@@ -282,12 +504,24 @@ def main():
     nDigits: int = config["adderDigits"]["count"]
     # Number of iterations to run the program
     runIterations: int = config["adderDigits"]["iterations"]
+    # Do addition and subtraction in one run with the control qubit in |+>
+    superposedControl: bool = config["adderDigits"].get("superposedControl", False)
+    # Evaluate all inputs at once from the statevector instead of sampling one pair
+    exhaustive: bool = config["adderDigits"].get("exhaustive", False)
 
     print("nDigits = {}, runIterations = {}".format(nDigits, runIterations))
 
     # Run the program for addition and subtraction respectively
     # Using different values for a and b to ensure the correctness of the program
     with ControlledSubtractorProgram(nDigits) as program:
+        if exhaustive:
+            program.exhaustiveRun()
+            return
+
+        if superposedControl:
+            program.runSuperposed(0b0001, 0b1011, runIterations)
+            return
+
         program.run(0b0001, 0b1011, 0, runIterations)
         program.run(0b0001, 0b1011, 1, runIterations)
 
@@ -1,8 +1,24 @@
+from pathlib import Path
+from time import perf_counter
 from typing import Any, Final
+import sys
 import tomllib
 import pyqpanda as pq
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.backends import createQVM, runProgram
+from common.circuitSpec import CircuitSpec
+from common.parallelism import configureParallelism
+from common.resources import checkResources, estimateResources
+from common.resultCache import configureCache, resultCache
+from common.resultStore import configureResultStore, resultStore
+from common.tracing import configureTracing, span, traced
+from common.truthTable import truthTableFromState
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     with open("config/config.toml", "rb") as file:
         return tomllib.load(file)
@@ -10,13 +26,27 @@ def configInformation() -> dict[str, Any]:
 
 # Load configuration
 config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Reuse the counts of repeated seeded runs, see common/resultCache.py
+configureCache(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
+
+# Simulator that runs the programs, see common/backends.py
+backend: Final[str] = config["simulation"].get("backend", "cpuqvm")
+# Seed of the sampler, for the backends that take one
+simulationSeed: Final[int | None] = config["simulation"].get("seed")
+# Options of the backend, from the config section named after it (e.g. [memmap])
+backendOptions: Final[dict[str, Any]] = config.get(backend, {})
+# Memory budget checked before every run, see common/resources.py
+resourceBudget: Final[dict[str, Any]] = config.get("resources", {})
 
 
 class SubtractorProgram:
     def __init__(self, workingDigits: int):
-        self.qvm = pq.CPUQVM()  # Initialize QVM
-        self.qvm.init_qvm()
-
         self.workingDigits = workingDigits
         # 2 * nDigits : input for a and b
         numInputDigits = 2 * workingDigits
@@ -26,9 +56,9 @@ class SubtractorProgram:
         numSumDigits = workingDigits
 
         # Allocate qubits and cbits
-        self.qubits = self.qvm.qAlloc_many(
-            numInputDigits + numCinAndCOutDigit + numSumDigits
-        )
+        numQubits = numInputDigits + numCinAndCOutDigit + numSumDigits
+        self.qvm = createQVM(backend, numQubits, resourceBudget)  # Initialize QVM
+        self.qubits = self.qvm.qAlloc_many(numQubits)
         self.cBits = self.qvm.cAlloc_many(numSumDigits)
 
         # [0 to n - 1]: a_{n-1} to a_0
@@ -67,6 +97,18 @@ class SubtractorProgram:
 
         return circuit
 
+    # Put every bit of a and b in superposition, so all inputs are subtracted at once
+    def superposedInputCircuit(self) -> pq.QCircuit:
+        circuit = pq.QCircuit()
+
+        for i in range(self.workingDigits):
+            circuit << pq.H(self.qubits[self.aBeginIndex + i])
+            circuit << pq.H(self.qubits[self.bBeginIndex + i])
+
+        circuit << pq.BARRIER(self.qubits)
+
+        return circuit
+
     # Negate input A
     def preInverseCircuit(self) -> pq.QCircuit:
         circuit = pq.QCircuit()
@@ -127,6 +169,7 @@ class SubtractorProgram:
 
         # A and B are for digits binary number
 
+    @traced()
     def combinationCircuit(self, a: int, b: int) -> pq.QCircuit:
         circuit = pq.QCircuit()
 
@@ -157,13 +200,78 @@ class SubtractorProgram:
                 self.cBits[i],
             )
 
-        pq.draw_qprog(
-            prog, "pic", filename=config["exportFiles"]["destination"] + "subtractor"
-        )
+        with span("draw"):
+            pq.draw_qprog(
+                prog,
+                "pic",
+                filename=config["exportFiles"]["destination"] + "subtractor",
+            )
 
-        result = self.qvm.run_with_configuration(prog, self.cBits, iterations)
+        start = perf_counter()
+        result = runProgram(
+            backend,
+            self.qvm,
+            prog,
+            self.cBits,
+            iterations,
+            simulationSeed,
+            backendOptions,
+            resourceBudget,
+            config["simulation"],
+        )
+        resultStore.record(
+            "subtractor",
+            {"digits": self.workingDigits, "a": a, "b": b},
+            backend,
+            iterations,
+            simulationSeed,
+            perf_counter() - start,
+            result,
+            cached=resultCache.lastHit,
+        )
         print('Result: {}'.format(result))
 
+    # Evaluate every (a, b) pair in one statevector run,
+    # instead of 2^(2n) separate runs with fixed inputs
+    def exhaustiveRun(self) -> list[dict[str, int]]:
+        prog = pq.QProg()
+        prog << self.superposedInputCircuit() << self.preInverseCircuit()
+        for i in range(self.workingDigits - 1, -1, -1):
+            prog << self.singleAdderCircuit(i)
+        prog << self.postInverseCircuit()
+        # Negate A again so that its register reads as the original input
+        prog << self.preInverseCircuit()
+
+        # The truth table needs the whole statevector, so there is no rerouting
+        checkResources(
+            estimateResources(CircuitSpec.fromPyQPanda(prog, self.qvm)),
+            "cpuqvm",
+            budget=resourceBudget,
+            reroute=False,
+        )
+        self.qvm.directly_run(prog)
+
+        # Each basis state in the support is one row: a, b and the difference
+        table = truthTableFromState(
+            self.qvm.get_qstate(),
+            {
+                "a": list(
+                    range(self.aBeginIndex, self.aBeginIndex + self.workingDigits)
+                ),
+                "b": list(
+                    range(self.bBeginIndex, self.bBeginIndex + self.workingDigits)
+                ),
+                "difference": list(
+                    range(self.sumBeginIndex, self.sumBeginIndex + self.workingDigits)
+                ),
+            },
+        )
+
+        for row in sorted(table, key=lambda row: (row["a"], row["b"])):
+            print("{} - {} = {}".format(row["a"], row["b"], row["difference"]))
+
+        return table
+
     # Destructor using 'with'
     def __enter__(self):
         return self
@@ -175,10 +283,16 @@ class SubtractorProgram:
 def main():
     nDigits: int = config["adderDigits"]["count"]
     runIterations: int = config["adderDigits"]["iterations"]
+    # Evaluate all inputs at once from the statevector instead of sampling one pair
+    exhaustive: bool = config["adderDigits"].get("exhaustive", False)
 
     print("nDigits = {}, runIterations = {}".format(nDigits, runIterations))
 
     with SubtractorProgram(nDigits) as program:
+        if exhaustive:
+            program.exhaustiveRun()
+            return
+
         program.run(0b0001, 0b1011, runIterations)
 
 
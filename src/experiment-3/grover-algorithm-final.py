@@ -1,16 +1,34 @@
 # Relative path: src/experiment-3/grover-algorithm-final.py
 
 from math import sqrt
+from pathlib import Path
+from time import perf_counter
 from typing import Final, Any
+import asyncio
+import sys
 import tomllib
 
 import qiskit as qk
-from qiskit_aer import AerSimulator
-from qiskit.circuit.library import MCMT
 from qiskit.visualization import plot_histogram
 from qiskit.quantum_info import Statevector
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.circuitSpec import CircuitSpec
+from common.executors import createExecutor
+from common.jobs import JobRunner
+from common.mcx import appendMcx, mcxAncillaCount
+from common.parallelism import configureParallelism
+from common.resources import checkResources, estimateResources
+from common.resultCache import configureCache, resultCache
+from common.resultStore import configureResultStore, resultStore
+from common.shotParallel import parallelExecutor
+from common.stateInspection import drawStateSummary
+from common.tracing import configureTracing, span, traced
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     """
     Load configuration information from the config.toml file
@@ -25,18 +43,42 @@ def configInformation() -> dict[str, Any]:
 
 # Load configuration
 config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Reuse the counts of repeated seeded runs, see common/resultCache.py
+configureCache(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
 
 # File save path
 fileSavePath: Final[str] = config["exportFiles"]["destination"]
 # Number of shots for the simulation
 simulationShots: Final[int] = config["simulation"]["shots"]
+# Seed of the sampler, None for fresh randomness on every run
+simulationSeed: Final[int | None] = config["simulation"].get("seed")
+# Engine that runs the circuit, see common/executors.py
+groverBackend: Final[str] = config.get("grover", {}).get("backend", "aer")
+# Memory budget checked before every run, see common/resources.py
+resourceBudget: Final[dict[str, Any]] = config.get("resources", {})
 
 # Number of input qubits
 numInputQuBits: Final[int] = 3
 # Number of oracle qubits in oracle workspace
 numOracleQuBits: Final[int] = 1
-
-
+# How multi-controlled X gates are decomposed, see common/mcx.py
+mcxStrategy: Final[str] = config.get("grover", {}).get("mcxStrategy", "no-ancilla")
+# Number of workspace qubits needed by the MCX decomposition
+numMcxAncillaQuBits: Final[int] = mcxAncillaCount(mcxStrategy, numInputQuBits)
+# Layout: [input qubits][MCX ancillas][oracle workspace]
+numTotalQuBits: Final[int] = numInputQuBits + numMcxAncillaQuBits + numOracleQuBits
+oracleQuBitIndex: Final[int] = numTotalQuBits - 1
+# Number of basis states shown in the state vector plot
+numTopAmplitudes: Final[int] = 16
+
+
+@traced()
 def initializeCircuit() -> qk.QuantumCircuit:
     """
     Gate that initializes the qubits to the superposition state
@@ -45,27 +87,27 @@ def initializeCircuit() -> qk.QuantumCircuit:
         qk.QuantumCircuit: Initialization circuit
     """
 
-    initialize = qk.QuantumCircuit(
-        numInputQuBits + numOracleQuBits, name="Initialization"
-    )
+    initialize = qk.QuantumCircuit(numTotalQuBits, name="Initialization")
     # Reverse the last qubit to make it |1> and apply H gate to all qubits
-    initialize.x(numInputQuBits + numOracleQuBits - 1)
+    initialize.x(oracleQuBitIndex)
 
-    initialize.barrier(range(numInputQuBits + numOracleQuBits))
+    initialize.barrier(range(numTotalQuBits))
     # Apply H gate to all qubits
-    initialize.h(list(range(numInputQuBits)) + [numInputQuBits + numOracleQuBits - 1])
-    # initialize.h(range(numInputQuBits + numOracleQuBits))
+    initialize.h(list(range(numInputQuBits)) + [oracleQuBitIndex])
+    # initialize.h(range(numTotalQuBits))
 
-    initialize.barrier(range(numInputQuBits + numOracleQuBits))
+    initialize.barrier(range(numTotalQuBits))
 
     # Output as png
-    initialize.draw(
-        output="mpl", filename=fileSavePath + "grover-algorithm-initialize.png"
-    )
+    with span("draw"):
+        initialize.draw(
+            output="mpl", filename=fileSavePath + "grover-algorithm-initialize.png"
+        )
 
     return initialize
 
 
+@traced()
 def oracleCircuit() -> qk.QuantumCircuit:
     """
     Gate that works exactly as the the logic expression below:
@@ -78,24 +120,26 @@ def oracleCircuit() -> qk.QuantumCircuit:
         qk.QuantumCircuit: Oracle circuit
     """
 
-    oracle = qk.QuantumCircuit(numInputQuBits + numOracleQuBits, name="Oracle")
+    oracle = qk.QuantumCircuit(numTotalQuBits, name="Oracle")
 
     # Formula (q0 | ~q1) & (~q0 | q1 | q2) & (q0 | q2)
     # can be minimized to (q0 & q1) | (~q1 & q2)
     # in XOR form: (q0 & q1) ^ (~q1 & q2) ^ (q0 & q1 & ~q1 & q2)
     # which can be further minimized to: (q0 & q1) ^ (~q1 & q2)
-    oracle.ccx(0, 1, numInputQuBits + numOracleQuBits - 1)
+    oracle.ccx(0, 1, oracleQuBitIndex)
     oracle.x(1)
-    oracle.ccx(1, 2, numInputQuBits + numOracleQuBits - 1)
+    oracle.ccx(1, 2, oracleQuBitIndex)
     oracle.x(1)
 
-    oracle.barrier(range(numInputQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
     # Output as png
-    oracle.draw(output="mpl", filename=fileSavePath + "grover-algorithm-oracle.png")
+    with span("draw"):
+        oracle.draw(output="mpl", filename=fileSavePath + "grover-algorithm-oracle.png")
 
     return oracle
 
 
+@traced()
 def diffusionCircuit() -> qk.QuantumCircuit:
     """
     Gate that applies the diffusion operator
@@ -104,18 +148,19 @@ def diffusionCircuit() -> qk.QuantumCircuit:
         qk.QuantumCircuit: Diffusion circuit
     """
 
-    diffusion = qk.QuantumCircuit(numInputQuBits + numOracleQuBits, name="Diffusion")
+    diffusion = qk.QuantumCircuit(numTotalQuBits, name="Diffusion")
     # First apply H gate to all input qubits and oracle workspace qubit
     diffusion.h(range(numInputQuBits))
-    diffusion.h(numInputQuBits + numOracleQuBits - 1)
+    diffusion.h(oracleQuBitIndex)
     # Then apply X gate to all input qubits
     diffusion.x(range(numInputQuBits))
     # Apply the multi-controlled Z gate
-    cccxGate = MCMT("cx", numInputQuBits, 1)
-    diffusion.compose(
-        cccxGate,
-        list(range(numInputQuBits)) + [numInputQuBits + numOracleQuBits - 1],
-        inplace=True,
+    appendMcx(
+        diffusion,
+        list(range(numInputQuBits)),
+        oracleQuBitIndex,
+        mcxStrategy,
+        list(range(numInputQuBits, numInputQuBits + numMcxAncillaQuBits)),
     )
 
     # Apply X gate and H gate to all qubits except the last one which is in the oracle workspace
@@ -123,20 +168,37 @@ def diffusionCircuit() -> qk.QuantumCircuit:
     diffusion.h(range(numInputQuBits))
 
     # Add barrier
-    diffusion.barrier(range(numInputQuBits + numOracleQuBits))
+    diffusion.barrier(range(numTotalQuBits))
 
     # Output as png
-    diffusion.draw(
-        output="mpl", filename=fileSavePath + "grover-algorithm-diffusion.png"
-    )
+    with span("draw"):
+        diffusion.draw(
+            output="mpl", filename=fileSavePath + "grover-algorithm-diffusion.png"
+        )
 
     return diffusion
 
 
-def main():
-    # Create a quantum circuit with numInputQuBits + numOracleQuBits qubits
+def drawCircuit(circuit: qk.QuantumCircuit):
+    with span("draw"):
+        circuit.draw(
+            output="mpl", filename=fileSavePath + "grover-algorithm-circuit.png"
+        )
+
+
+def drawCounts(count: dict[str, int]):
+    with span("draw"):
+        plot_histogram(
+            count,
+            filename=fileSavePath + "grover-algorithm-count.png",
+            title="Grover's Algorithm",
+        )
+
+
+async def main():
+    # Create a quantum circuit with numTotalQuBits qubits
     # and classical register with numInputQuBits bits
-    circuit = qk.QuantumCircuit(numInputQuBits + numOracleQuBits, numInputQuBits)
+    circuit = qk.QuantumCircuit(numTotalQuBits, numInputQuBits)
 
     # Apply the initialization circuit
     circuit.compose(initializeCircuit(), inplace=True)
@@ -147,28 +209,60 @@ def main():
         circuit.compose(diffusionCircuit(), inplace=True)
 
     # Get the state vector of the circuit and output as png
-    stateVector = Statevector(circuit)
-    stateVector.draw(
-        output="city", filename=fileSavePath + "grover-algorithm-state-vector.png"
+    # The oracle workspace qubit is traced out first, and nothing here builds
+    # the 4^n density matrix a "city" plot would need
+    checkResources(
+        estimateResources(CircuitSpec.fromQiskit(circuit)),
+        "statevector",
+        budget=resourceBudget,
+        reroute=False,
     )
+    with span("statevector"):
+        stateVector = Statevector(circuit)
 
     # Measure all qubits except the last one which is in the oracle workspace
     circuit.measure(range(numInputQuBits), range(numInputQuBits))
 
-    # Output circuit as png
-    circuit.draw(output="mpl", filename=fileSavePath + "grover-algorithm-circuit.png")
-
-    # Run simulation using AerSimulator and output the result as histogram
-    simulator = AerSimulator()
-    circuit = qk.transpile(circuit, simulator)
-    result = simulator.run(circuit, shots=simulationShots).result()
-    count = result.get_counts(circuit)
-    plot_histogram(
-        count,
-        filename=fileSavePath + "grover-algorithm-count.png",
-        title="Grover's Algorithm",
+    # Run simulation on the configured engine and output the result as histogram
+    spec = CircuitSpec.fromQiskit(circuit)
+    chosenBackend, chosenOptions = checkResources(
+        estimateResources(spec, simulationShots),
+        groverBackend,
+        config.get(groverBackend, {}),
+        resourceBudget,
+    )
+    # Large shot counts are split across processes, see common/shotParallel.py
+    executor = parallelExecutor(
+        createExecutor(chosenBackend, chosenOptions), config["simulation"]
     )
 
+    # The plots are written while the circuit simulates, see common/jobs.py
+    async with JobRunner(config) as jobs:
+        start = perf_counter()
+        counting = jobs.submit(
+            resultCache.run, executor, spec, simulationShots, simulationSeed
+        )
+        jobs.offload(
+            drawStateSummary,
+            stateVector,
+            list(range(numInputQuBits, numTotalQuBits)),
+            fileSavePath + "grover-algorithm-state-vector",
+            topK=numTopAmplitudes,
+        )
+        jobs.offload(drawCircuit, circuit.copy())
+        count = await counting
+        resultStore.record(
+            "grover-algorithm-final",
+            {"inputQubits": numInputQuBits, "mcxStrategy": mcxStrategy},
+            chosenBackend,
+            simulationShots,
+            simulationSeed,
+            perf_counter() - start,
+            count,
+            cached=resultCache.lastHit,
+        )
+        jobs.offload(drawCounts, count)
+
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
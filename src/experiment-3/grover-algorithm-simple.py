@@ -1,10 +1,21 @@
+from pathlib import Path
 from typing import Final, Any
+import sys
 import tomllib
 
 import qiskit as qk
 from qiskit.quantum_info import Statevector
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.circuitSpec import CircuitSpec
+from common.parallelism import configureParallelism
+from common.resources import checkResources, estimateResources
+from common.tracing import configureTracing, span, traced
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     """
     Load configuration information from the config.toml file
@@ -19,6 +30,10 @@ def configInformation() -> dict[str, Any]:
 
 # Load configuration
 config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
 
 # File save path
 fileSavePath = config["exportFiles"]["destination"]
@@ -26,6 +41,7 @@ fileSavePath = config["exportFiles"]["destination"]
 simulationShots = config["simulation"]["shots"]
 
 
+@traced()
 def oracleCircuit(n: int = 2) -> qk.QuantumCircuit:
     """
     Function that returns an oracle for the Grover's algorithm
@@ -43,6 +59,7 @@ def oracleCircuit(n: int = 2) -> qk.QuantumCircuit:
     return oracle
 
 
+@traced()
 def groverCircuit(n: int = 2) -> qk.QuantumCircuit:
     """
     Function that returns a Grover's algorithm circuit
@@ -65,10 +82,18 @@ def groverCircuit(n: int = 2) -> qk.QuantumCircuit:
 def main():
     # Prepare and run the Grover's algorithm
     grover = groverCircuit()
-    grover.draw(output="mpl", filename=fileSavePath + "grover-simple.png")
+    with span("draw"):
+        grover.draw(output="mpl", filename=fileSavePath + "grover-simple.png")
 
     grover.remove_final_measurements()
-    stateVector = Statevector(grover)
+    checkResources(
+        estimateResources(CircuitSpec.fromQiskit(grover)),
+        "statevector",
+        budget=config.get("resources", {}),
+        reroute=False,
+    )
+    with span("statevector"):
+        stateVector = Statevector(grover)
 
     print(stateVector)
 
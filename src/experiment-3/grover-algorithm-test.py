@@ -1,15 +1,31 @@
 # Relative path: src/experiment-3/grover-algorithm-test.py
 
 from math import sqrt
+from pathlib import Path
+from time import perf_counter
 from typing import Final, Any
+import sys
 import tomllib
 
 import qiskit as qk
-from qiskit_aer import AerSimulator
-from qiskit.circuit.library import MCMT
 from qiskit.visualization import plot_histogram
 
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from common.circuitSpec import CircuitSpec
+from common.executors import createExecutor
+from common.mcx import appendMcx, mcxAncillaCount
+from common.parallelism import configureParallelism
+from common.resources import checkResources, estimateResources
+from common.resultCache import configureCache, resultCache
+from common.resultStore import configureResultStore, resultStore
+from common.shotParallel import parallelExecutor
+from common.templateCircuit import TemplateCircuit
+from common.tracing import configureTracing, span, traced
+
+
+@traced("config load")
 def configInformation() -> dict[str, Any]:
     """
     Load configuration information from the config.toml file
@@ -24,11 +40,25 @@ def configInformation() -> dict[str, Any]:
 
 # Load configuration
 config: Final[dict[str, Any]] = configInformation()
+# Record spans if enabled, see common/tracing.py
+configureTracing(config)
+# Thread limits of every engine, see common/parallelism.py
+configureParallelism(config)
+# Reuse the counts of repeated seeded runs, see common/resultCache.py
+configureCache(config)
+# Keep every run for later queries, see common/resultStore.py
+configureResultStore(config)
 
 # File save path
 fileSavePath: Final[str] = config["exportFiles"]["destination"]
 # Number of shots for the simulation
 simulationShots: Final[int] = config["simulation"]["shots"]
+# Seed of the sampler, None for fresh randomness on every run
+simulationSeed: Final[int | None] = config["simulation"].get("seed")
+# Engine that runs the circuit, see common/executors.py
+groverBackend: Final[str] = config.get("grover", {}).get("backend", "aer")
+# Memory budget checked before every run, see common/resources.py
+resourceBudget: Final[dict[str, Any]] = config.get("resources", {})
 
 # Number of input qubits
 numInputQuBits: Final[int] = 3
@@ -37,8 +67,26 @@ numInputQuBits: Final[int] = 3
 numAdditionalQuBits: Final[int] = numInputQuBits
 # Number of oracle qubits in oracle workspace
 numOracleQuBits: Final[int] = 1
+# How multi-controlled X gates are decomposed, see common/mcx.py
+mcxStrategy: Final[str] = config.get("grover", {}).get("mcxStrategy", "no-ancilla")
+# Number of workspace qubits needed by the widest MCX decomposition
+numMcxAncillaQuBits: Final[int] = mcxAncillaCount(
+    mcxStrategy, max(numInputQuBits, numAdditionalQuBits)
+)
+# Layout: [input qubits][additional qubits][MCX ancillas][oracle workspace]
+numTotalQuBits: Final[int] = (
+    numInputQuBits + numAdditionalQuBits + numMcxAncillaQuBits + numOracleQuBits
+)
+oracleQuBitIndex: Final[int] = numTotalQuBits - 1
+mcxAncillaQuBits: Final[list[int]] = list(
+    range(
+        numInputQuBits + numAdditionalQuBits,
+        numInputQuBits + numAdditionalQuBits + numMcxAncillaQuBits,
+    )
+)
 
 
+@traced()
 def initializeCircuit() -> qk.QuantumCircuit:
     """
     Gate that initializes the qubits to the superposition state
@@ -47,30 +95,27 @@ def initializeCircuit() -> qk.QuantumCircuit:
         qk.QuantumCircuit: Initialization circuit
     """
 
-    initialize = qk.QuantumCircuit(
-        numInputQuBits + numAdditionalQuBits + numOracleQuBits, name="Initialization"
-    )
+    initialize = qk.QuantumCircuit(numTotalQuBits, name="Initialization")
     # Reverse the last qubit to make it |1> and apply H gate to all qubits
-    initialize.x(numInputQuBits + numAdditionalQuBits + numOracleQuBits - 1)
+    initialize.x(oracleQuBitIndex)
 
-    initialize.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    initialize.barrier(range(numTotalQuBits))
     # Apply H gate to all qubits
-    initialize.h(
-        list(range(numInputQuBits))
-        + [numInputQuBits + numAdditionalQuBits + numOracleQuBits - 1]
-    )
-    # initialize.h(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    initialize.h(list(range(numInputQuBits)) + [oracleQuBitIndex])
+    # initialize.h(range(numTotalQuBits))
 
-    initialize.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    initialize.barrier(range(numTotalQuBits))
 
     # Output as png
-    initialize.draw(
-        output="mpl", filename=fileSavePath + "grover-algorithm-initialize.png"
-    )
+    with span("draw"):
+        initialize.draw(
+            output="mpl", filename=fileSavePath + "grover-algorithm-initialize.png"
+        )
 
     return initialize
 
 
+@traced()
 def oracleCircuit() -> qk.QuantumCircuit:
     """
     Gate that works exactly as the the logic expression below:
@@ -81,77 +126,82 @@ def oracleCircuit() -> qk.QuantumCircuit:
         qk.QuantumCircuit: Oracle circuit
     """
 
-    oracle = qk.QuantumCircuit(
-        numInputQuBits + numAdditionalQuBits + numOracleQuBits, name="Oracle"
-    )
+    oracle = qk.QuantumCircuit(numTotalQuBits, name="Oracle")
 
     # Sub-expression 1: (q0 | ~q1) == ~(~q0 & q1)
     oracle.x(0)
     oracle.ccx(0, 1, numInputQuBits)
     oracle.x(0)
     oracle.x(numInputQuBits)
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
 
     # Sub-expression 2: (~q0 | q1 | q2) == ~(q0 & ~q1 & ~q2)
     oracle.x([1, 2])
-    oracle.compose(
-        MCMT("cx", numInputQuBits, 1),
-        list(range(numInputQuBits)) + [numInputQuBits + 1],
-        inplace=True,
+    appendMcx(
+        oracle,
+        list(range(numInputQuBits)),
+        numInputQuBits + 1,
+        mcxStrategy,
+        mcxAncillaQuBits,
     )
     oracle.x([1, 2])
     oracle.x(numInputQuBits + 1)
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
 
     # Sub-expression 3: (q0 | q2) == ~(~q0 & ~q2)
     oracle.x([0, 2])
     oracle.ccx(0, 2, numInputQuBits + 2)
     oracle.x([0, 2])
     oracle.x(numInputQuBits + 2)
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
 
     # Combine all sub-expressions
-    oracle.compose(
-        MCMT("cx", numAdditionalQuBits, 1),
-        list(range(numInputQuBits, numInputQuBits + numAdditionalQuBits))
-        + [numInputQuBits + numAdditionalQuBits + numOracleQuBits - 1],
-        inplace=True,
+    appendMcx(
+        oracle,
+        list(range(numInputQuBits, numInputQuBits + numAdditionalQuBits)),
+        oracleQuBitIndex,
+        mcxStrategy,
+        mcxAncillaQuBits,
     )
 
     # Reverse the additional qubits and the input qubits to the original state
 
     # Reverse for Sub-expression 3
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
     oracle.x(numInputQuBits + 2)
     oracle.x([0, 2])
     oracle.ccx(0, 2, numInputQuBits + 2)
     oracle.x([0, 2])
 
     # Reverse for Sub-expression 2
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
     oracle.x(numInputQuBits + 1)
     oracle.x([1, 2])
-    oracle.compose(
-        MCMT("cx", numInputQuBits, 1),
-        list(range(numInputQuBits)) + [numInputQuBits + 1],
-        inplace=True,
+    appendMcx(
+        oracle,
+        list(range(numInputQuBits)),
+        numInputQuBits + 1,
+        mcxStrategy,
+        mcxAncillaQuBits,
     )
     oracle.x([1, 2])
 
     # Reverse for Sub-expression 1
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
     oracle.x(numInputQuBits)
     oracle.x(0)
     oracle.ccx(0, 1, numInputQuBits)
     oracle.x(0)
 
-    oracle.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    oracle.barrier(range(numTotalQuBits))
     # Output as png
-    oracle.draw(output="mpl", filename=fileSavePath + "grover-algorithm-oracle.png")
+    with span("draw"):
+        oracle.draw(output="mpl", filename=fileSavePath + "grover-algorithm-oracle.png")
 
     return oracle
 
 
+@traced()
 def diffusionCircuit() -> qk.QuantumCircuit:
     """
     Gate that applies the diffusion operator
@@ -160,21 +210,19 @@ def diffusionCircuit() -> qk.QuantumCircuit:
         qk.QuantumCircuit: Diffusion circuit
     """
 
-    diffusion = qk.QuantumCircuit(
-        numInputQuBits + numAdditionalQuBits + numOracleQuBits, name="Diffusion"
-    )
+    diffusion = qk.QuantumCircuit(numTotalQuBits, name="Diffusion")
     # First apply H gate to all input qubits and oracle workspace qubit
     diffusion.h(range(numInputQuBits))
-    diffusion.h(numInputQuBits + numAdditionalQuBits + numOracleQuBits - 1)
+    diffusion.h(oracleQuBitIndex)
     # Then apply X gate to all input qubits
     diffusion.x(range(numInputQuBits))
     # Apply the multi-controlled Z gate
-    cccxGate = MCMT("cx", numInputQuBits, 1)
-    diffusion.compose(
-        cccxGate,
-        list(range(numInputQuBits))
-        + [numInputQuBits + numAdditionalQuBits + numOracleQuBits - 1],
-        inplace=True,
+    appendMcx(
+        diffusion,
+        list(range(numInputQuBits)),
+        oracleQuBitIndex,
+        mcxStrategy,
+        mcxAncillaQuBits,
     )
 
     # Apply X gate and H gate to all qubits except the last one which is in the oracle workspace
@@ -182,12 +230,13 @@ def diffusionCircuit() -> qk.QuantumCircuit:
     diffusion.h(range(numInputQuBits))
 
     # Add barrier
-    diffusion.barrier(range(numInputQuBits + numAdditionalQuBits + numOracleQuBits))
+    diffusion.barrier(range(numTotalQuBits))
 
     # Output as png
-    diffusion.draw(
-        output="mpl", filename=fileSavePath + "grover-algorithm-diffusion.png"
-    )
+    with span("draw"):
+        diffusion.draw(
+            output="mpl", filename=fileSavePath + "grover-algorithm-diffusion.png"
+        )
 
     return diffusion
 
@@ -195,9 +244,7 @@ def diffusionCircuit() -> qk.QuantumCircuit:
 def main():
     # Create a quantum circuit with numInputQuBits + numOracleQuBits qubits
     # and classical register with numInputQuBits bits
-    circuit = qk.QuantumCircuit(
-        numInputQuBits + numAdditionalQuBits + numOracleQuBits, numInputQuBits
-    )
+    circuit = qk.QuantumCircuit(numTotalQuBits, numInputQuBits)
 
     # Apply the initialization circuit
     circuit.compose(initializeCircuit(), inplace=True)
@@ -217,18 +264,45 @@ def main():
     circuit.measure(range(numInputQuBits), range(numInputQuBits))
 
     # Output circuit as png
-    circuit.draw(output="mpl", filename=fileSavePath + "grover-algorithm-circuit.png")
-
-    # Run simulation using AerSimulator and output the result as histogram
-    simulator = AerSimulator()
-    circuit = qk.transpile(circuit, simulator)
-    result = simulator.run(circuit, shots=simulationShots).result()
-    count = result.get_counts(circuit)
-    plot_histogram(
+    with span("draw"):
+        circuit.draw(
+            output="mpl", filename=fileSavePath + "grover-algorithm-circuit.png"
+        )
+
+    # Run simulation on the configured engine and output the result as histogram
+    # The oracle uncomputes with mirrored blocks and every iteration repeats,
+    # the report tells how few distinct blocks the circuit has
+    print("Structure: {}".format(TemplateCircuit.fromQiskit(circuit)))
+
+    spec = CircuitSpec.fromQiskit(circuit)
+    chosenBackend, chosenOptions = checkResources(
+        estimateResources(spec, simulationShots),
+        groverBackend,
+        config.get(groverBackend, {}),
+        resourceBudget,
+    )
+    # Large shot counts are split across processes, see common/shotParallel.py
+    executor = parallelExecutor(
+        createExecutor(chosenBackend, chosenOptions), config["simulation"]
+    )
+    start = perf_counter()
+    count = resultCache.run(executor, spec, simulationShots, simulationSeed)
+    resultStore.record(
+        "grover-algorithm-test",
+        {"inputQubits": numInputQuBits, "mcxStrategy": mcxStrategy},
+        chosenBackend,
+        simulationShots,
+        simulationSeed,
+        perf_counter() - start,
         count,
-        filename=fileSavePath + "grover-algorithm-count.png",
-        title="Grover's Algorithm",
+        cached=resultCache.lastHit,
     )
+    with span("draw"):
+        plot_histogram(
+            count,
+            filename=fileSavePath + "grover-algorithm-count.png",
+            title="Grover's Algorithm",
+        )
 
 
 if __name__ == "__main__":
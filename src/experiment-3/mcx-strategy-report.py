@@ -0,0 +1,74 @@
+# Relative path: src/experiment-3/mcx-strategy-report.py
+
+from argparse import ArgumentParser
+from pathlib import Path
+import sys
+
+# Make the shared helpers in src/common importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from common.mcx import cheapestMcxStrategy, mcxCostReport, mcxStrategies
+
+
+def initArgParser() -> ArgumentParser:
+    """
+    Initialize the argument parser
+
+    Returns:
+        ArgumentParser: Parser for the report options
+    """
+
+    parser = ArgumentParser(prog="mcx-strategy-report")
+    parser.add_argument(
+        "-n",
+        "--max-controls",
+        dest="MAX_CONTROLS",
+        type=int,
+        default=10,
+        help="largest number of control qubits to report",
+    )
+    parser.add_argument(
+        "-m",
+        "--metric",
+        dest="METRIC",
+        default="gates",
+        choices=["gates", "cx", "depth", "qubits"],
+        help="metric used to pick the cheapest strategy",
+    )
+    return parser
+
+
+def main():
+    """
+    Print the transpiled cost of every MCX strategy for each width
+    """
+
+    args = vars(initArgParser().parse_args())
+
+    print(
+        "{:>8}  {:<14}{:>8}{:>8}{:>8}{:>8}".format(
+            "controls", "strategy", "gates", "cx", "depth", "qubits"
+        )
+    )
+    for numControls in range(2, args["MAX_CONTROLS"] + 1):
+        for strategy in mcxStrategies:
+            report = mcxCostReport(numControls, strategy)
+            print(
+                "{:>8}  {:<14}{:>8}{:>8}{:>8}{:>8}".format(
+                    numControls,
+                    strategy,
+                    report["gates"],
+                    report["cx"],
+                    report["depth"],
+                    report["qubits"],
+                )
+            )
+        print(
+            "Cheapest by {}: {}\n".format(
+                args["METRIC"], cheapestMcxStrategy(numControls, args["METRIC"])
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()